@@ -3,7 +3,14 @@ AI Service for character interactions
 使用OpenAI Python SDK规范，支持多种兼容的API服务
 """
 import asyncio
-from typing import Optional, Dict, Any
+from contextlib import aclosing
+from typing import AsyncIterator, List, Optional, Dict, Any, Sequence, Tuple
+
+from resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, is_transient_error
+from response_cache import ResponseCache, make_cache_key
+from rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PrioritySemaphore, RateLimiter, create_rate_limiter
+from singleflight import SingleFlight
+from token_budget import ContextBudgeter, PromptSection, get_token_counter
 
 try:
     import config
@@ -17,71 +24,193 @@ except ImportError:
     print("错误: OpenAI库未安装。运行: pip install openai")
     exit(1)
 
+try:
+    import httpx  # openai SDK 的依赖，用于配置共享连接池
+except ImportError:
+    httpx = None
+
+
+# 流式回复在输出中途出错时追加的标记；调用者据此判断回复不完整
+STREAM_INTERRUPTED = "……（回复中断）"
+
+# API端点配置
+API_CONFIGS = {
+    "openai": {
+        "base_url": None,  # 使用默认
+        "description": "OpenAI官方API"
+    },
+    "kimi": {
+        "base_url": "https://api.moonshot.cn/v1",
+        "description": "Kimi (月之暗面) API"
+    },
+    "deepseek": {
+        "base_url": "https://api.deepseek.com/v1",
+        "description": "DeepSeek API"
+    },
+    "zhipu": {
+        "base_url": "https://open.bigmodel.cn/api/paas/v4",
+        "description": "智谱AI API"
+    },
+    "qwen": {
+        "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1",
+        "description": "通义千问 API"
+    },
+    "local": {
+        # 本地假服务 (fake_llm_server.py)，用于离线压测
+        "base_url": getattr(config, "LOCAL_BASE_URL", "http://127.0.0.1:8765/v1"),
+        "description": "本地测试服务"
+    }
+}
+
+
+class StreamAbandonedError(Exception):
+    """发起流式请求的调用者中途放弃，等待同一结果的调用者需要自己重新请求"""
+
+
+class ProviderEndpoint:
+    """故障转移链中的一个提供商：客户端、并发限制和熔断器"""
+    
+    def __init__(self, provider: str, model: str, client, max_concurrent: int,
+                 breaker: CircuitBreaker, rate_limiter: Optional[RateLimiter] = None):
+        self.provider = provider
+        self.model = model
+        self.client = client
+        # 每个提供商的并发请求上限，超出的请求按优先级排队而不是占用线程
+        self.semaphore = PrioritySemaphore(max_concurrent)
+        self.breaker = breaker
+        self.rate_limiter = rate_limiter
+
 
 class AIService:
     """使用OpenAI SDK规范处理AI API交互"""
     
-    def __init__(self):
-        self.provider = config.AI_PROVIDER
-        self.api_key = config.API_KEY
-        self.model = config.MODEL
+    def __init__(self, provider: Optional[str] = None, api_key: Optional[str] = None,
+                 model: Optional[str] = None, base_url: Optional[str] = None,
+                 use_cache: bool = True):
+        self.provider = provider or config.AI_PROVIDER
+        self.api_key = api_key or config.API_KEY
+        self.model = model or config.MODEL
+        self.base_url = base_url
         self.client = None
+        self.endpoints: List[ProviderEndpoint] = []
+        self._http_client = None
+        self.retry_policy = RetryPolicy(
+            max_attempts=getattr(config, "RETRY_MAX_ATTEMPTS", 3),
+            base_delay=getattr(config, "RETRY_BASE_DELAY", 0.5),
+            max_delay=getattr(config, "RETRY_MAX_DELAY", 8.0)
+        )
+        self.cache = self._create_cache() if use_cache else None
+        # 相同的进行中请求共享同一个结果
+        self._inflight = SingleFlight()
         self._initialize_client()
     
-    def _initialize_client(self):
-        """根据提供商初始化OpenAI兼容的客户端"""
-        
-        # API端点配置
-        api_configs = {
-            "openai": {
-                "base_url": None,  # 使用默认
-                "description": "OpenAI官方API"
-            },
-            "kimi": {
-                "base_url": "https://api.moonshot.cn/v1",
-                "description": "Kimi (月之暗面) API"
-            },
-            "deepseek": {
-                "base_url": "https://api.deepseek.com/v1",
-                "description": "DeepSeek API"
-            },
-            "zhipu": {
-                "base_url": "https://open.bigmodel.cn/api/paas/v4",
-                "description": "智谱AI API"
-            },
-            "qwen": {
-                "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1",
-                "description": "通义千问 API"
-            }
-        }
+    def _create_cache(self) -> Optional[ResponseCache]:
+        """根据配置创建回复缓存"""
+        if not getattr(config, "RESPONSE_CACHE_ENABLED", True):
+            return None
+        return ResponseCache(
+            max_entries=getattr(config, "RESPONSE_CACHE_SIZE", 512),
+            ttl=getattr(config, "RESPONSE_CACHE_TTL", 3600.0),
+            db_path=getattr(config, "RESPONSE_CACHE_PATH", None)
+        )
+    
+    def _create_http_client(self):
+        """创建所有对话共享的长连接池，避免每次请求重新握手"""
+        if httpx is None:
+            return None
         
-        if self.provider not in api_configs:
+        limits = httpx.Limits(
+            max_connections=getattr(config, "HTTP_MAX_CONNECTIONS", 20),
+            max_keepalive_connections=getattr(config, "HTTP_MAX_KEEPALIVE_CONNECTIONS", 10),
+            keepalive_expiry=getattr(config, "HTTP_KEEPALIVE_EXPIRY", 30.0)
+        )
+        return httpx.AsyncClient(
+            limits=limits,
+            timeout=getattr(config, "REQUEST_TIMEOUT", 30.0),
+            follow_redirects=True
+        )
+    
+    def _initialize_client(self):
+        """初始化主提供商和故障转移链上的OpenAI兼容异步客户端"""
+        if self.provider not in API_CONFIGS:
             print(f"错误: 不支持的AI提供商: {self.provider}")
-            print(f"支持的提供商: {', '.join(api_configs.keys())}")
+            print(f"支持的提供商: {', '.join(API_CONFIGS.keys())}")
             exit(1)
         
-        config_info = api_configs[self.provider]
-        
         try:
-            # 使用OpenAI SDK创建客户端
-            client_args = {"api_key": self.api_key}
-            if config_info["base_url"]:
-                client_args["base_url"] = config_info["base_url"]
-            
-            self.client = openai.OpenAI(**client_args)
-            
-            if config.DEBUG_MODE:
-                print(f"✅ 已初始化 {config_info['description']} 客户端")
-                print(f"   模型: {self.model}")
-                if config_info["base_url"]:
-                    print(f"   端点: {config_info['base_url']}")
-                
+            # 所有提供商复用同一个连接池
+            self._http_client = self._create_http_client()
+            primary = self._create_endpoint(self.provider, self.api_key, self.model, self.base_url)
+            self.client = primary.client
+            self.endpoints.append(primary)
         except Exception as e:
             print(f"错误: 客户端初始化失败: {e}")
             exit(1)
+        
+        # 备用提供商按配置顺序排在主提供商之后
+        for fallback in getattr(config, "FALLBACK_PROVIDERS", []):
+            provider = fallback.get("provider")
+            if provider not in API_CONFIGS:
+                print(f"警告: 忽略不支持的备用提供商: {provider}")
+                continue
+            try:
+                self.endpoints.append(
+                    self._create_endpoint(provider, fallback["api_key"], fallback["model"])
+                )
+            except Exception as e:
+                print(f"警告: 备用提供商 {provider} 初始化失败: {e}")
+    
+    def _create_endpoint(self, provider: str, api_key: str, model: str,
+                         base_url: Optional[str] = None) -> ProviderEndpoint:
+        """为一个提供商创建客户端、并发限制和熔断器"""
+        config_info = API_CONFIGS[provider]
+        base_url = base_url or config_info["base_url"]
+        
+        client_args = {
+            "api_key": api_key,
+            "timeout": getattr(config, "REQUEST_TIMEOUT", 30.0),
+            # 重试由 AIService 统一负责，避免与SDK内置重试叠加
+            "max_retries": 0
+        }
+        if base_url:
+            client_args["base_url"] = base_url
+        if self._http_client is not None:
+            client_args["http_client"] = self._http_client
+        
+        client = openai.AsyncOpenAI(**client_args)
+        breaker = CircuitBreaker(
+            failure_threshold=getattr(config, "CIRCUIT_FAILURE_THRESHOLD", 5),
+            reset_timeout=getattr(config, "CIRCUIT_RESET_TIMEOUT", 30.0)
+        )
+        
+        if config.DEBUG_MODE:
+            print(f"✅ 已初始化 {config_info['description']} 客户端")
+            print(f"   模型: {model}")
+            if base_url:
+                print(f"   端点: {base_url}")
+        
+        rate_limiter = create_rate_limiter(getattr(config, "RATE_LIMITS", {}), provider, model)
+        
+        return ProviderEndpoint(
+            provider, model, client,
+            getattr(config, "MAX_CONCURRENT_REQUESTS", 8), breaker, rate_limiter
+        )
+    
+    async def close(self):
+        """关闭客户端并释放连接池"""
+        for endpoint in self.endpoints:
+            await endpoint.client.close()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        if self.cache is not None:
+            self.cache.close()
     
     async def get_character_response(self, character_name: str, character_personality: str, 
-                                   player_message: str, context: str = "") -> str:
+                                   player_message: str, context: str = "",
+                                   history: Optional[Sequence[str]] = None,
+                                   priority: int = PRIORITY_INTERACTIVE,
+                                   memory: str = "",
+                                   recalled: Optional[Sequence[str]] = None) -> str:
         """
         使用OpenAI SDK规范获取AI角色回复
         
@@ -90,15 +219,24 @@ class AIService:
             character_personality: 角色个性描述
             player_message: 玩家消息
             context: 额外上下文信息
+            history: 最近的对话轮次（从旧到新），超出token预算时优先裁剪
+            priority: 限流排队时的优先级，后台任务应使用 PRIORITY_BACKGROUND
+            memory: 角色对更早对话的摘要记忆
+            recalled: 从长期记忆中检索到的相关旧对话（按相关度排序）
             
         Returns:
             角色的回复
         """
         try:
-            system_prompt = self._build_character_prompt(character_name, character_personality, context)
+            system_prompt, max_tokens = self._plan_request(
+                character_name, character_personality, player_message, context, history,
+                memory, recalled
+            )
             
             # 使用统一的OpenAI SDK调用方式
-            response = await self._get_openai_compatible_response(system_prompt, player_message)
+            response = await self._get_openai_compatible_response(
+                system_prompt, player_message, max_tokens, priority
+            )
             
             # 确保回复不会太长
             if len(response) > config.MAX_RESPONSE_LENGTH:
@@ -112,6 +250,157 @@ class AIService:
                 print(f"错误类型: {type(e)}")
             return f"{character_name} 看起来心不在焉，现在无法回应。"
     
+    async def stream_character_response(self, character_name: str, character_personality: str,
+                                        player_message: str, context: str = "",
+                                        history: Optional[Sequence[str]] = None,
+                                        priority: int = PRIORITY_INTERACTIVE,
+                                        memory: str = "",
+                                        recalled: Optional[Sequence[str]] = None) -> AsyncIterator[str]:
+        """
+        流式获取AI角色回复，收到的文本片段会立即产出
+        
+        超过 MAX_RESPONSE_LENGTH 时提前结束流，不再为会被丢弃的内容付费。
+        输出中途出错时最后产出 STREAM_INTERRUPTED。
+        
+        Args:
+            character_name: 角色名称
+            character_personality: 角色个性描述
+            player_message: 玩家消息
+            context: 额外上下文信息
+            history: 最近的对话轮次（从旧到新），超出token预算时优先裁剪
+            priority: 限流排队时的优先级
+            memory: 角色对更早对话的摘要记忆
+            recalled: 从长期记忆中检索到的相关旧对话（按相关度排序）
+            
+        Yields:
+            角色回复的文本片段
+        """
+        system_prompt, max_tokens = self._plan_request(
+            character_name, character_personality, player_message, context, history, memory,
+            recalled
+        )
+        
+        try:
+            async with aclosing(self._stream_openai_compatible_response(
+                    system_prompt, player_message, config.MAX_RESPONSE_LENGTH, max_tokens,
+                    priority)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+                    
+        except Exception as e:
+            if config.DEBUG_MODE:
+                print(f"AI服务错误: {e}")
+                print(f"错误类型: {type(e)}")
+            yield f"{character_name} 看起来心不在焉，现在无法回应。"
+    
+    async def prefetch_character_response(self, character_name: str, character_personality: str,
+                                          player_message: str, context: str = "",
+                                          history: Optional[Sequence[str]] = None,
+                                          memory: str = "",
+                                          recalled: Optional[Sequence[str]] = None) -> Optional[str]:
+        """
+        以后台优先级预先生成回复
+        
+        结果写入缓存；进行中时相同的对话请求会通过请求合并直接等待它。
+        失败时返回 None，而不是给玩家看的错误提示。
+        
+        Returns:
+            预取到的回复（已按 MAX_RESPONSE_LENGTH 截断），失败时为 None
+        """
+        system_prompt, max_tokens = self._plan_request(
+            character_name, character_personality, player_message, context, history, memory,
+            recalled
+        )
+        cached = await self._get_cached(system_prompt, player_message)
+        if cached is not None:
+            return self._truncate(cached, config.MAX_RESPONSE_LENGTH)
+        
+        try:
+            reply = await self._inflight.do(
+                self._request_key(system_prompt, player_message),
+                lambda: self._fetch_completion(
+                    system_prompt, player_message, max_tokens, PRIORITY_BACKGROUND
+                )
+            )
+        except Exception as e:
+            if config.DEBUG_MODE:
+                print(f"预取 {character_name} 的回复失败: {e}")
+            return None
+        
+        return self._truncate(reply, config.MAX_RESPONSE_LENGTH) if reply else None
+    
+    def _plan_request(self, name: str, personality: str, player_message: str,
+                      context: str, history: Optional[Sequence[str]],
+                      memory: str = "",
+                      recalled: Optional[Sequence[str]] = None) -> Tuple[str, int]:
+        """
+        在token预算内组装系统提示词并确定 max_tokens
+        
+        先丢弃最旧的对话轮次和最不相关的旧对话，再从末尾裁剪场景描述，
+        最后才裁剪记忆摘要；角色设定和玩家消息不裁剪。
+        """
+        counter = get_token_counter(self.model)
+        budgeter = ContextBudgeter(
+            counter,
+            getattr(config, "REQUEST_TOKEN_BUDGET", 1500),
+            getattr(config, "MIN_RESPONSE_TOKENS", 32)
+        )
+        sections = [
+            PromptSection("history", history or [], priority=0,
+                          header="Recent conversation history:\n", drop_oldest=True),
+            PromptSection("recalled", recalled or [], priority=0,
+                          header="Related earlier conversations:\n"),
+            PromptSection.from_text("context", context, priority=1),
+            PromptSection.from_text("memory", memory, priority=2,
+                                    header="Memory of earlier conversations:\n")
+        ]
+        fixed_text = self._build_character_prompt(name, personality, "") + player_message
+        fitted, max_tokens = budgeter.fit(
+            fixed_text, sections, counter.tokens_for_chars(config.MAX_RESPONSE_LENGTH)
+        )
+        
+        full_context = "\n\n".join(
+            part for part in (fitted["context"], fitted["memory"], fitted["recalled"],
+                              fitted["history"]) if part
+        )
+        return self._build_character_prompt(name, personality, full_context), max_tokens
+    
+    async def summarize_conversation(self, character_name: str, previous_summary: str,
+                                     turns: Sequence[str], max_length: int) -> Optional[str]:
+        """
+        把较早的对话合并进角色的记忆摘要（后台优先级，不经过缓存）
+        
+        Args:
+            character_name: 角色名称
+            previous_summary: 已有的记忆摘要
+            turns: 需要并入摘要的对话轮次（从旧到新）
+            max_length: 摘要的最大字符数
+            
+        Returns:
+            新的摘要，失败时为 None
+        """
+        system_prompt = (
+            f"你负责为文字RPG游戏中的角色 {character_name} 整理对玩家的记忆。"
+            f"把已有记忆和新的对话合并成一段不超过 {max_length} 字的中文摘要，"
+            "保留玩家透露的信息、双方的约定和关系的变化，省略寒暄。只输出摘要本身。"
+        )
+        user_message = (
+            f"已有记忆: {previous_summary or '（无）'}\n\n新的对话:\n" + "\n".join(turns)
+        )
+        counter = get_token_counter(self.model)
+        
+        try:
+            summary, _ = await self._request_completion(
+                system_prompt, user_message, counter.tokens_for_chars(max_length),
+                PRIORITY_BACKGROUND
+            )
+        except Exception as e:
+            if config.DEBUG_MODE:
+                print(f"整理 {character_name} 的记忆失败: {e}")
+            return None
+        
+        return summary[:max_length] if summary else None
+    
     def _build_character_prompt(self, name: str, personality: str, context: str) -> str:
         """构建角色系统提示词"""
         prompt = f"""你是 {name}，一个文字RPG游戏中的角色。
@@ -133,39 +422,328 @@ class AIService:
         
         return prompt
     
-    async def _get_openai_compatible_response(self, system_prompt: str, user_message: str) -> str:
-        """使用OpenAI SDK规范获取回复"""
+    def _build_messages(self, system_prompt: str, user_message: str) -> list:
+        """构建聊天补全请求的消息列表"""
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ]
+    
+    def _cache_key(self, endpoint: ProviderEndpoint, system_prompt: str, user_message: str) -> str:
+        """生成回复缓存键（按实际回答的提供商和模型区分）"""
+        return make_cache_key(endpoint.provider, endpoint.model, system_prompt, user_message)
+    
+    def _request_key(self, system_prompt: str, user_message: str) -> str:
+        """相同请求的合并键，与由哪个提供商回答无关"""
+        return self._cache_key(self.endpoints[0], system_prompt, user_message)
+    
+    async def _get_cached(self, system_prompt: str, user_message: str) -> Optional[str]:
+        """按故障转移顺序查找任一提供商缓存的回复"""
+        if self.cache is None:
+            return None
+        return await self.cache.get_any([
+            self._cache_key(endpoint, system_prompt, user_message) for endpoint in self.endpoints
+        ])
+    
+    def _store_cached(self, endpoint: ProviderEndpoint, system_prompt: str,
+                      user_message: str, reply: str):
+        """把回复缓存到实际回答它的提供商名下"""
+        if reply and self.cache is not None:
+            self.cache.set(self._cache_key(endpoint, system_prompt, user_message), reply)
+    
+    async def _get_openai_compatible_response(self, system_prompt: str, user_message: str,
+                                              max_tokens: int = 150,
+                                              priority: int = PRIORITY_INTERACTIVE) -> str:
+        """使用OpenAI SDK规范获取回复，优先使用缓存并合并相同的进行中请求"""
+        cached = await self._get_cached(system_prompt, user_message)
+        if cached is not None:
+            return cached
+        
+        while True:
+            try:
+                reply = await self._inflight.do(
+                    self._request_key(system_prompt, user_message),
+                    lambda: self._fetch_completion(system_prompt, user_message, max_tokens, priority)
+                )
+            except StreamAbandonedError:
+                # 加入的流式请求被发起者放弃了，重新发起（或加入新的）请求
+                continue
+            except Exception as e:
+                return self._describe_error(e)
+            break
+        
+        if not reply:
+            return "抱歉，我现在无法生成回复。"
+        return reply
+    
+    async def _fetch_completion(self, system_prompt: str, user_message: str,
+                                max_tokens: int, priority: int) -> str:
+        """实际发送请求并写入缓存（每组相同的并发请求只执行一次）"""
+        reply, endpoint = await self._request_completion(
+            system_prompt, user_message, max_tokens, priority
+        )
+        self._store_cached(endpoint, system_prompt, user_message, reply)
+        return reply
+    
+    async def _stream_openai_compatible_response(self, system_prompt: str, user_message: str,
+                                                 max_length: int, max_tokens: int = 150,
+                                                 priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[str]:
+        """
+        使用OpenAI SDK规范流式获取回复，优先使用缓存
+        
+        累计长度超过 max_length 时截断并关闭上游流。已有相同请求在进行时，
+        等待它完成并一次性产出结果，而不是再发一个请求。
+        """
+        cached = await self._get_cached(system_prompt, user_message)
+        if cached is not None:
+            yield self._truncate(cached, max_length)
+            return
+        
+        key = self._request_key(system_prompt, user_message)
+        while True:
+            shared = self._inflight.begin(key)
+            if shared is not None:
+                break
+            try:
+                reply = await self._inflight.wait(key)
+            except StreamAbandonedError:
+                # 发起者中途放弃了流，由自己（或另一个等待者）重新发起
+                continue
+            except Exception as e:
+                yield self._describe_error(e)
+                return
+            yield self._truncate(reply, max_length) if reply else "抱歉，我现在无法生成回复。"
+            return
+        
+        parts = []
+        produced = 0
+        answered: List[ProviderEndpoint] = []
         try:
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=150,
-                temperature=0.8
-            )
+            async with aclosing(self._request_stream(
+                    system_prompt, user_message, max_tokens, priority, answered)) as chunks:
+                async for chunk in chunks:
+                    remaining = max_length - produced
+                    if len(chunk) > remaining:
+                        # 达到长度上限，关闭上游流
+                        chunk = chunk[:remaining] + "..."
+                        parts.append(chunk)
+                        yield chunk
+                        break
+                    produced += len(chunk)
+                    parts.append(chunk)
+                    yield chunk
+                    
+        except Exception as e:
+            shared.set_exception(e)
+            message = self._describe_error(e)
+            # 已经输出了一部分时明确标记中断，而不是假装回复已经结束
+            yield STREAM_INTERRUPTED if parts else message
+            return
+        else:
+            reply = "".join(parts)
+            shared.set_result(reply)
+        finally:
+            if not shared.done():
+                # 调用者中途放弃了这个流，等待者不能拿到不完整的回复
+                shared.set_exception(StreamAbandonedError())
+        
+        if not parts:
+            yield "抱歉，我现在无法生成回复。"
+        else:
+            self._store_cached(answered[0], system_prompt, user_message, reply)
+    
+    def _truncate(self, reply: str, max_length: int) -> str:
+        """截断超长回复"""
+        if len(reply) > max_length:
+            return reply[:max_length] + "..."
+        return reply
+    
+    async def _handle_attempt_failure(self, endpoint: ProviderEndpoint, error: Exception,
+                                      attempt: int) -> bool:
+        """
+        记录一次失败并决定是否在同一提供商上重试
+        
+        只有瞬时错误（超时、429、5xx 等）说明提供商不健康，才计入熔断器；
+        400/401/404 之类的错误只结束本次试探。
+        
+        Returns:
+            True 表示已完成退避等待、应当重试；False 表示应转移到下一个提供商
+        """
+        if is_transient_error(error):
+            endpoint.breaker.record_failure()
+        else:
+            endpoint.breaker.release()
+        if config.DEBUG_MODE:
+            print(f"{endpoint.provider} 请求失败 (第{attempt + 1}次): {error}")
+        
+        if not is_transient_error(error) or attempt + 1 >= self.retry_policy.max_attempts:
+            return False
+        if not endpoint.breaker.allow_request():
+            return False
+        
+        await asyncio.sleep(self.retry_policy.get_delay(attempt))
+        return True
+    
+    async def _request_completion(self, system_prompt: str, user_message: str,
+                                  max_tokens: int = 150,
+                                  priority: int = PRIORITY_INTERACTIVE
+                                  ) -> Tuple[str, ProviderEndpoint]:
+        """
+        发送非流式请求，瞬时错误按退避重试，失败后依次转移到备用提供商
+        
+        Returns:
+            (回复, 实际回答的提供商)；所有提供商都失败时抛出最后一个异常
+        """
+        last_error: Exception = CircuitOpenError("所有AI提供商的熔断器均已打开")
+        
+        for endpoint in self.endpoints:
+            if not endpoint.breaker.allow_request():
+                continue
             
-            if response.choices and response.choices[0].message.content:
-                return response.choices[0].message.content.strip()
-            else:
-                return "抱歉，我现在无法生成回复。"
+            attempt = 0
+            while True:
+                try:
+                    reply = await self._complete_once(
+                        endpoint, system_prompt, user_message, max_tokens, priority
+                    )
+                except asyncio.CancelledError:
+                    # 被取消的请求不说明提供商是否健康，但必须交还试探名额
+                    endpoint.breaker.release()
+                    raise
+                except Exception as e:
+                    last_error = e
+                    if await self._handle_attempt_failure(endpoint, e, attempt):
+                        attempt += 1
+                        continue
+                    break
                 
-        except Exception as e:
-            if config.DEBUG_MODE:
-                print(f"API调用错误详情: {e}")
-                print(f"错误类型: {type(e)}")
+                endpoint.breaker.record_success()
+                return reply, endpoint
+        
+        raise last_error
+    
+    async def _request_stream(self, system_prompt: str, user_message: str,
+                              max_tokens: int = 150,
+                              priority: int = PRIORITY_INTERACTIVE,
+                              answered: Optional[List[ProviderEndpoint]] = None) -> AsyncIterator[str]:
+        """
+        发送流式请求并逐段产出文本
+        
+        只在收到第一个片段之前重试或转移提供商，已经输出的内容不会重复。
+        开始输出时把回答的提供商追加到 answered 中。
+        """
+        last_error: Exception = CircuitOpenError("所有AI提供商的熔断器均已打开")
+        
+        for endpoint in self.endpoints:
+            if not endpoint.breaker.allow_request():
+                continue
+            
+            attempt = 0
+            while True:
+                started = False
+                try:
+                    async with aclosing(self._stream_once(
+                            endpoint, system_prompt, user_message, max_tokens, priority)) as chunks:
+                        async for text in chunks:
+                            if not started:
+                                started = True
+                                endpoint.breaker.record_success()
+                                if answered is not None:
+                                    answered.append(endpoint)
+                            yield text
+                except (asyncio.CancelledError, GeneratorExit):
+                    if not started:
+                        endpoint.breaker.release()
+                    raise
+                except Exception as e:
+                    if started:
+                        if is_transient_error(e):
+                            endpoint.breaker.record_failure()
+                        raise
+                    last_error = e
+                    if await self._handle_attempt_failure(endpoint, e, attempt):
+                        attempt += 1
+                        continue
+                    break
+                
+                if not started:
+                    endpoint.breaker.record_success()
+                return
+        
+        raise last_error
+    
+    async def _wait_for_rate_limit(self, endpoint: ProviderEndpoint, system_prompt: str,
+                                   user_message: str, max_tokens: int, priority: int):
+        """按预计消耗的token数排队等待限流器放行"""
+        if endpoint.rate_limiter is None:
+            return
+        counter = get_token_counter(endpoint.model)
+        estimated = counter.count(system_prompt) + counter.count(user_message) + max_tokens
+        await endpoint.rate_limiter.acquire(estimated, priority)
+    
+    async def _complete_once(self, endpoint: ProviderEndpoint, system_prompt: str,
+                             user_message: str, max_tokens: int, priority: int) -> str:
+        """向单个提供商发送一次非流式请求"""
+        await self._wait_for_rate_limit(endpoint, system_prompt, user_message, max_tokens, priority)
+        async with endpoint.semaphore.slot(priority):
+            response = await endpoint.client.chat.completions.create(
+                model=endpoint.model,
+                messages=self._build_messages(system_prompt, user_message),
+                max_tokens=max_tokens,
+                temperature=0.8
+            )
+        
+        if response.choices and response.choices[0].message.content:
+            return response.choices[0].message.content.strip()
+        return ""
+    
+    async def _stream_once(self, endpoint: ProviderEndpoint, system_prompt: str,
+                           user_message: str, max_tokens: int, priority: int) -> AsyncIterator[str]:
+        """向单个提供商发送一次流式请求"""
+        await self._wait_for_rate_limit(endpoint, system_prompt, user_message, max_tokens, priority)
+        async with endpoint.semaphore.slot(priority):
+            stream = await endpoint.client.chat.completions.create(
+                model=endpoint.model,
+                messages=self._build_messages(system_prompt, user_message),
+                max_tokens=max_tokens,
+                temperature=0.8,
+                stream=True
+            )
             
-            # 处理常见错误
-            error_msg = str(e).lower()
-            if "404" in error_msg or "not found" in error_msg:
-                return "模型不可用，请检查模型名称是否正确。"
-            elif "401" in error_msg or "403" in error_msg or "permission" in error_msg:
-                return "API密钥无效，请检查密钥是否正确。"
-            elif "quota" in error_msg or "limit" in error_msg:
-                return "API配额已用完，请稍后再试。"
-            elif "connection" in error_msg or "timeout" in error_msg:
-                return "网络连接问题，请稍后再试。"
-            else:
-                return "AI服务暂时不可用，请稍后再试。"
+            started = False
+            try:
+                async for event in stream:
+                    if not event.choices:
+                        continue
+                    text = event.choices[0].delta.content
+                    if not text:
+                        continue
+                    if not started:
+                        # 与非流式模式的 strip() 保持一致
+                        text = text.lstrip()
+                        if not text:
+                            continue
+                        started = True
+                    yield text
+            finally:
+                # 提前退出时关闭连接，上游随即停止生成
+                await stream.close()
+    
+    def _describe_error(self, e: Exception) -> str:
+        """将API异常转换为给玩家看的提示"""
+        if config.DEBUG_MODE:
+            print(f"API调用错误详情: {e}")
+            print(f"错误类型: {type(e)}")
+        
+        # 处理常见错误
+        error_msg = str(e).lower()
+        if "404" in error_msg or "not found" in error_msg:
+            return "模型不可用，请检查模型名称是否正确。"
+        elif "401" in error_msg or "403" in error_msg or "permission" in error_msg:
+            return "API密钥无效，请检查密钥是否正确。"
+        elif "quota" in error_msg or "limit" in error_msg:
+            return "API配额已用完，请稍后再试。"
+        elif "connection" in error_msg or "timeout" in error_msg:
+            return "网络连接问题，请稍后再试。"
+        else:
+            return "AI服务暂时不可用，请稍后再试。"
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+AI service benchmark
+在本地假服务上测量 AIService 的吞吐量和延迟
+
+用法:
+    python benchmark.py --requests 200 --concurrency 50 --latency uniform:0.05,0.2
+
+默认每个请求使用不同的消息，测量的是上游请求本身；--repeat 让所有请求使用
+相同消息，此时测量的是请求合并（single-flight）的效果。回复缓存始终关闭，
+因此结果不受 config.py 中持久化缓存的影响。
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from ai_service import AIService
+from fake_llm_server import FakeLLMServer
+
+
+async def run_benchmark(requests: int, concurrency: int, latency: str, stream: bool,
+                        repeat: bool, seed: int) -> dict:
+    """并发发送请求并统计延迟（毫秒）"""
+    server = FakeLLMServer(latency=latency, seed=seed)
+    await server.start("127.0.0.1", 0)
+
+    # 关闭回复缓存，否则上一次运行写入磁盘的回复会让请求根本到不了假服务
+    service = AIService(provider="local", api_key="fake-key", model="fake-model",
+                        base_url=f"http://127.0.0.1:{server.port}/v1", use_cache=False)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    first_token: List[float] = []
+
+    async def one(index: int):
+        message = "你好" if repeat else f"你好 #{index}"
+        async with semaphore:
+            start = time.perf_counter()
+            if stream:
+                first = None
+                async for _ in service.stream_character_response(
+                        "Village Elder", "友善的长老", message, "当前在 Village Center。"):
+                    if first is None:
+                        first = time.perf_counter()
+                first_token.append((first - start) * 1000)
+            else:
+                await service.get_character_response(
+                    "Village Elder", "友善的长老", message, "当前在 Village Center。")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    await service.close()
+    await server.close()
+
+    latencies.sort()
+    result = {
+        "mode": "repeat (single-flight)" if repeat else "unique",
+        "requests": requests,
+        "upstream_requests": server.stats["requests"],
+        "throughput_rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "max_ms": latencies[-1],
+    }
+    if first_token:
+        result["ttft_p50_ms"] = statistics.median(first_token)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AIService 离线压测")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", default="uniform:0.05,0.2")
+    parser.add_argument("--stream", action="store_true", help="使用流式接口")
+    parser.add_argument("--repeat", action="store_true",
+                        help="所有请求使用相同消息，测量请求合并而不是上游吞吐")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(
+        args.requests, args.concurrency, args.latency, args.stream, args.repeat, args.seed
+    ))
+    for name, value in result.items():
+        print(f"{name:>18}: {value:.1f}" if isinstance(value, float) else f"{name:>18}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,65 @@
 """
 AI Character System
 """
-from typing import Dict, Optional
+from collections import deque
+from functools import partial
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from content_pack import ContentPack, default_content
+
+if TYPE_CHECKING:
+    from semantic_memory import SemanticMemory
+    from world import World
+
+
+class ConversationTurn:
+    """One exchange between the player and a character, rendered once for prompts"""
+    
+    __slots__ = ("player", "character", "rendered")
+    
+    def __init__(self, player: str, character: str, rendered: str):
+        self.player = player
+        self.character = character
+        self.rendered = rendered
 
 
 class Character:
     """Represents an AI-powered character in the game"""
     
-    def __init__(self, name: str, personality: str, location: str, description: str = ""):
+    def __init__(self, name: str, personality: str, location: str, description: str = "",
+                 history_window: int = 5):
         self.name = name
         self.personality = personality
-        self.location = location
+        self._location = location
+        # Called with (old, new) whenever the character moves, so indexes stay current
+        self._on_move: Optional[Callable[[str, str], None]] = None
         self.description = description
-        self.conversation_history = []
+        # Oldest turns fall off the front automatically once the window is full
+        self.turns: Deque[ConversationTurn] = deque(maxlen=max(1, history_window))
+        self._context_cache: Dict[int, Tuple[str, ...]] = {}
+        # Rolling summary of turns that left the window, and turns not summarized yet
+        self.memory_summary = ""
+        self.unsummarized_turns: List[ConversationTurn] = []
+        # Optional long-term store that every turn leaving the window is added to
+        self.long_term_memory: Optional["SemanticMemory"] = None
+    
+    @property
+    def location(self) -> str:
+        """ID of the location the character is in"""
+        return self._location
+    
+    @location.setter
+    def location(self, location: str):
+        previous = self._location
+        self._location = location
+        if self._on_move is not None and previous != location:
+            self._on_move(previous, location)
+    
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """Conversation history as plain dicts (oldest first)"""
+        return [{"player": turn.player, "character": turn.character} for turn in self.turns]
     
     def get_description(self) -> str:
         """Get character description for when player looks around"""
@@ -22,89 +69,142 @@ class Character:
     
     def add_conversation(self, player_message: str, character_response: str):
         """Add a conversation to history (for context in future interactions)"""
-        self.conversation_history.append({
-            "player": player_message,
-            "character": character_response
-        })
-        
-        # Keep only last 5 conversations to avoid context overload
-        if len(self.conversation_history) > 5:
-            self.conversation_history.pop(0)
-    
-    def get_conversation_context(self) -> str:
-        """Get recent conversation context for AI"""
-        if not self.conversation_history:
-            return ""
-        
-        context = "Recent conversation history:\n"
-        for conv in self.conversation_history[-3:]:  # Last 3 conversations
-            context += f"Player: {conv['player']}\n"
-            context += f"{self.name}: {conv['character']}\n"
-        
+        if len(self.turns) == self.turns.maxlen:
+            # Keep the turn that is about to fall off so it can be summarized and recalled
+            evicted = self.turns[0]
+            self.unsummarized_turns.append(evicted)
+            if self.long_term_memory is not None:
+                self.long_term_memory.remember(evicted.rendered)
+        self.turns.append(self._make_turn(player_message, character_response))
+        self._context_cache.clear()
+    
+    def _make_turn(self, player_message: str, character_response: str) -> ConversationTurn:
+        return ConversationTurn(
+            player_message,
+            character_response,
+            f"Player: {player_message}\n{self.name}: {character_response}"
+        )
+    
+    def recall(self, message: str, k: int = 3) -> List[str]:
+        """Earlier turns (outside the recent window) most relevant to a message"""
+        if self.long_term_memory is None:
+            return []
+        return list(self.long_term_memory.recall_texts(message, k))
+    
+    def update_memory(self, summary: str, summarized: int):
+        """Replace the memory summary after the oldest `summarized` pending turns were folded in"""
+        self.memory_summary = summary
+        del self.unsummarized_turns[:summarized]
+    
+    def to_state(self) -> Dict[str, Any]:
+        """Location and conversation state as plain data for saving"""
+        state: Dict[str, Any] = {"location": self.location}
+        if self.turns:
+            state["turns"] = [[turn.player, turn.character] for turn in self.turns]
+        if self.memory_summary:
+            state["summary"] = self.memory_summary
+        if self.unsummarized_turns:
+            state["pending"] = [[turn.player, turn.character] for turn in self.unsummarized_turns]
+        if self.long_term_memory is not None and len(self.long_term_memory):
+            state["memory"] = self.long_term_memory.export()
+        return state
+    
+    def load_state(self, state: Dict[str, Any]):
+        """Replace location and conversation state with data from `to_state`"""
+        self.location = state["location"]
+        self.turns.clear()
+        self.turns.extend(self._make_turn(player, reply) for player, reply in state.get("turns", ()))
+        self._context_cache.clear()
+        self.memory_summary = state.get("summary", "")
+        self.unsummarized_turns = [
+            self._make_turn(player, reply) for player, reply in state.get("pending", ())
+        ]
+        if self.long_term_memory is not None:
+            self.long_term_memory.clear()
+            for text in state.get("memory", ()):
+                self.long_term_memory.remember(text)
+    
+    def get_context_turns(self, limit: int = 3) -> Tuple[str, ...]:
+        """Get the most recent conversation turns rendered for the AI prompt"""
+        context = self._context_cache.get(limit)
+        if context is None:
+            start = max(0, len(self.turns) - limit)
+            context = tuple(turn.rendered for turn in islice(self.turns, start, None))
+            self._context_cache[limit] = context
         return context
 
 
 class CharacterManager:
     """Manages all characters in the game"""
     
-    def __init__(self):
+    def __init__(self, history_window: int = 5,
+                 memory_factory: Optional[Callable[[], Any]] = None,
+                 content: Optional[ContentPack] = None):
         self.characters: Dict[str, Character] = {}
-        self._create_default_characters()
+        # Creates each character's long-term memory store (None disables it)
+        self.memory_factory = memory_factory
+        # location_id -> {char_id: character}, kept current as characters move
+        self._by_location: Dict[str, Dict[str, Character]] = {}
+        # location_id -> counter bumped whenever someone arrives or leaves
+        self._occupancy_versions: Dict[str, int] = {}
+        self.history_window = history_window
+        self._load_characters(content if content is not None else default_content())
     
-    def _create_default_characters(self):
-        """Create the default set of characters"""
-        
-        # Village Elder - Wise and helpful
-        self.add_character(
-            "elder",
-            "Village Elder",
-            "A wise and kind elder who has lived in this village for decades. "
-            "He knows many stories and is always willing to help travelers.",
-            "village_center",
-            "The elder is a friendly, wise person who speaks with warmth and offers guidance. "
-            "He has seen many adventurers come and go, and enjoys sharing wisdom and stories."
-        )
-        
-        # Mysterious Merchant - Cryptic and intriguing
-        self.add_character(
-            "merchant",
-            "Mysterious Merchant",
-            "A traveling merchant with an air of mystery about them. "
-            "They seem to have exotic goods and knowledge from far-off lands.",
-            "market_square",
-            "The merchant is enigmatic and speaks in riddles sometimes. "
-            "They are knowledgeable about rare items and distant places, "
-            "but also enjoy being cryptic and mysterious in their responses."
-        )
-        
-        # Forest Guardian - Nature-loving and protective
-        self.add_character(
-            "guardian",
-            "Forest Guardian",
-            "An ancient being who protects the forest and its creatures. "
-            "They have a deep connection with nature.",
-            "enchanted_forest",
-            "The guardian is deeply connected to nature and speaks with reverence for all living things. "
-            "They are protective of the forest but kind to those who respect nature. "
-            "They often speak in metaphors related to plants, animals, and natural cycles."
-        )
-        
-        # Curious Scholar - Intellectual and inquisitive
-        self.add_character(
-            "scholar",
-            "Curious Scholar",
-            "A young scholar who is always eager to learn new things. "
-            "They carry books and seem fascinated by knowledge of all kinds.",
-            "ancient_library",
-            "The scholar is enthusiastic about learning and discovery. "
-            "They ask lots of questions, share interesting facts, and get excited about new knowledge. "
-            "They are friendly but can get carried away talking about their studies."
-        )
+    def _load_characters(self, content: ContentPack):
+        """Create the characters defined by the content pack"""
+        for char_id, record in content.characters.items():
+            self.add_character(
+                char_id,
+                record["name"],
+                record.get("description", ""),
+                record["location"],
+                record["personality"]
+            )
     
     def add_character(self, char_id: str, name: str, description: str, location: str, personality: str):
         """Add a new character to the game"""
-        character = Character(name, personality, location, description)
+        if char_id in self.characters:
+            self.remove_character(char_id)
+        character = Character(name, personality, location, description, self.history_window)
+        character._on_move = partial(self._relocate, char_id)
+        if self.memory_factory is not None:
+            character.long_term_memory = self.memory_factory()
         self.characters[char_id] = character
+        self._by_location.setdefault(location, {})[char_id] = character
+        self._bump(location)
+    
+    def remove_character(self, char_id: str) -> Optional[Character]:
+        """Remove a character from the game"""
+        character = self.characters.pop(char_id, None)
+        if character is not None:
+            character._on_move = None
+            self._unindex(char_id, character.location)
+        return character
+    
+    def _relocate(self, char_id: str, previous: str, location: str):
+        """Move a character between location buckets"""
+        character = self._unindex(char_id, previous)
+        if character is not None:
+            self._by_location.setdefault(location, {})[char_id] = character
+            self._bump(location)
+    
+    def _unindex(self, char_id: str, location: str) -> Optional[Character]:
+        occupants = self._by_location.get(location)
+        if occupants is None:
+            return None
+        character = occupants.pop(char_id, None)
+        if not occupants:
+            del self._by_location[location]
+        if character is not None:
+            self._bump(location)
+        return character
+    
+    def _bump(self, location: str):
+        self._occupancy_versions[location] = self._occupancy_versions.get(location, 0) + 1
+    
+    def occupancy_version(self, location: str) -> int:
+        """Changes whenever a character enters or leaves the location"""
+        return self._occupancy_versions.get(location, 0)
     
     def get_character(self, char_id: str) -> Optional[Character]:
         """Get a character by ID"""
@@ -112,11 +212,41 @@ class CharacterManager:
     
     def get_characters_in_location(self, location: str) -> Dict[str, Character]:
         """Get all characters in a specific location"""
-        return {
-            char_id: character 
-            for char_id, character in self.characters.items() 
-            if character.location == location
-        }
+        return dict(self._by_location.get(location, {}))
+    
+    def count_in_location(self, location: str) -> int:
+        """Number of characters in a location"""
+        return len(self._by_location.get(location, ()))
+    
+    def occupied_locations(self) -> List[str]:
+        """IDs of all locations that currently have at least one character"""
+        return list(self._by_location)
+    
+    def get_characters_within(self, world: "World", location: str,
+                              max_exits: int) -> List[Tuple[str, Character, int]]:
+        """
+        Get characters at most `max_exits` moves away, nearest first
+        
+        Returns (char_id, character, distance) tuples. Only the locations within
+        range are visited, not every character.
+        """
+        found = []
+        frontier = [location]
+        seen = {location}
+        for distance in range(max_exits + 1):
+            next_frontier = []
+            for location_id in frontier:
+                for char_id, character in self._by_location.get(location_id, {}).items():
+                    found.append((char_id, character, distance))
+                place = world.get_location(location_id)
+                if place is None or distance == max_exits:
+                    continue
+                for neighbour in place.exits.values():
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        return found
     
     def list_all_characters(self) -> Dict[str, Character]:
         """Get all characters"""
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Multi-process Game Server
+
+A supervisor accepts connections, asks each player's name and hands the
+socket to one of a pool of worker processes chosen by that name, so a
+player's sessions and save files always live in the same worker. Every worker
+runs a GameServer of its own with its own AI service; the world, characters
+and items are compiled once into the content cache, which each worker opens
+as a read-only memory map, so the operating system keeps a single copy of
+them for the whole pool.
+
+    python src/cluster.py           # then: telnet 127.0.0.1 4000
+
+Unix only: sockets are passed to workers over a pipe (SCM_RIGHTS).
+"""
+import asyncio
+import os
+import signal
+import socket
+import sys
+import tempfile
+import types
+import zlib
+from multiprocessing import get_context, reduction
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set
+
+from content_pack import load_content
+
+# Workers are fresh interpreters that import this module before they have a
+# config; anything that imports config (server, main) is imported inside the
+# functions that need it, after _install_settings.
+
+_spawn = get_context("spawn")
+
+
+def shard_for(name: str, workers: int) -> int:
+    """The worker that hosts a player (stable across restarts, unlike hash())"""
+    return zlib.crc32(name.encode("utf-8")) % workers
+
+
+def _install_settings(settings: Mapping[str, Any]):
+    config = types.ModuleType("config")
+    config.__dict__.update(settings)
+    sys.modules["config"] = config
+
+
+def _worker_main(conn: Connection, settings: Dict[str, Any],
+                 ai_factory: Optional[Callable[[], Any]], max_sessions: int):
+    # Ctrl+C reaches the whole process group; the supervisor stops us by closing the pipe,
+    # which lets the sessions save their journals first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _install_settings(settings)
+    asyncio.run(_serve_worker(conn, settings, ai_factory, max_sessions))
+
+
+async def _serve_worker(conn: Connection, settings: Mapping[str, Any],
+                        ai_factory: Optional[Callable[[], Any]], max_sessions: int):
+    from server import GameServer
+
+    server = GameServer(max_sessions=max_sessions,
+                        ai_service=ai_factory() if ai_factory is not None else None,
+                        save_dir=settings.get("SAVE_DIR"))
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+
+    async def play(name: str, sock: socket.socket):
+        try:
+            reader, writer = await asyncio.open_connection(sock=sock)
+            await server.run_session(reader, writer, name)
+        finally:
+            try:
+                conn.send(("ended", name))
+            except OSError:
+                pass  # the supervisor is gone
+
+    def on_message():
+        try:
+            kind, name = conn.recv()
+            sock = socket.socket(fileno=reduction.recv_handle(conn))
+        except (EOFError, OSError):
+            # The supervisor closed its end (or died): shut down
+            loop.remove_reader(conn.fileno())
+            stopped.set()
+            return
+        sock.setblocking(False)
+        asyncio.ensure_future(play(name, sock))
+
+    loop.add_reader(conn.fileno(), on_message)
+    await stopped.wait()
+    await server.close()
+
+
+class Worker:
+    """A worker process and the supervisor's end of its pipe"""
+
+    def __init__(self, process: Any, conn: Connection):
+        self.process = process
+        self.conn = conn
+
+
+class Supervisor:
+    """Accepts players and spreads their sessions across worker processes"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 4000, workers: int = 0,
+                 max_sessions: int = 500, settings: Optional[Mapping[str, Any]] = None,
+                 ai_factory: Optional[Callable[[], Any]] = None):
+        """
+        Args:
+            workers: Number of worker processes (0 for one per CPU)
+            settings: Config values for the workers (the current config if None)
+            ai_factory: Picklable callable that creates each worker's AI service
+                (AIService if None)
+        """
+        if settings is None:
+            from main import config
+            settings = {name: value for name, value in vars(config).items() if name.isupper()}
+        self.host = host
+        self.port = port
+        self.worker_count = workers or os.cpu_count() or 1
+        self.max_sessions = max_sessions
+        self.settings = dict(settings)
+        # Each worker gets an equal share of the provider rate limits
+        self.settings["RATE_LIMITS"] = {
+            key: {unit: amount / self.worker_count for unit, amount in limits.items()}
+            for key, limits in self.settings.get("RATE_LIMITS", {}).items()
+        }
+        # Workers share the content only through the compiled cache, so there must be one
+        if not self.settings.get("CONTENT_CACHE_DIR"):
+            self.settings["CONTENT_CACHE_DIR"] = os.path.join(tempfile.gettempdir(), "chat-game-content")
+        self.ai_factory = ai_factory
+        self.workers: List[Optional[Worker]] = [None] * self.worker_count
+        self.sessions: Dict[str, int] = {}  # player name -> worker index
+        self._listener: Optional[socket.socket] = None
+        self._accepting: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._closing = False
+
+    async def start(self):
+        """Compile the content, start the workers and listen; returns once the socket is bound"""
+        # Compile before spawning so the workers only ever map the finished cache
+        # (and a broken pack stops the server here, not in every worker)
+        load_content(self.settings.get("CONTENT_PACKS") or None, self.settings["CONTENT_CACHE_DIR"])
+        for index in range(self.worker_count):
+            self._start_worker(index)
+
+        self._listener = socket.create_server((self.host, self.port))
+        self._listener.setblocking(False)
+        self.port = self._listener.getsockname()[1]  # port 0 picks a free port
+        self._accepting = asyncio.ensure_future(self._accept())
+
+    def _start_worker(self, index: int):
+        conn, child_conn = _spawn.Pipe()
+        process = _spawn.Process(
+            target=_worker_main, name=f"game-worker-{index}", daemon=True,
+            args=(child_conn, self.settings, self.ai_factory, self.max_sessions)
+        )
+        process.start()
+        child_conn.close()
+        self.workers[index] = Worker(process, conn)
+        asyncio.get_running_loop().add_reader(conn.fileno(), self._on_worker_message, index)
+
+    def _on_worker_message(self, index: int):
+        worker = self.workers[index]
+        try:
+            kind, name = worker.conn.recv()
+        except (EOFError, OSError):
+            self._worker_exited(index)
+            return
+        if kind == "ended" and self.sessions.get(name) == index:
+            del self.sessions[name]
+
+    def _worker_exited(self, index: int):
+        worker = self.workers[index]
+        asyncio.get_running_loop().remove_reader(worker.conn.fileno())
+        worker.conn.close()
+        for name in [name for name, shard in self.sessions.items() if shard == index]:
+            del self.sessions[name]
+        if not self._closing:
+            # Its players were disconnected; later players on this shard get a new worker
+            print(f"⚠️ 工作进程 {index} 已退出，正在重启")
+            self._start_worker(index)
+
+    async def serve_forever(self):
+        if self._listener is None:
+            await self.start()
+        await self._accepting
+
+    async def _accept(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            sock, _ = await loop.sock_accept(self._listener)
+            sock.setblocking(False)
+            task = asyncio.ensure_future(self._handle(sock))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, sock: socket.socket):
+        from server import clean_name
+
+        try:
+            if len(self.sessions) >= self.max_sessions:
+                await self._say(sock, "😔 服务器已满，请稍后再来。\n")
+                return
+            for _ in range(3):
+                await self._say(sock, "请输入您的名字: ")
+                line = await self._recv_line(sock)
+                if line is None:
+                    return
+                name = clean_name(line)
+                if not name:
+                    continue
+                if name in self.sessions:
+                    await self._say(sock, f"'{name}' 已经在游戏中了，请换一个名字。\n")
+                    continue
+                self._hand_off(name, sock)
+                return
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            sock.close()  # the worker has its own copy
+
+    def _hand_off(self, name: str, sock: socket.socket):
+        index = shard_for(name, self.worker_count)
+        worker = self.workers[index]
+        worker.conn.send(("session", name))
+        reduction.send_handle(worker.conn, sock.fileno(), worker.process.pid)
+        self.sessions[name] = index
+
+    async def _say(self, sock: socket.socket, text: str):
+        await asyncio.get_running_loop().sock_sendall(sock, text.replace("\n", "\r\n").encode("utf-8"))
+
+    async def _recv_line(self, sock: socket.socket) -> Optional[str]:
+        """
+        The next line from a client, telnet negotiation removed; None if it left
+
+        Only the bytes up to the newline are taken off the socket: whatever the
+        player typed after it is still there for the worker to read.
+        """
+        from server import strip_telnet
+
+        loop = asyncio.get_running_loop()
+        line = b""
+        while len(line) < 4096:
+            readable = loop.create_future()
+            loop.add_reader(sock.fileno(), lambda: readable.done() or readable.set_result(None))
+            try:
+                await readable
+            finally:
+                loop.remove_reader(sock.fileno())
+            data = sock.recv(4096, socket.MSG_PEEK)
+            if not data:
+                return None
+            end = data.find(b"\n")
+            line += sock.recv(end + 1 if end >= 0 else len(data))
+            if end >= 0:
+                text, _, _ = strip_telnet(line)
+                return text.decode("utf-8", errors="replace")
+        return None
+
+    async def close(self):
+        """Stop accepting players, end every session and stop the workers"""
+        self._closing = True
+        if self._listener is not None:
+            self._accepting.cancel()
+            self._listener.close()
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            if worker is not None and not worker.conn.closed:
+                loop.remove_reader(worker.conn.fileno())
+                worker.conn.close()  # a worker stops when its pipe closes
+        for worker in self.workers:
+            if worker is not None:
+                await loop.run_in_executor(None, worker.process.join, 5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+        self.sessions.clear()
+
+
+async def main():
+    """Run the supervisor and its workers until interrupted"""
+    from main import config
+
+    supervisor = Supervisor(
+        getattr(config, "SERVER_HOST", "127.0.0.1"),
+        getattr(config, "SERVER_PORT", 4000),
+        getattr(config, "SERVER_WORKERS", 0),
+        getattr(config, "SERVER_MAX_SESSIONS", 500)
+    )
+    await supervisor.start()
+    print(f"🌐 {config.GAME_TITLE} 服务器已启动: telnet {supervisor.host} {supervisor.port}"
+          f"（{supervisor.worker_count} 个工作进程）")
+    try:
+        await supervisor.serve_forever()
+    finally:
+        await supervisor.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n👋 服务器已关闭。")
@@ -0,0 +1,150 @@
+"""
+Command Registry
+
+Maps what the player types to command handlers. Every alias (English or
+Chinese) is looked up in one dict, and unambiguous abbreviations are resolved
+through a prefix trie, so dispatch costs the same however many commands are
+registered. Handlers receive the game they run for, so one registry can be
+shared by every session. Plugins add verbs through the same `register` call
+the built-in commands use.
+"""
+import importlib
+import inspect
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+Handler = Callable[[Any, List[str]], Union[None, Awaitable[None]]]
+
+
+class Command:
+    """A verb, its aliases and the function that runs it"""
+
+    __slots__ = ("name", "handler", "aliases", "usage", "help", "prompt")
+
+    def __init__(self, name: str, handler: Handler, aliases: Sequence[str] = (),
+                 usage: str = "", help: str = "", prompt: str = ""):
+        self.name = name
+        self.handler = handler  # called with (game, argument words); may be a coroutine function
+        self.aliases = tuple(aliases)
+        self.usage = usage or name  # e.g. "take <物品> / 拿 <物品>"
+        self.help = help
+        # Shown instead of calling the handler when the command needs arguments and got none
+        self.prompt = prompt
+
+
+class _TrieNode:
+    __slots__ = ("children", "commands")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # name -> how many of that command's aliases start with this prefix
+        self.commands: Dict[str, int] = {}
+
+
+class CommandRegistry:
+    """Commands by alias, plus a prefix trie for abbreviations"""
+
+    def __init__(self):
+        self.commands: Dict[str, Command] = {}  # name -> command, in registration order
+        self._aliases: Dict[str, Command] = {}
+        self._abbreviated: Dict[str, bool] = {}  # name -> whether its aliases are in the trie
+        self._trie = _TrieNode()
+
+    def register(self, name: str, handler: Handler, aliases: Sequence[str] = (),
+                 usage: str = "", help: str = "", prompt: str = "",
+                 abbreviate: bool = True) -> Command:
+        """
+        Add a command, replacing one with the same name
+
+        An alias already used by another command moves to the new one.
+
+        Args:
+            abbreviate: Whether unambiguous prefixes of the name and aliases also
+                select this command (e.g. "inv" for "inventory")
+        """
+        self.unregister(name)
+        words = list(dict.fromkeys(word.lower() for word in (name, *aliases)))
+        for word in words:
+            previous = self._aliases.get(word)
+            if previous is not None:
+                self._drop_word(previous, word)
+                previous.aliases = tuple(alias for alias in previous.aliases if alias.lower() != word)
+        command = Command(name, handler, words[1:], usage, help, prompt)
+        self.commands[name] = command
+        self._abbreviated[name] = abbreviate
+        for word in words:
+            self._aliases[word] = command
+            if abbreviate:
+                node = self._trie
+                for char in word:
+                    node = node.children.setdefault(char, _TrieNode())
+                    node.commands[name] = node.commands.get(name, 0) + 1
+        return command
+
+    def unregister(self, name: str) -> Optional[Command]:
+        """Remove a command and all of its aliases"""
+        command = self.commands.get(name)
+        if command is None:
+            return None
+        for word in (name.lower(), *command.aliases):
+            if self._aliases.get(word) is command:
+                self._drop_word(command, word)
+        del self.commands[name]
+        del self._abbreviated[name]
+        return command
+
+    def _drop_word(self, command: Command, word: str):
+        del self._aliases[word]
+        if not self._abbreviated[command.name]:
+            return
+        node = self._trie
+        for char in word:
+            child = node.children[char]
+            count = child.commands[command.name] - 1
+            if count:
+                child.commands[command.name] = count
+            else:
+                del child.commands[command.name]
+            if not child.commands:
+                del node.children[char]  # nothing left below this prefix
+                return
+            node = child
+
+    def resolve(self, word: str) -> Tuple[Optional[Command], List[str]]:
+        """
+        Find the command for a typed word
+
+        Returns (command, []) on an exact alias or unambiguous prefix, otherwise
+        (None, names of the commands the prefix could mean); the list is empty
+        when nothing matches.
+        """
+        word = word.lower()
+        command = self._aliases.get(word)
+        if command is not None:
+            return command, []
+        node = self._trie
+        for char in word:
+            node = node.children.get(char)
+            if node is None:
+                return None, []
+        names = list(node.commands)
+        if len(names) == 1:
+            return self.commands[names[0]], []
+        return None, names
+
+    async def dispatch(self, command: Command, game: Any, args: List[str]):
+        """Run a command's handler for a game, awaiting it if it is a coroutine function"""
+        result = command.handler(game, args)
+        if inspect.isawaitable(result):
+            await result
+
+
+def load_plugins(registry: CommandRegistry, modules: Sequence[str]):
+    """
+    Import command plugins
+
+    Each module must define `register_commands(registry)`, which adds its verbs
+    with `registry.register(...)`; handlers are called as handler(game, args).
+    """
+    for module_name in modules:
+        module = importlib.import_module(module_name)
+        module.register_commands(registry)
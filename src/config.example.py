@@ -2,7 +2,7 @@
 # 复制此文件为 config.py 并设置您的实际值
 
 # AI提供商配置 (所有提供商都使用OpenAI SDK规范)
-AI_PROVIDER = "openai"  # 选项: "openai", "kimi", "deepseek", "zhipu", "qwen"
+AI_PROVIDER = "openai"  # 选项: "openai", "kimi", "deepseek", "zhipu", "qwen", "local"
 API_KEY = "your-api-key-here"  # 在这里填入您的API密钥
 MODEL = "gpt-3.5-turbo"  # 根据提供商选择合适的模型
 
@@ -20,5 +20,70 @@ MODEL = "gpt-3.5-turbo"  # OpenAI: "gpt-3.5-turbo", Anthropic: "claude-3-haiku-2
 
 # 游戏设置
 GAME_TITLE = "AI RPG 聊天游戏"
+CONTENT_PACKS = []  # 世界与角色内容包（JSON/TOML），按顺序合并，后面的覆盖前面的；留空使用内置的 content/default.json
+CONTENT_CACHE_DIR = ".content_cache"  # 编译后内容包的缓存目录（内容变化后自动重新编译），设为 None 不使用缓存
+COMPACT_WORLD = False  # 把地点压缩存放在数组中（适合数万个地点以上的超大世界，内存占用小得多）
 MAX_RESPONSE_LENGTH = 200  # AI回复的最大长度
 DEBUG_MODE = False  # 生产环境请设为False
+CONVERSATION_WINDOW = 5  # 每个角色保留的最近对话轮数
+MEMORY_SUMMARY_LENGTH = 150  # 更早的对话在后台整理成的记忆摘要的最大字数
+MEMORY_SUMMARY_BATCH = 2  # 移出窗口的对话攒够多少轮后再整理
+LONG_TERM_MEMORY = True  # 移出窗口的对话存入本地长期记忆，对话时检索相关的几轮（安装 numpy 后更快）
+LONG_TERM_MEMORY_SIZE = 5000  # 每个角色最多保存的长期记忆条数
+LONG_TERM_MEMORY_RECALL = 3  # 每次对话最多带上的相关旧对话轮数
+SAVE_DIR = "saves"  # 存档目录：移动和对话写入追加日志，下次启动时自动恢复（删除该目录即可重新开始），设为 None 不存档
+SAVE_SNAPSHOT_EVERY = 200  # 每记录这么多事件写一次完整快照，恢复时只需重放快照之后的事件
+NPC_BEHAVIOUR = True  # 角色按内容包中的巡逻路线和作息自行走动，地点偶尔出现环境描写
+DAY_LENGTH = 1440.0  # 游戏中一天对应的现实秒数（默认现实1分钟 = 游戏1小时）
+START_HOUR = 8  # 游戏开始时的钟点
+AMBIENT_INTERVAL = 60.0  # 环境描写的间隔（秒），设为 0 关闭
+SCHEDULER_TICK = 0.5  # 定时事件的时间精度（秒）
+COMMAND_PLUGINS = []  # 提供新命令的模块名，每个模块定义 register_commands(registry)
+
+# 多人服务器（python src/server.py，用 telnet 连接）
+SERVER_HOST = "127.0.0.1"  # 监听地址，只在本机使用时保持 127.0.0.1
+SERVER_PORT = 4000  # 监听端口
+SERVER_MAX_SESSIONS = 500  # 同时在线的最大玩家数；每个玩家的存档在 SAVE_DIR/players/<名字> 下
+SERVER_WORKERS = 0  # python src/cluster.py 的工作进程数（0 表示每个CPU一个）；玩家按名字分到固定的进程，RATE_LIMITS 由各进程平分
+STREAM_RESPONSES = True  # 逐字显示角色回复，缩短首字等待时间
+PREFETCH_OPENERS = False  # 进入地点时在后台预先生成在场角色对开场白的回复（会额外消耗API调用）
+PREFETCH_MESSAGE = "你好"  # 预取时假设玩家说的第一句话（与 talk <角色> 的默认消息一致）
+
+# 连接与并发设置
+MAX_CONCURRENT_REQUESTS = 8  # 每个提供商同时进行的最大请求数
+HTTP_MAX_CONNECTIONS = 20  # 共享连接池的最大连接数
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10  # 保持长连接的空闲连接数
+HTTP_KEEPALIVE_EXPIRY = 30.0  # 空闲连接的保持时间（秒）
+REQUEST_TIMEOUT = 30.0  # 单次请求超时时间（秒）
+
+# 回复缓存设置（相同角色、场景和消息的回复会被复用）
+RESPONSE_CACHE_ENABLED = True  # 是否启用回复缓存
+RESPONSE_CACHE_SIZE = 512  # 内存中最多缓存的回复数
+RESPONSE_CACHE_TTL = 3600.0  # 缓存有效期（秒）
+RESPONSE_CACHE_PATH = "response_cache.db"  # 持久化缓存文件，设为 None 只使用内存缓存
+
+# 重试、熔断与故障转移
+RETRY_MAX_ATTEMPTS = 3  # 超时、429、5xx 等瞬时错误的最大尝试次数
+RETRY_BASE_DELAY = 0.5  # 指数退避的初始等待（秒），实际等待带随机抖动
+RETRY_MAX_DELAY = 8.0  # 单次退避的最长等待（秒）
+CIRCUIT_FAILURE_THRESHOLD = 5  # 连续失败多少次后暂停使用该提供商
+CIRCUIT_RESET_TIMEOUT = 30.0  # 熔断后多久再次尝试（秒）
+# 主提供商不可用时按顺序尝试的备用提供商（每项需要自己的密钥和模型）
+FALLBACK_PROVIDERS = [
+    # {"provider": "kimi", "api_key": "sk-...", "model": "moonshot-v1-8k"},
+    # {"provider": "deepseek", "api_key": "sk-...", "model": "deepseek-chat"},
+]
+
+# Token预算（提示词 + 回复）
+REQUEST_TOKEN_BUDGET = 1500  # 单次请求的token上限，超出时先裁剪旧对话再裁剪场景描述
+MIN_RESPONSE_TOKENS = 32  # 回复至少保留的token数
+
+# 限流：按提供商或 "提供商:模型" 设置每分钟请求数(rpm)和token数(tpm)，未列出的不限流
+# 超出限额的请求会排队等待，玩家的对话优先于后台任务
+RATE_LIMITS = {
+    # "kimi": {"rpm": 3, "tpm": 32000},
+    # "openai:gpt-4": {"rpm": 500, "tpm": 10000},
+}
+
+# 本地假服务地址（AI_PROVIDER = "local" 时使用，见 fake_llm_server.py）
+LOCAL_BASE_URL = "http://127.0.0.1:8765/v1"
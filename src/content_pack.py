@@ -0,0 +1,385 @@
+"""
+Content Packs
+
+World locations, characters and items are loaded from pack files (JSON or TOML).
+Validated packs are compiled to a binary cache keyed by the hash of their
+contents; records in the cache are read from a memory map only when the game
+needs them, so processes that open the same cache share one copy of the world.
+"""
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    tomllib = None
+
+from world_graph import CompactGraph
+
+
+DEFAULT_PACK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content", "default.json")
+
+# Bump when the compiled layout or record format changes
+CACHE_VERSION = 4
+_CACHE_MAGIC = b"CGPK"
+# magic, version, sha256 of the packs, length of the marshalled index
+_CACHE_HEADER = struct.Struct("<4sH32sQ")
+# Sections stored as one record each, in file order
+_RECORD_SECTIONS = ("locations", "characters", "items")
+
+# field -> (type, required)
+LOCATION_SCHEMA: Dict[str, Tuple[type, bool]] = {
+    "name": (str, True),
+    "description": (str, True),
+    "exits": (dict, False),
+    "items": (list, False),  # IDs of the items lying here at the start
+    "ambient": (list, False),  # lines shown now and then while the player is here
+}
+CHARACTER_SCHEMA: Dict[str, Tuple[type, bool]] = {
+    "name": (str, True),
+    "description": (str, False),
+    "location": (str, True),
+    "personality": (str, True),
+    "patrol": (dict, False),  # {"route": [location_id, ...], "interval": seconds}
+    "schedule": (dict, False),  # {"<hour 0-23>": location_id}, e.g. shop hours
+}
+ITEM_SCHEMA: Dict[str, Tuple[type, bool]] = {
+    "name": (str, True),
+    "description": (str, False),
+    "tags": (list, False),
+    "use": (str, False),  # shown when the player uses the item
+    "consumable": (bool, False),  # used up after one use
+    "hidden": (bool, False),  # only found by searching
+}
+PACK_SCHEMA: Dict[str, Tuple[type, bool]] = {
+    "name": (str, False),
+    "start": (str, False),
+    "locations": (dict, False),
+    "characters": (dict, False),
+    "items": (dict, False),
+}
+
+
+class ContentPackError(ValueError):
+    """A pack file could not be read or does not match the schema"""
+
+
+class LazyRecords(Mapping):
+    """Read-only mapping of id -> record, unmarshalled from a buffer on every access"""
+
+    def __init__(self, buffer: Any, base: int, index: Dict[str, Tuple[int, int]]):
+        self._buffer = buffer
+        self._base = base
+        self._index = index
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        offset, length = self._index[key]
+        start = self._base + offset
+        return marshal.loads(self._buffer[start:start + length])
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class ContentPack:
+    """Validated world content: the start location, location records, characters and items"""
+
+    def __init__(self, name: str, start: str, locations: Mapping, characters: Mapping,
+                 digest: str = "", items: Optional[Mapping] = None):
+        self.name = name
+        self.start = start
+        self.locations = locations  # location_id -> {"name", "description", "exits", "items", ...}
+        self.characters = characters  # char_id -> {"name", "description", "location", "personality", ...}
+        self.digest = digest
+        # item_id -> {"name", "description", "tags", ..., "location"}; "location" is
+        # filled in from the location that lists the item
+        self.items = items if items is not None else {}
+
+    def compacted(self) -> "ContentPack":
+        """The same content with locations packed into a CompactGraph (for very large worlds)"""
+        return ContentPack(self.name, self.start, CompactGraph.from_records(self.locations),
+                           self.characters, self.digest, self.items)
+
+
+def _check_fields(record: Any, schema: Dict[str, Tuple[type, bool]], where: str):
+    if not isinstance(record, dict):
+        raise ContentPackError(f"{where}: 应为表/对象")
+    for field, (expected, required) in schema.items():
+        if field not in record:
+            if required:
+                raise ContentPackError(f"{where}: 缺少字段 '{field}'")
+            continue
+        if not isinstance(record[field], expected):
+            raise ContentPackError(f"{where}.{field}: 类型应为 {expected.__name__}")
+    unknown = set(record) - set(schema)
+    if unknown:
+        raise ContentPackError(f"{where}: 未知字段 {', '.join(sorted(unknown))}")
+
+
+def validate_pack(data: Any, source: str = "<pack>"):
+    """Check one pack against the schema (references are checked after merging)"""
+    _check_fields(data, PACK_SCHEMA, source)
+    for location_id, record in data.get("locations", {}).items():
+        where = f"{source}: locations.{location_id}"
+        _check_fields(record, LOCATION_SCHEMA, where)
+        for direction, target in record.get("exits", {}).items():
+            if not isinstance(target, str):
+                raise ContentPackError(f"{where}.exits.{direction}: 类型应为 str")
+        for field in ("items", "ambient"):
+            if not all(isinstance(line, str) for line in record.get(field, [])):
+                raise ContentPackError(f"{where}.{field}: 每一项都应为 str")
+    for char_id, record in data.get("characters", {}).items():
+        where = f"{source}: characters.{char_id}"
+        _check_fields(record, CHARACTER_SCHEMA, where)
+        patrol = record.get("patrol")
+        if patrol is not None:
+            route = patrol.get("route")
+            interval = patrol.get("interval")
+            if not route or not isinstance(route, list) or not all(isinstance(stop, str) for stop in route):
+                raise ContentPackError(f"{where}.patrol.route: 应为非空的地点ID列表")
+            if isinstance(interval, bool) or not isinstance(interval, (int, float)) or interval <= 0:
+                raise ContentPackError(f"{where}.patrol.interval: 应为正数（秒）")
+        for hour, location_id in record.get("schedule", {}).items():
+            if not str(hour).isdigit() or int(hour) > 23 or not isinstance(location_id, str):
+                raise ContentPackError(f"{where}.schedule.{hour}: 应为 0-23 点 -> 地点ID")
+    for item_id, record in data.get("items", {}).items():
+        where = f"{source}: items.{item_id}"
+        _check_fields(record, ITEM_SCHEMA, where)
+        if not all(isinstance(tag, str) for tag in record.get("tags", [])):
+            raise ContentPackError(f"{where}.tags: 每一项都应为 str")
+
+
+def _check_references(content: Dict[str, Any]):
+    locations = content["locations"]
+    if not locations:
+        raise ContentPackError("内容包中没有任何地点")
+    if content["start"] not in locations:
+        raise ContentPackError(f"起始地点 '{content['start']}' 不存在")
+    for location_id, record in locations.items():
+        for direction, target in record["exits"].items():
+            if target not in locations:
+                raise ContentPackError(
+                    f"locations.{location_id}.exits.{direction}: 地点 '{target}' 不存在"
+                )
+    for char_id, record in content["characters"].items():
+        places = [("location", record["location"])]
+        if "patrol" in record:
+            places += [("patrol.route", stop) for stop in record["patrol"]["route"]]
+        places += [(f"schedule.{hour}", target) for hour, target in record.get("schedule", {}).items()]
+        for field, target in places:
+            if target not in locations:
+                raise ContentPackError(f"characters.{char_id}.{field}: 地点 '{target}' 不存在")
+    items = content["items"]
+    for record in items.values():
+        record.pop("location", None)
+    for location_id, record in locations.items():
+        for item_id in record["items"]:
+            if item_id not in items:
+                # A bare name with no entry under "items" is a plain item called that
+                items[item_id] = {"name": item_id, "description": "", "tags": [], "use": "",
+                                  "consumable": False, "hidden": False}
+            if "location" in items[item_id]:
+                raise ContentPackError(
+                    f"locations.{location_id}.items: 物品 '{item_id}' 已放在 {items[item_id]['location']}"
+                )
+            items[item_id]["location"] = location_id
+
+
+def _parse(path: str, raw: bytes) -> Any:
+    try:
+        if path.endswith(".toml"):
+            if tomllib is None:
+                raise ContentPackError(f"{path}: 读取TOML内容包需要 Python 3.11+")
+            return tomllib.loads(raw.decode("utf-8"))
+        return json.loads(raw.decode("utf-8"))
+    except ContentPackError:
+        raise
+    except ValueError as e:  # JSONDecodeError, TOMLDecodeError, UnicodeDecodeError
+        raise ContentPackError(f"{path}: {e}") from e
+
+
+def _merge(packs: Sequence[Tuple[str, Any]]) -> Dict[str, Any]:
+    """Later packs add to and override earlier ones, entry by entry"""
+    content: Dict[str, Any] = {"name": "", "start": "", "locations": {}, "characters": {}, "items": {}}
+    for _, data in packs:
+        content["name"] = data.get("name", content["name"])
+        content["start"] = data.get("start", content["start"])
+        for location_id, record in data.get("locations", {}).items():
+            content["locations"][location_id] = {
+                "name": record["name"],
+                "description": record["description"],
+                "exits": dict(record.get("exits", {})),
+                "items": list(record.get("items", [])),
+            }
+            if record.get("ambient"):
+                content["locations"][location_id]["ambient"] = list(record["ambient"])
+        for char_id, record in data.get("characters", {}).items():
+            content["characters"][char_id] = {
+                "name": record["name"],
+                "description": record.get("description", ""),
+                "location": record["location"],
+                "personality": record["personality"],
+            }
+            if "patrol" in record:
+                content["characters"][char_id]["patrol"] = {
+                    "route": list(record["patrol"]["route"]),
+                    "interval": float(record["patrol"]["interval"]),
+                }
+            if record.get("schedule"):
+                # Keys become ints; marshal and JSON both keep the order
+                content["characters"][char_id]["schedule"] = {
+                    int(hour): target for hour, target in sorted(
+                        record["schedule"].items(), key=lambda entry: int(entry[0])
+                    )
+                }
+        for item_id, record in data.get("items", {}).items():
+            content["items"][item_id] = {
+                "name": record["name"],
+                "description": record.get("description", ""),
+                "tags": list(record.get("tags", [])),
+                "use": record.get("use", ""),
+                "consumable": record.get("consumable", False),
+                "hidden": record.get("hidden", False),
+            }
+    if not content["start"] and content["locations"]:
+        content["start"] = next(iter(content["locations"]))
+    _check_references(content)
+    return content
+
+
+def _digest(files: Sequence[Tuple[str, bytes]]) -> bytes:
+    digest = hashlib.sha256(str(CACHE_VERSION).encode())
+    for path, raw in files:
+        # The extension decides how the bytes are parsed, so it is part of the key
+        digest.update(os.path.splitext(path)[1].encode() + b"\0")
+        digest.update(len(raw).to_bytes(8, "little"))
+        digest.update(raw)
+    return digest.digest()
+
+
+def write_compiled(content: Dict[str, Any], digest: bytes, path: str):
+    """
+    Write merged content in the compiled layout
+
+    header | marshalled index | one marshalled record per location, character
+    and item. The index only holds each record's offset and length.
+    """
+    blobs: List[bytes] = []
+    offsets: Dict[str, Dict[str, Tuple[int, int]]] = {}
+    offset = 0
+    for section in _RECORD_SECTIONS:
+        offsets[section] = {}
+        for record_id, record in content[section].items():
+            blob = marshal.dumps(record)
+            offsets[section][record_id] = (offset, len(blob))
+            blobs.append(blob)
+            offset += len(blob)
+    index = marshal.dumps({"name": content["name"], "start": content["start"], **offsets})
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(_CACHE_HEADER.pack(_CACHE_MAGIC, CACHE_VERSION, digest, len(index)))
+        f.write(index)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(temp_path, path)  # readers never see a half-written cache
+
+
+def read_compiled(path: str, digest: bytes) -> Optional[ContentPack]:
+    """Open a compiled cache; None when it is missing, stale or damaged"""
+    try:
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # ValueError: empty file
+        return None
+    try:
+        magic, version, stored, index_length = _CACHE_HEADER.unpack_from(buffer, 0)
+        if magic != _CACHE_MAGIC or version != CACHE_VERSION or stored != digest:
+            raise ValueError("stale cache")
+        base = _CACHE_HEADER.size + index_length
+        index = marshal.loads(buffer[_CACHE_HEADER.size:base])
+    except (struct.error, ValueError, EOFError, TypeError):
+        buffer.close()
+        return None
+    locations, characters, items = (
+        LazyRecords(buffer, base, index[section]) for section in _RECORD_SECTIONS
+    )
+    return ContentPack(index["name"], index["start"], locations, characters, digest.hex(), items)
+
+
+def _prune(cache_dir: str, keep: str):
+    for entry in os.listdir(cache_dir):
+        if entry.endswith(".pack") and entry != keep:
+            try:
+                os.remove(os.path.join(cache_dir, entry))
+            except OSError:
+                pass
+
+
+def load_content(paths: Optional[Sequence[str]] = None, cache_dir: Optional[str] = None) -> ContentPack:
+    """
+    Load and merge content packs
+
+    Args:
+        paths: Pack files in load order (defaults to the built-in pack)
+        cache_dir: Where compiled packs are kept; None to always parse the files
+
+    Raises:
+        ContentPackError: A file is unreadable or the merged content is invalid
+    """
+    files = []
+    for path in paths or [DEFAULT_PACK]:
+        try:
+            with open(path, "rb") as f:
+                files.append((path, f.read()))
+        except OSError as e:
+            raise ContentPackError(f"{path}: {e.strerror or e}") from e
+    digest = _digest(files)
+
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, f"{digest.hex()[:32]}.pack")
+        compiled = read_compiled(cache_path, digest)
+        if compiled is not None:
+            return compiled
+
+    packs = []
+    for path, raw in files:
+        data = _parse(path, raw)
+        validate_pack(data, path)
+        packs.append((path, data))
+    content = _merge(packs)
+
+    if cache_path is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            write_compiled(content, digest, cache_path)
+            _prune(cache_dir, os.path.basename(cache_path))
+        except OSError:
+            pass  # a read-only cache directory only costs startup time
+        else:
+            compiled = read_compiled(cache_path, digest)
+            if compiled is not None:
+                return compiled
+
+    return ContentPack(content["name"], content["start"], content["locations"],
+                       content["characters"], digest.hex(), content["items"])
+
+
+@lru_cache(maxsize=1)
+def default_content() -> ContentPack:
+    """The built-in pack, parsed once per process"""
+    return load_content()
@@ -0,0 +1,79 @@
+"""
+Conversation compaction
+把移出对话窗口的旧对话在后台合并进角色的滚动记忆摘要
+"""
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+from character import Character, ConversationTurn
+
+# 摘要失败时最多保留的待整理轮数，避免无限增长
+MAX_PENDING_TURNS = 20
+
+
+class ConversationCompactor:
+    """
+    在回复路径之外整理角色记忆
+
+    每个角色同时最多只有一个整理任务；任务进行期间新移出窗口的对话
+    会留到下一次整理。
+    """
+
+    def __init__(self, ai_service, summary_length: int = 150, batch_turns: int = 2):
+        self.ai_service = ai_service
+        self.summary_length = summary_length
+        # 攒够这么多轮再整理，减少后台请求次数
+        self.batch_turns = max(1, batch_turns)
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def schedule(self, character: Character,
+                 on_update: Optional[Callable[[str, int], None]] = None) -> Optional[asyncio.Task]:
+        """
+        有足够的待整理对话时启动后台整理，返回进行中的任务
+
+        on_update(摘要, 并入的轮数) 在记忆更新后调用（例如写入存档日志）。
+        """
+        task = self._tasks.get(id(character))
+        if task is not None:
+            return task
+
+        pending = character.unsummarized_turns
+        if len(pending) > MAX_PENDING_TURNS:
+            del pending[:len(pending) - MAX_PENDING_TURNS]
+        if len(pending) < self.batch_turns:
+            return None
+
+        task = asyncio.ensure_future(self._compact(character, list(pending), on_update))
+        self._tasks[id(character)] = task
+        task.add_done_callback(lambda _: self._tasks.pop(id(character), None))
+        return task
+
+    async def _compact(self, character: Character, turns: List[ConversationTurn],
+                       on_update: Optional[Callable[[str, int], None]] = None):
+        summary = await self.ai_service.summarize_conversation(
+            character.name, character.memory_summary,
+            [turn.rendered for turn in turns], self.summary_length
+        )
+        if summary is None:
+            # 保留待整理的对话，下次再试
+            return
+        # 整理期间可能有更多对话移出窗口，只移除已经并入摘要的部分
+        done = 0
+        for pending, turn in zip(character.unsummarized_turns, turns):
+            if pending is not turn:
+                break
+            done += 1
+        character.update_memory(summary, done)
+        if on_update is not None:
+            on_update(summary, done)
+
+    async def drain(self):
+        """等待所有进行中的整理完成"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    def cancel(self):
+        """取消所有进行中的整理（退出游戏时）"""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
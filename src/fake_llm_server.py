@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Fake OpenAI-compatible server
+用于离线压测的本地聊天补全服务：支持流式输出、可配置延迟分布、错误注入和模板回复
+
+用法:
+    python fake_llm_server.py --port 8765 --latency uniform:0.1,0.4 --error-429 0.05
+然后在 config.py 中设置 AI_PROVIDER = "local"
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+
+DEFAULT_REPLIES = [
+    "你好，旅行者！我是{character}。你说「{user_message}」，真是有趣。",
+    "欢迎来到这里。关于「{user_message}」，我有很多故事可以讲。",
+    "嗯……{user_message}？让我想想该怎么回答你。",
+]
+
+
+class LatencyModel:
+    """
+    响应延迟分布
+
+    规格格式: "fixed:0.2"、"uniform:0.1,0.5"、"normal:0.3,0.05"、"lognormal:-1.5,0.5"
+    """
+
+    def __init__(self, spec: str = "fixed:0", rng: Optional[random.Random] = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"未知的延迟分布: {spec}")
+
+    def sample(self) -> float:
+        """采样一次延迟（秒）"""
+        if self.kind == "fixed":
+            value = self.params[0] if self.params else 0.0
+        elif self.kind == "uniform":
+            value = self.rng.uniform(self.params[0], self.params[1])
+        elif self.kind == "normal":
+            value = self.rng.gauss(self.params[0], self.params[1])
+        else:
+            value = self.rng.lognormvariate(self.params[0], self.params[1])
+        return max(0.0, value)
+
+
+class FakeLLMServer:
+    """说OpenAI聊天补全协议的本地假服务"""
+
+    def __init__(self, latency: str = "fixed:0", token_delay: float = 0.0,
+                 error_429: float = 0.0, error_500: float = 0.0, timeout_rate: float = 0.0,
+                 replies: Optional[List[str]] = None, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.token_delay = token_delay
+        self.error_429 = error_429
+        self.error_500 = error_500
+        self.timeout_rate = timeout_rate
+        self.replies = replies or DEFAULT_REPLIES
+        self.stats: Dict[str, int] = {
+            "requests": 0, "streams": 0, "errors_429": 0, "errors_500": 0, "timeouts": 0
+        }
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._connections: Set[asyncio.Task] = set()
+
+    @property
+    def port(self) -> int:
+        """实际监听的端口（启动时传入0会随机分配）"""
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765):
+        """开始监听"""
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+
+    async def close(self):
+        """停止服务，并中断仍在处理的连接（例如模拟超时的请求）"""
+        if self._server is not None:
+            self._server.close()
+            for task in list(self._connections):
+                task.cancel()
+            if self._connections:
+                await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个（可能保持长连接的）HTTP/1.1 连接"""
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                await self._route(method, path, body, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # 客户端断开或服务关闭；吞掉取消，避免关闭时打印回溯
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader
+                            ) -> Optional[Tuple[str, str, bytes, bool]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0))
+        body = await reader.readexactly(length) if length else b""
+        keep_alive = headers.get("connection", "").lower() != "close"
+        return method, path.split("?", 1)[0], body, keep_alive
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter):
+        if method == "GET" and path.endswith("/models"):
+            await self._send_json(writer, 200, {
+                "object": "list",
+                "data": [{"id": "fake-model", "object": "model", "owned_by": "local"}]
+            })
+        elif method == "POST" and path.endswith("/chat/completions"):
+            await self._chat_completions(json.loads(body or b"{}"), writer)
+        else:
+            await self._send_json(writer, 404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    async def _chat_completions(self, payload: dict, writer: asyncio.StreamWriter):
+        self.stats["requests"] += 1
+        await asyncio.sleep(self.latency.sample())
+
+        roll = self.rng.random()
+        if roll < self.timeout_rate:
+            # 模拟上游卡死：一直不回复，直到客户端超时断开
+            self.stats["timeouts"] += 1
+            await asyncio.sleep(3600)
+            return
+        roll -= self.timeout_rate
+        if roll < self.error_429:
+            self.stats["errors_429"] += 1
+            await self._send_json(writer, 429, {"error": {
+                "message": "Rate limit reached (fake)", "type": "rate_limit_exceeded"}})
+            return
+        roll -= self.error_429
+        if roll < self.error_500:
+            self.stats["errors_500"] += 1
+            await self._send_json(writer, 500, {"error": {
+                "message": "Internal server error (fake)", "type": "server_error"}})
+            return
+
+        model = payload.get("model", "fake-model")
+        reply = self._render_reply(payload)
+        max_tokens = payload.get("max_tokens")
+        if max_tokens:
+            # 以字符近似token，模拟 max_tokens 截断
+            reply = reply[:max_tokens]
+
+        if payload.get("stream"):
+            self.stats["streams"] += 1
+            await self._stream_reply(writer, model, reply)
+        else:
+            await self._send_json(writer, 200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(reply), "total_tokens": len(reply)}
+            })
+
+    def _render_reply(self, payload: dict) -> str:
+        """用请求内容填充一个回复模板"""
+        messages = payload.get("messages", [])
+        user_message = next(
+            (m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), ""
+        )
+        system_prompt = next(
+            (m.get("content", "") for m in messages if m.get("role") == "system"), ""
+        )
+        # 角色提示词以 "你是 {name}，" 开头
+        character = system_prompt[2:].split("，", 1)[0].strip() if system_prompt.startswith("你是") else "我"
+        template = self.rng.choice(self.replies)
+        return template.format(
+            model=payload.get("model", ""), user_message=user_message,
+            character=character, n=self.stats["requests"]
+        )
+
+    async def _stream_reply(self, writer: asyncio.StreamWriter, model: str, reply: str):
+        """以SSE分块发送回复"""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        def event(delta: dict, finish_reason: Optional[str] = None) -> bytes:
+            data = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        await self._write_chunk(writer, event({"role": "assistant", "content": ""}))
+        position = 0
+        while position < len(reply):
+            size = self.rng.randint(1, 3)
+            await self._write_chunk(writer, event({"content": reply[position:position + size]}))
+            position += size
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+        await self._write_chunk(writer, event({}, "stop"))
+        await self._write_chunk(writer, b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _write_chunk(self, writer: asyncio.StreamWriter, data: bytes):
+        writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        await writer.drain()
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: dict):
+        reasons = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {reasons.get(status, 'OK')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="本地假OpenAI兼容服务，用于离线压测")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="fixed:0",
+                        help="首字节延迟分布，例如 fixed:0.2 / uniform:0.1,0.5 / lognormal:-1.5,0.5")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="流式输出时每个分块之间的延迟（秒）")
+    parser.add_argument("--error-429", type=float, default=0.0, help="返回429的概率")
+    parser.add_argument("--error-500", type=float, default=0.0, help="返回500的概率")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="不响应（模拟超时）的概率")
+    parser.add_argument("--replies", help="回复模板JSON文件（字符串列表），可使用 {user_message} {character} {model} {n}")
+    parser.add_argument("--seed", type=int, help="随机种子，便于复现")
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[List[str]] = None):
+    """启动假服务直到被中断"""
+    args = parse_args(argv)
+    replies = None
+    if args.replies:
+        with open(args.replies, encoding="utf-8") as f:
+            replies = json.load(f)
+
+    server = FakeLLMServer(
+        latency=args.latency, token_delay=args.token_delay,
+        error_429=args.error_429, error_500=args.error_500, timeout_rate=args.timeout_rate,
+        replies=replies, seed=args.seed
+    )
+    await server.start(args.host, args.port)
+    print(f"🧪 假LLM服务已启动: http://{args.host}:{server.port}/v1")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+        print(f"📊 统计: {server.stats}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
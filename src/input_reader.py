@@ -0,0 +1,103 @@
+"""
+Asynchronous input reader
+在事件循环中读取玩家输入，等待输入时后台任务（预取、定时事件、记忆整理、流式回复）照常运行
+"""
+import asyncio
+import os
+import sys
+import threading
+from typing import IO, Optional
+
+
+class InputReader:
+    """
+    按行读取输入流的异步读取器
+
+    能注册到事件循环的输入（终端、管道）直接由循环读取；不能注册的（Windows 控制台、
+    普通文件）改用一个后台线程读取。读到的行都进入队列，所以玩家可以在角色回复时
+    提前输入下一条命令。
+    """
+
+    def __init__(self, stream: Optional[IO] = None):
+        self.stream = stream if stream is not None else sys.stdin
+        self._lines: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        self._buffer = b""
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._fd: Optional[int] = None
+        self._eof = False
+
+    def start(self):
+        """开始读取（需要在事件循环中调用）"""
+        self._loop = asyncio.get_running_loop()
+        try:
+            fd = self.stream.fileno()
+            self._loop.add_reader(fd, self._on_readable)
+        except (AttributeError, OSError, ValueError, NotImplementedError):
+            # PermissionError（epoll 不支持普通文件）也是 OSError
+            thread = threading.Thread(target=self._read_in_thread, name="input-reader", daemon=True)
+            thread.start()
+        else:
+            self._fd = fd
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._finish()
+            return
+        self._feed(data)
+
+    def _feed(self, data: bytes):
+        # 按字节拆行后再解码，多字节字符被分在两次读取中也不会出错
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split(b"\n")
+        for line in lines:
+            self._lines.put_nowait(line.decode("utf-8", errors="replace").rstrip("\r"))
+
+    def _finish(self):
+        self.close()
+        if self._buffer:
+            self._lines.put_nowait(self._buffer.decode("utf-8", errors="replace").rstrip("\r"))
+            self._buffer = b""
+        self._lines.put_nowait(None)
+
+    def _read_in_thread(self):
+        while True:
+            try:
+                line = self.stream.readline()
+            except (OSError, ValueError):
+                line = ""
+            if not line:
+                self._loop.call_soon_threadsafe(self._lines.put_nowait, None)
+                return
+            self._loop.call_soon_threadsafe(self._lines.put_nowait, line.rstrip("\r\n"))
+
+    @property
+    def pending(self) -> int:
+        """已经输入、还没处理的行数"""
+        return self._lines.qsize()
+
+    async def readline(self) -> str:
+        """
+        读取一行（不含换行符）
+
+        Raises:
+            EOFError: 输入已结束
+        """
+        if self._eof:
+            raise EOFError
+        line = await self._lines.get()
+        if line is None:
+            self._eof = True
+            raise EOFError
+        return line
+
+    def close(self):
+        """停止从输入流读取"""
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
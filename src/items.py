@@ -0,0 +1,141 @@
+"""
+Items and Inventory
+
+Item definitions come from the content pack; where each item is (a location,
+the player's inventory or nowhere once used up) is kept in indexes by id, by
+holder and by tag/name. Finding what is here, what the player carries or what
+matches a word therefore never scans the world's items. Locations that have
+been built keep their `items` list in step so they re-render when items move.
+"""
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from world import World
+
+# Holder used for the player's inventory (location IDs are the other holders)
+INVENTORY = "@inventory"
+
+
+class Item:
+    """An item defined by the content pack"""
+
+    __slots__ = ("item_id", "name", "description", "tags", "use_text", "consumable",
+                 "hidden", "origin", "holder")
+
+    def __init__(self, item_id: str, record: Mapping[str, Any]):
+        self.item_id = item_id
+        self.name = record["name"]
+        self.description = record.get("description", "")
+        self.tags = tuple(record.get("tags", ()))
+        self.use_text = record.get("use", "")
+        self.consumable = record.get("consumable", False)
+        self.hidden = record.get("hidden", False)  # only found by searching
+        self.origin: Optional[str] = record.get("location")
+        self.holder = self.origin  # location ID, INVENTORY or None
+
+
+class ItemManager:
+    """Tracks every item and where it is"""
+
+    def __init__(self, world: World, records: Mapping[str, Mapping[str, Any]]):
+        self.world = world
+        self.items: Dict[str, Item] = {}
+        # holder -> {item_id: None}; dicts keep items in the order they arrived
+        self._by_holder: Dict[str, Dict[str, None]] = {}
+        # lowercased ID, name, word of the name or tag -> {item_id: None}
+        self._by_key: Dict[str, Dict[str, None]] = {}
+        # Items that moved or were found, so saving does not walk every item
+        self._moved: Dict[str, None] = {}
+        self._revealed: Dict[str, None] = {}
+        for item_id, record in records.items():
+            item = self.items[item_id] = Item(item_id, record)
+            if item.holder is not None:
+                self._by_holder.setdefault(item.holder, {})[item_id] = None
+            name = item.name.lower()
+            for key in {item_id.lower(), name, *name.split(), *(tag.lower() for tag in item.tags)}:
+                self._by_key.setdefault(key, {})[item_id] = None
+
+    def get_item(self, item_id: str) -> Optional[Item]:
+        """Get an item by ID"""
+        return self.items.get(item_id)
+
+    def items_at(self, holder: str, include_hidden: bool = False) -> List[Item]:
+        """Items at a location (or in the inventory), in the order they arrived"""
+        items = [self.items[item_id] for item_id in self._by_holder.get(holder, ())]
+        return items if include_hidden else [item for item in items if not item.hidden]
+
+    def with_tag(self, tag: str) -> List[Item]:
+        """All items with a tag (or that ID or name word), wherever they are"""
+        return [self.items[item_id] for item_id in self._by_key.get(tag.lower(), ())]
+
+    def find(self, query: str, holders: Iterable[str]) -> List[Item]:
+        """
+        Visible items in the given holders that match what the player typed
+
+        The query is an item ID, name, word of a name or tag in any case; the
+        cost depends on how many items share that word, not on how many items
+        the world has.
+        """
+        holders = set(holders)
+        key = query.strip().lower()
+        matches = self._by_key.get(key) or self._by_key.get(key.replace(" ", "_"), {})
+        return [
+            self.items[item_id] for item_id in matches
+            if self.items[item_id].holder in holders and not self.items[item_id].hidden
+        ]
+
+    def move(self, item_id: str, holder: Optional[str]):
+        """Put an item somewhere else (None removes it from the game, e.g. when eaten)"""
+        item = self.items[item_id]
+        if item.holder == holder:
+            return
+        if item.holder is not None:
+            held = self._by_holder[item.holder]
+            del held[item_id]
+            if not held:
+                del self._by_holder[item.holder]
+            location = self.world.get_location(item.holder)
+            if location is not None:
+                location.remove_item(item_id)
+        item.holder = holder
+        self._moved[item_id] = None
+        if holder is not None:
+            self._by_holder.setdefault(holder, {})[item_id] = None
+            location = self.world.get_location(holder)
+            if location is not None and item_id not in location.items:
+                location.add_item(item_id)
+
+    def reveal(self, item_id: str):
+        """Make a hidden item visible where it is"""
+        item = self.items[item_id]
+        if item.hidden:
+            item.hidden = False
+            self._revealed[item_id] = None
+            location = self.world.get_location(item.holder) if item.holder else None
+            if location is not None:
+                location.changed()
+
+    def search(self, location_id: str) -> List[Item]:
+        """Reveal the hidden items at a location, returning them"""
+        found = [item for item in self.items_at(location_id, include_hidden=True) if item.hidden]
+        for item in found:
+            self.reveal(item.item_id)
+        return found
+
+    def to_state(self) -> Dict[str, Any]:
+        """Items that moved or were found since the game started"""
+        return {
+            "holders": {
+                item_id: self.items[item_id].holder for item_id in self._moved
+                if self.items[item_id].holder != self.items[item_id].origin
+            },
+            "revealed": list(self._revealed),
+        }
+
+    def load_state(self, state: Mapping[str, Any]):
+        """Apply data from `to_state` (items no longer in the content are skipped)"""
+        for item_id, holder in state.get("holders", {}).items():
+            if item_id in self.items and (holder in (None, INVENTORY) or holder in self.world.locations):
+                self.move(item_id, holder)
+        for item_id in state.get("revealed", []):
+            if item_id in self.items:
+                self.reveal(item_id)
@@ -0,0 +1,183 @@
+"""
+Game journal
+追加写入的存档日志：移动和对话作为事件写入分段的JSONL文件，定期写入完整快照，
+恢复时只重放最后一个快照之后的事件
+"""
+import asyncio
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_SEGMENT_PATTERN = re.compile(r"journal-(\d{8})\.jsonl$")
+_SNAPSHOT_PATTERN = re.compile(r"snapshot-(\d{8})\.json$")
+
+
+class GameJournal:
+    """
+    分段的追加写入日志
+
+    快照 N 记录的是日志段 N 开始之前的完整状态，因此恢复时读取最新的快照，
+    再重放编号不小于 N 的日志段。记录事件只是放进缓冲区；写入在单独的线程中
+    每隔 flush_interval 秒或攒够 batch_size 条后批量进行，不阻塞玩家的命令。
+    """
+
+    def __init__(self, directory: str, snapshot_every: int = 200,
+                 flush_interval: float = 1.0, batch_size: int = 32):
+        self.directory = directory
+        # 自上次快照以来累计这么多事件后，下次写入时顺便生成新快照
+        self.snapshot_every = max(1, snapshot_every)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # 返回当前完整状态的函数，由游戏设置
+        self.snapshot_source: Optional[Callable[[], Dict[str, Any]]] = None
+        self._segment = 0
+        self._since_snapshot = 0
+        self._pending: List[str] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        os.makedirs(directory, exist_ok=True)
+        # 单个工作线程，写入按提交顺序执行
+        self._executor: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="game-journal"
+        )
+
+    def _path(self, kind: str, number: int) -> str:
+        suffix = "jsonl" if kind == "journal" else "json"
+        return os.path.join(self.directory, f"{kind}-{number:08d}.{suffix}")
+
+    def _numbers(self, pattern: "re.Pattern[str]") -> List[int]:
+        numbers = []
+        for entry in os.listdir(self.directory):
+            match = pattern.match(entry)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        读取最新的可用快照和它之后的事件
+
+        Returns:
+            (快照状态或None, 需要按顺序重放的事件)
+        """
+        snapshot, start = None, 0
+        for number in reversed(self._numbers(_SNAPSHOT_PATTERN)):
+            try:
+                with open(self._path("snapshot", number), encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # 损坏的快照，退回到更早的一个
+            start = number
+            break
+
+        events = []
+        torn = False
+        segments = [number for number in self._numbers(_SEGMENT_PATTERN) if number >= start]
+        for number in segments:
+            with open(self._path("journal", number), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        # 写到一半时退出留下的残行
+                        torn = True
+                        break
+
+        self._segment = max(segments[-1] if segments else start, start)
+        if torn:
+            # 不在残行后面继续追加
+            self._segment += 1
+        self._since_snapshot = len(events)
+        return snapshot, events
+
+    def record(self, event: Dict[str, Any]):
+        """
+        记录一个已经生效的事件
+
+        快照可能在任何一次记录时生成，所以先修改状态再记录。事件只写入缓冲区；
+        在事件循环中由后台批量写入，没有运行中的事件循环时直接写入。
+        """
+        self._pending.append(json.dumps(event, ensure_ascii=False, separators=(",", ":")))
+        self._since_snapshot += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush_later())
+        elif len(self._pending) >= self.batch_size:
+            # 缓冲区已满，不必等到定时写入
+            self._flush_task.cancel()
+            self._flush_task = loop.create_task(self._flush_later(0))
+
+    async def _flush_later(self, delay: Optional[float] = None):
+        """等待片刻后在工作线程中写入缓冲区"""
+        await asyncio.sleep(self.flush_interval if delay is None else delay)
+        self._flush_task = None
+        batch = self._take_batch()
+        if batch is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write, *batch)
+
+    def _take_batch(self, force_snapshot: bool = False):
+        """
+        取出缓冲区，需要时同时取得快照
+
+        快照与缓冲区在同一时刻取出，快照之后记录的事件写入新的日志段。
+        """
+        if not self._pending and not (force_snapshot and self._since_snapshot):
+            return None
+        lines, self._pending = self._pending, []
+        segment = self._segment
+        snapshot = None
+        if self.snapshot_source is not None and (
+            self._since_snapshot >= self.snapshot_every or (force_snapshot and self._since_snapshot)
+        ):
+            snapshot = self.snapshot_source()
+            self._segment += 1
+            self._since_snapshot = 0
+        return segment, lines, snapshot, self._segment
+
+    def _write(self, segment: int, lines: List[str], snapshot: Optional[Dict[str, Any]],
+               next_segment: int):
+        """追加事件；有快照时写入快照并删除它之前的日志段和快照"""
+        if lines:
+            with open(self._path("journal", segment), "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        if snapshot is None:
+            return
+
+        path = self._path("snapshot", next_segment)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)  # 读取时不会看到写了一半的快照
+
+        for number in self._numbers(_SEGMENT_PATTERN):
+            if number < next_segment:
+                os.remove(self._path("journal", number))
+        for number in self._numbers(_SNAPSHOT_PATTERN):
+            if number < next_segment:
+                os.remove(self._path("snapshot", number))
+
+    def flush(self, snapshot: bool = False):
+        """立即写入缓冲区（同步）；snapshot 为 True 时同时写入快照"""
+        batch = self._take_batch(force_snapshot=snapshot)
+        if batch is not None:
+            self._write(*batch)
+
+    def close(self):
+        """写入剩余的事件和一份最新快照，下次启动时无需重放"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._executor is not None:
+            # 等待正在进行的写入完成
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.flush(snapshot=True)
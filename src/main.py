@@ -5,12 +5,23 @@ AI RPG Chat Game - Main Entry Point
 A simple text-based RPG where you explore a world and chat with AI characters.
 """
 import asyncio
+import signal
 import sys
-from typing import List, Optional
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
-from world import World
-from character import CharacterManager
-from ai_service import AIService
+from world import DIRECTION_ALIASES, DIRECTION_NAMES, World
+from character import Character, CharacterManager
+from commands import CommandRegistry, load_plugins
+from content_pack import ContentPack, load_content
+from input_reader import InputReader
+from items import INVENTORY, Item, ItemManager
+from ai_service import AIService, STREAM_INTERRUPTED
+from conversation_memory import ConversationCompactor
+from journal import GameJournal
+from npc_behaviour import NPCBehaviour, WorldClock
+from scheduler import WorldScheduler
+from semantic_memory import SemanticMemory
 
 try:
     import config
@@ -23,140 +34,596 @@ except ImportError:
     sys.exit(1)
 
 
+def load_game_content() -> ContentPack:
+    """The content packs named in the config, loaded once and shared by every game"""
+    content = load_content(
+        getattr(config, "CONTENT_PACKS", None) or None,
+        getattr(config, "CONTENT_CACHE_DIR", None)
+    )
+    if getattr(config, "COMPACT_WORLD", False):
+        content = content.compacted()
+    return content
+
+
 class Game:
     """Main game class that handles the game loop and commands"""
     
-    def __init__(self):
-        self.world = World()
-        self.character_manager = CharacterManager()
-        self.ai_service = AIService()
+    def __init__(self, ai_service: Optional[AIService] = None, content: Optional[ContentPack] = None,
+                 output: Optional[Callable[..., None]] = None, save_dir: Optional[str] = None):
+        """
+        Args:
+            ai_service: Shared AI service (a new one owned by this game if None)
+            content: Shared world content (loaded from the config if None)
+            output: Where the game's text goes, called like print()
+            save_dir: Journal directory (SAVE_DIR if None, "" for no saving)
+        """
+        # Everything the player sees goes through here so a server can send it to a connection
+        self.output = output if output is not None else print
+        if content is None:
+            content = load_game_content()
+        self.world = World(content)
+        # location_id -> ((location, version, occupancy version), text) for `look`
+        self._look_cache: Dict[str, Tuple[Tuple[Any, int, int], str]] = {}
+        self.items = ItemManager(self.world, content.items)
+        memory_factory = None
+        if getattr(config, "LONG_TERM_MEMORY", True):
+            memory_factory = partial(
+                SemanticMemory, capacity=getattr(config, "LONG_TERM_MEMORY_SIZE", 5000)
+            )
+        self.character_manager = CharacterManager(
+            getattr(config, "CONVERSATION_WINDOW", 5), memory_factory, content
+        )
+        self._owns_ai_service = ai_service is None
+        self.ai_service = ai_service if ai_service is not None else AIService()
+        self.compactor = ConversationCompactor(
+            self.ai_service,
+            summary_length=getattr(config, "MEMORY_SUMMARY_LENGTH", 150),
+            batch_turns=getattr(config, "MEMORY_SUMMARY_BATCH", 2)
+        )
         self.running = True
         self.player_name = "Adventurer"
+        # Append-only save journal; None when saving is disabled
+        self.journal: Optional[GameJournal] = None
+        self.resumed = False
+        if save_dir is None:
+            save_dir = getattr(config, "SAVE_DIR", None)
+        if save_dir:
+            self.journal = GameJournal(save_dir, getattr(config, "SAVE_SNAPSHOT_EVERY", 200))
+            self.resumed = self.restore_state(*self.journal.load())
+            self.journal.snapshot_source = self.capture_state
+        # Timed world events (NPC patrols, schedules, ambient lines); started by the game loop
+        self.scheduler = WorldScheduler(getattr(config, "SCHEDULER_TICK", 0.5))
+        self.behaviour: Optional[NPCBehaviour] = None
+        # char_id -> (message, history, task) for openers generated in the background
+        self._prefetches: Dict[str, Tuple[str, Sequence[str], asyncio.Task]] = {}
+        # The command being run and the pending read, so Ctrl+C can cancel the right one
+        self._command_task: Optional[asyncio.Future] = None
+        self._read_task: Optional[asyncio.Future] = None
+        self.commands = default_commands()
     
     def display_welcome(self):
         """Display the welcome message and game introduction"""
-        print("=" * 60)
-        print(f"🌟 欢迎来到 {config.GAME_TITLE}! 🌟")
-        print("=" * 60)
-        print()
-        print("您是一位刚刚来到神秘境界的冒险者。")
-        print("探索这个世界，与AI驱动的角色聊天吧！")
-        print()
-        print("💡 输入 'help' 或 '帮助' 查看可用命令。")
-        print("💡 输入 'quit' 或 '退出' 退出游戏。")
-        print()
-        print("-" * 60)
-        print()
+        self.output("=" * 60)
+        self.output(f"🌟 欢迎来到 {config.GAME_TITLE}! 🌟")
+        self.output("=" * 60)
+        self.output()
+        if self.resumed:
+            self.output("📂 已恢复上次的进度。")
+        else:
+            self.output("您是一位刚刚来到神秘境界的冒险者。")
+            self.output("探索这个世界，与AI驱动的角色聊天吧！")
+        self.output()
+        self.output("💡 输入 'help' 或 '帮助' 查看可用命令。")
+        self.output("💡 输入 'quit' 或 '退出' 退出游戏。")
+        self.output()
+        self.output("-" * 60)
+        self.output()
     
     def display_help(self):
         """Display available commands"""
-        print("📚 可用命令:")
-        print("  look / 看             - 查看当前位置")
-        print("  go <方向> / 走 <方向>   - 移动 (north/south/east/west 或 北/南/东/西)")
-        print("  talk <角色> / 说 <角色> - 与AI角色聊天")
-        print("  characters / 角色     - 列出当前位置的角色")
-        print("  where / 位置          - 显示当前位置")
-        print("  help / 帮助           - 显示此帮助信息")
-        print("  quit / 退出           - 退出游戏")
-        print()
-        print("💡 示例:")
-        print("  看                   - 查看周围")
-        print("  北 或 go north       - 向北移动")
-        print("  说 elder 你好        - 与长老打招呼")
-        print()
+        self.output("📚 可用命令:")
+        for command in self.commands.commands.values():
+            if command.help:
+                self.output(f"  {command.usage:<22} - {command.help}")
+        self.output()
+        self.output("💡 示例:")
+        self.output("  看                   - 查看周围")
+        self.output("  北 或 go north       - 向北移动")
+        self.output("  说 elder 你好        - 与长老打招呼")
+        self.output("  inv                  - 命令可以缩写，只要不会混淆")
+        self.output()
     
-    def look_around(self):
-        """Display the current location description and characters"""
-        location_desc = self.world.get_location_description()
-        print(location_desc)
+    def render_look(self) -> str:
+        """
+        Text shown by `look` at the current location
         
+        Kept per location and reused until the location's exits, items or
+        occupants change, so repeated looks and moves mostly return cached text.
+        """
+        location_id = self.world.current_location
+        location = self.world.get_current_location()
+        key = (location, location.version, self.character_manager.occupancy_version(location_id))
+        cached = self._look_cache.get(location_id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        
+        text = location.render()
         # Show characters in this location
-        characters = self.character_manager.get_characters_in_location(self.world.current_location)
+        characters = self.character_manager.get_characters_in_location(location_id)
         if characters:
-            print()
-            for char_id, character in characters.items():
-                print(f"👤 {character.get_description()}")
-        print()
+            text += "\n\n" + "\n".join(
+                f"👤 {character.get_description()}" for character in characters.values()
+            )
+        items = self.items.items_at(location_id)
+        if items:
+            text += f"\n\n✨ 这里有: {', '.join(item.name for item in items)}"
+        self._look_cache[location_id] = (key, text)
+        return text
+    
+    def look_around(self):
+        """Display the current location description and characters"""
+        self.output(self.render_look())
+        self.output()
     
     def list_characters(self):
         """List characters in the current location"""
         characters = self.character_manager.get_characters_in_location(self.world.current_location)
         if characters:
-            print("这里的角色:")
+            self.output("这里的角色:")
             for char_id, character in characters.items():
-                print(f"  • {character.name} (可用: talk {char_id} 或 说 {char_id})")
+                self.output(f"  • {character.name} (可用: talk {char_id} 或 说 {char_id})")
         else:
-            print("这里没有其他人。")
-        print()
+            self.output("这里没有其他人。")
+        self.output()
+    
+    def capture_state(self) -> Dict[str, Any]:
+        """Full game state for a journal snapshot"""
+        return {
+            "location": self.world.current_location,
+            "items": self.items.to_state(),
+            "characters": {
+                char_id: character.to_state()
+                for char_id, character in self.character_manager.characters.items()
+            },
+        }
+    
+    def restore_state(self, snapshot: Optional[Dict[str, Any]],
+                      events: List[Dict[str, Any]]) -> bool:
+        """
+        Rebuild the game from a snapshot and the journal events recorded after it
+        
+        Entries for locations or characters no longer in the content packs are skipped.
+        Returns whether there was anything to resume.
+        """
+        if snapshot is not None:
+            self.apply_event({"type": "move", "to": snapshot["location"]})
+            self.items.load_state(snapshot.get("items", {}))
+            for char_id, state in snapshot["characters"].items():
+                character = self.character_manager.get_character(char_id)
+                if character is not None and state["location"] in self.world.locations:
+                    character.load_state(state)
+        for event in events:
+            self.apply_event(event)
+        return snapshot is not None or bool(events)
+    
+    def apply_event(self, event: Dict[str, Any]):
+        """Replay one journal event"""
+        kind = event.get("type")
+        if kind == "move":
+            if event["to"] in self.world.locations:
+                self.world.current_location = event["to"]
+            return
+        if kind == "item":
+            self.items.load_state({"holders": {event["item"]: event["to"]}})
+            return
+        if kind == "reveal":
+            self.items.load_state({"revealed": event["items"]})
+            return
+        
+        character = self.character_manager.get_character(event.get("char", ""))
+        if character is None:
+            return
+        if kind == "npc":
+            if event["to"] in self.world.locations:
+                character.location = event["to"]
+        elif kind == "turn":
+            character.add_conversation(event["player"], event["reply"])
+        elif kind == "memory":
+            character.update_memory(event["summary"], event["summarized"])
+    
+    def record(self, event: Dict[str, Any]):
+        """Append an event to the save journal (written in the background)"""
+        if self.journal is not None:
+            self.journal.record(event)
+    
+    def _record_memory(self, char_id: str, summary: str, summarized: int):
+        self.record({"type": "memory", "char": char_id, "summary": summary,
+                     "summarized": summarized})
+    
+    def start_world(self):
+        """Start autonomous NPC behaviour (needs the running event loop)"""
+        if self.behaviour is not None or not getattr(config, "NPC_BEHAVIOUR", True):
+            return
+        self.behaviour = NPCBehaviour(
+            self.scheduler,
+            self.world,
+            self.character_manager,
+            WorldClock(
+                getattr(config, "DAY_LENGTH", 1440.0),
+                getattr(config, "START_HOUR", 8),
+                self.scheduler.time()
+            ),
+            ambient_interval=getattr(config, "AMBIENT_INTERVAL", 60.0),
+            on_move=self.on_character_moved,
+            on_ambient=lambda line: self.output(f"\n🍃 {line}\n")
+        )
+        self.behaviour.start(self.world.content.characters)
+    
+    def stop_world(self):
+        """Stop all timed world events"""
+        if self.behaviour is not None:
+            self.behaviour.stop()
+            self.behaviour = None
+        self.scheduler.close()
+    
+    def on_character_moved(self, char_id: str, character: Character, previous: str, destination: str):
+        """Record an NPC's move and tell the player if it happened where they are"""
+        self.record({"type": "npc", "char": char_id, "to": destination})
+        here = self.world.current_location
+        if previous == here:
+            # An opener prefetched for this character is no use any more
+            prefetch = self._prefetches.pop(char_id, None)
+            if prefetch is not None:
+                prefetch[2].cancel()
+            self.output(f"\n👣 {character.name} 离开了这里。\n")
+        elif destination == here:
+            self.output(f"\n👣 {character.name} 来到了这里。\n")
+    
+    def get_location_context(self) -> str:
+        """Describe the current location for the AI prompt"""
+        location = self.world.get_current_location()
+        context = f"当前在 {location.name}。{location.description}"
+        # Item names only, so the prompt stays short
+        here = self.items.items_at(self.world.current_location)
+        if here:
+            context += f" 这里有: {', '.join(item.name for item in here)}。"
+        carried = self.items.items_at(INVENTORY)
+        if carried:
+            context += f" 玩家携带: {', '.join(item.name for item in carried)}。"
+        return context
+    
+    def start_prefetches(self):
+        """Start generating likely openers for the characters here in the background"""
+        self.cancel_prefetches()
+        if not getattr(config, "PREFETCH_OPENERS", False):
+            return
+        
+        message = getattr(config, "PREFETCH_MESSAGE", "你好")
+        context = self.get_location_context()
+        characters = self.character_manager.get_characters_in_location(self.world.current_location)
+        for char_id, character in characters.items():
+            history = character.get_context_turns()
+            recalled = character.recall(message, getattr(config, "LONG_TERM_MEMORY_RECALL", 3))
+            task = asyncio.ensure_future(self.ai_service.prefetch_character_response(
+                character.name, character.personality, message, context, history,
+                character.memory_summary, recalled
+            ))
+            self._prefetches[char_id] = (message, history, task)
+    
+    def cancel_prefetches(self):
+        """Cancel prefetches that were not used (e.g. the player left)"""
+        for _, _, task in self._prefetches.values():
+            task.cancel()
+        self._prefetches.clear()
+    
+    def take_prefetched_reply(self, char_id: str, message: str,
+                              history: Sequence[str]) -> Optional[str]:
+        """
+        Return a finished prefetched reply for exactly this request, if there is one
+        
+        A prefetch that is still running is not waited for here; the normal request
+        joins it through the AI service's request coalescing instead.
+        """
+        prefetch = self._prefetches.get(char_id)
+        if prefetch is None:
+            return None
+        
+        prefetched_message, prefetched_history, task = prefetch
+        if prefetched_message != message or prefetched_history != history:
+            return None
+        if not task.done() or task.cancelled() or task.exception() is not None:
+            return None
+        
+        del self._prefetches[char_id]
+        return task.result()
+    
+    def remember_turn(self, char_id: str, character: Character, message: str, response: str):
+        """Keep a finished exchange in the character's history and the save journal"""
+        character.add_conversation(message, response)
+        self.record({"type": "turn", "char": char_id, "player": message, "reply": response})
+        # Fold turns that left the window into the character's memory, off the reply path
+        self.compactor.schedule(character, partial(self._record_memory, char_id))
     
     async def talk_to_character(self, char_id: str, message: str):
         """Handle conversation with a character"""
         character = self.character_manager.get_character(char_id)
         
         if not character:
-            print(f"这里没有叫 '{char_id}' 的人。")
+            self.output(f"这里没有叫 '{char_id}' 的人。")
             return
         
         # Check if character is in current location
         if character.location != self.world.current_location:
-            print(f"{character.name} 不在这里。")
+            self.output(f"{character.name} 不在这里。")
             return
         
-        print(f"💬 您对 {character.name} 说: \"{message}\"")
-        print()
-        print("🤔 ({character.name} 正在思考...)")
+        self.output(f"💬 您对 {character.name} 说: \"{message}\"")
+        self.output()
+        self.output("🤔 ({character.name} 正在思考...)")
         
         try:
             # Get context for the AI
-            location = self.world.get_current_location()
-            context = f"当前在 {location.name}。{location.description}"
+            context = self.get_location_context()
             
-            # Add conversation history context
-            conv_context = character.get_conversation_context()
-            if conv_context:
-                context += f"\n\n{conv_context}"
-            
-            # Get AI response
-            response = await self.ai_service.get_character_response(
-                character.name,
-                character.personality,
-                message,
-                context
-            )
+            # Recent turns are passed separately so the AI service can trim them to fit
+            history = character.get_context_turns()
+            # Older turns only come back when they are relevant to what the player said
+            recalled = character.recall(message, getattr(config, "LONG_TERM_MEMORY_RECALL", 3))
+            complete = True
             
-            print(f"💭 {character.name}: \"{response}\"")
+            prefetched = self.take_prefetched_reply(char_id, message, history)
+            if prefetched is not None:
+                # Generated in the background when the player arrived
+                response = prefetched
+                self.output(f"💭 {character.name}: \"{response}\"")
+            elif getattr(config, "STREAM_RESPONSES", True):
+                # Render tokens as they arrive
+                self.output(f"💭 {character.name}: \"", end="", flush=True)
+                parts = []
+                async for chunk in self.ai_service.stream_character_response(
+                    character.name,
+                    character.personality,
+                    message,
+                    context,
+                    history,
+                    memory=character.memory_summary,
+                    recalled=recalled
+                ):
+                    parts.append(chunk)
+                    self.output(chunk, end="", flush=True)
+                self.output("\"")
+                response = "".join(parts)
+                complete = not parts or parts[-1] != STREAM_INTERRUPTED
+            else:
+                # Get AI response
+                response = await self.ai_service.get_character_response(
+                    character.name,
+                    character.personality,
+                    message,
+                    context,
+                    history,
+                    memory=character.memory_summary,
+                    recalled=recalled
+                )
+                
+                self.output(f"💭 {character.name}: \"{response}\"")
             
-            # Add to conversation history
-            character.add_conversation(message, response)
+            # Add to conversation history (a reply cut off mid-stream is not kept)
+            if complete:
+                self.remember_turn(char_id, character, message, response)
             
         except Exception as e:
             if config.DEBUG_MODE:
-                print(f"获取AI回复时出错: {e}")
-            print(f"💭 {character.name}: \"我现在好像有点想不起来要说什么...\"")
+                self.output(f"获取AI回复时出错: {e}")
+            self.output(f"💭 {character.name}: \"我现在好像有点想不起来要说什么...\"")
         
-        print()
+        self.output()
+    
+    async def say_to_everyone(self, message: str):
+        """
+        Say something to every character here at once
+        
+        All requests are sent concurrently and each reply is shown as soon as it
+        arrives, so the wait is about one round trip however many are present.
+        """
+        characters = self.character_manager.get_characters_in_location(self.world.current_location)
+        if not characters:
+            self.output("这里没有人可以交谈。")
+            self.output()
+            return
+        if len(characters) == 1:
+            # A single listener gets the normal (streamed) conversation
+            await self.talk_to_character(next(iter(characters)), message)
+            return
+        
+        self.output(f"💬 您对大家说: \"{message}\"")
+        self.output()
+        self.output(f"🤔 ({len(characters)} 个角色正在思考...)")
+        
+        context = self.get_location_context()
+        recall_limit = getattr(config, "LONG_TERM_MEMORY_RECALL", 3)
+        
+        async def reply(char_id: str, character: Character) -> Tuple[str, Character, Optional[str]]:
+            history = character.get_context_turns()
+            prefetched = self.take_prefetched_reply(char_id, message, history)
+            if prefetched is not None:
+                return char_id, character, prefetched
+            try:
+                response = await self.ai_service.get_character_response(
+                    character.name,
+                    character.personality,
+                    message,
+                    context,
+                    history,
+                    memory=character.memory_summary,
+                    recalled=character.recall(message, recall_limit)
+                )
+            except Exception as e:
+                if config.DEBUG_MODE:
+                    self.output(f"获取AI回复时出错: {e}")
+                return char_id, character, None
+            return char_id, character, response
+        
+        tasks = [asyncio.ensure_future(reply(char_id, character))
+                 for char_id, character in characters.items()]
+        try:
+            for next_reply in asyncio.as_completed(tasks):
+                char_id, character, response = await next_reply
+                if response is None:
+                    self.output(f"💭 {character.name}: \"我现在好像有点想不起来要说什么...\"")
+                    continue
+                self.output(f"💭 {character.name}: \"{response}\"")
+                self.remember_turn(char_id, character, message, response)
+        finally:
+            # Interrupted: do not leave requests running for replies nobody will see
+            for task in tasks:
+                task.cancel()
+        self.output()
     
     def move_player(self, direction: str):
         """Move the player in a direction"""
-        # 中文方向映射
-        direction_names = {
-            "north": "北方", "south": "南方", 
-            "east": "东方", "west": "西方"
-        }
-        
         success, message = self.world.move_to(direction)
         
         if success:
-            dir_name = direction_names.get(direction, direction)
-            print(f"您向{dir_name}走去。")
+            self.record({"type": "move", "to": self.world.current_location})
+            dir_name = DIRECTION_NAMES.get(direction, direction)
+            self.output(f"您向{dir_name}走去。")
         else:
-            print(message)
+            self.output(message)
         
         if success:
-            print()
+            self.output()
             self.look_around()
+            self.start_prefetches()
         else:
-            print()
+            self.output()
+    
+    def travel_to(self, query: str):
+        """Walk along the shortest route to a named location"""
+        destination = self.world.find_location(query)
+        if destination is None:
+            self.output(f"不知道 '{query}' 在哪里。")
+            self.output()
+            return
+        
+        route = self.world.routes.route(self.world.current_location, destination)
+        if route is None:
+            self.output(f"从这里到不了 {self.world.locations.name_of(destination)}。")
+            self.output()
+            return
+        if not route:
+            self.output("您已经在这里了。")
+            self.output()
+            return
+        
+        for direction, _ in route:
+            success, message = self.world.move_to(direction)
+            if not success:
+                self.output(message)
+                break
+        stops = [self.world.locations.name_of(location_id) for _, location_id in route]
+        self.output(f"🧭 您经过 {' → '.join(stops)}（{len(route)} 步）。")
+        self.record({"type": "move", "to": self.world.current_location})
+        self.output()
+        self.look_around()
+        self.start_prefetches()
+    
+    def show_distance(self, query: str):
+        """Tell the player how far a location is and which way to go"""
+        destination = self.world.find_location(query)
+        if destination is None:
+            self.output(f"不知道 '{query}' 在哪里。")
+        else:
+            name = self.world.locations.name_of(destination)
+            distance = self.world.routes.distance(self.world.current_location, destination)
+            if distance is None:
+                self.output(f"从这里到不了 {name}。")
+            elif distance == 0:
+                self.output(f"您就在 {name}。")
+            else:
+                direction = self.world.routes.next_step(self.world.current_location, destination)
+                dir_name = DIRECTION_NAMES.get(direction, direction)
+                self.output(f"📏 {name} 距离这里 {distance} 步，先向{dir_name}走。")
+        self.output()
+    
+    def find_item(self, query: str, holders: Sequence[str]) -> Optional[Item]:
+        """Resolve what the player typed to one item, telling them when that fails"""
+        matches = self.items.find(query, holders)
+        if not matches:
+            self.output(f"没有找到 '{query}'。")
+        elif len(matches) > 1:
+            self.output(f"'{query}' 指哪一个？{', '.join(item.name for item in matches)}")
+        else:
+            return matches[0]
+        self.output()
+        return None
+    
+    def take_item(self, query: str):
+        """Pick up an item at the current location"""
+        item = self.find_item(query, [self.world.current_location])
+        if item is not None:
+            self.items.move(item.item_id, INVENTORY)
+            self.record({"type": "item", "item": item.item_id, "to": INVENTORY})
+            self.output(f"🎒 您拿起了 {item.name}。")
+            self.output()
+    
+    def drop_item(self, query: str):
+        """Put down a carried item at the current location"""
+        item = self.find_item(query, [INVENTORY])
+        if item is not None:
+            self.items.move(item.item_id, self.world.current_location)
+            self.record({"type": "item", "item": item.item_id, "to": self.world.current_location})
+            self.output(f"您放下了 {item.name}。")
+            self.output()
+    
+    def use_item(self, query: str):
+        """Use a carried item or one lying here"""
+        item = self.find_item(query, [INVENTORY, self.world.current_location])
+        if item is None:
+            return
+        self.output(f"🔧 {item.use_text or f'{item.name} 没有什么特别的反应。'}")
+        if item.consumable:
+            self.items.move(item.item_id, None)
+            self.record({"type": "item", "item": item.item_id, "to": None})
+            self.output(f"{item.name} 用完了。")
+        self.output()
+    
+    def search(self, query: str = ""):
+        """Search the current location, or look for items by name or tag nearby"""
+        here = self.world.current_location
+        if query:
+            matches = self.items.find(query, [here, INVENTORY])
+            if matches:
+                for item in matches:
+                    where = "（已携带）" if item.holder == INVENTORY else ""
+                    self.output(f"  • {item.name}{where} - {item.description}")
+            else:
+                self.output(f"附近没有和 '{query}' 有关的东西。")
+            self.output()
+            return
+        
+        found = self.items.search(here)
+        if found:
+            self.record({"type": "reveal", "items": [item.item_id for item in found]})
+            self.output(f"🔍 您发现了 {', '.join(item.name for item in found)}！")
+        items = self.items.items_at(here)
+        if items:
+            for item in items:
+                self.output(f"  • {item.name} - {item.description}")
+        elif not found:
+            self.output("🔍 这里什么也没有。")
+        self.output()
+    
+    def show_inventory(self):
+        """List what the player carries"""
+        carried = self.items.items_at(INVENTORY)
+        if carried:
+            self.output("🎒 您携带着:")
+            for item in carried:
+                self.output(f"  • {item.name} - {item.description}")
+        else:
+            self.output("🎒 您什么也没带。")
+        self.output()
     
     def parse_command(self, command: str) -> tuple[str, List[str]]:
         """Parse a command into action and arguments"""
@@ -168,117 +635,222 @@ class Game:
         args = parts[1:]
         return action, args
     
+    def show_where(self):
+        location = self.world.get_current_location()
+        self.output(f"📍 您当前在: {location.name}")
+        self.output()
+    
+    def quit_game(self):
+        self.running = False
+        self.output("👋 感谢游玩！再见！")
+    
     async def handle_command(self, command: str):
         """Handle a player command"""
         action, args = self.parse_command(command)
         
-        # 退出命令 (中英文)
-        if action in ["quit", "q", "退出", "再见"]:
-            self.running = False
-            print("👋 感谢游玩！再见！")
-            
-        # 帮助命令 (中英文)
-        elif action in ["help", "h", "帮助", "命令"]:
-            self.display_help()
-            
-        # 查看命令 (中英文)
-        elif action in ["look", "l", "看", "查看", "观察"]:
-            self.look_around()
-            
-        # 位置命令 (中英文)
-        elif action in ["where", "位置", "我在哪"]:
-            location = self.world.get_current_location()
-            print(f"📍 您当前在: {location.name}")
-            print()
-            
-        # 角色命令 (中英文)
-        elif action in ["characters", "chars", "角色", "人物", "npc"]:
-            self.list_characters()
-            
-        # 移动命令 (中英文)
-        elif action in ["go", "move", "走", "去", "移动"]:
-            if args:
-                # 支持中文方向
-                direction_map = {
-                    "北": "north", "南": "south", "东": "east", "西": "west",
-                    "上": "north", "下": "south", "左": "west", "右": "east"
-                }
-                direction = direction_map.get(args[0], args[0])
-                self.move_player(direction)
-            else:
-                print("去哪里？(north/south/east/west 或 北/南/东/西)")
-                print()
-        
-        # 直接方向命令 (中英文)
-        elif action in ["north", "n", "south", "s", "east", "e", "west", "w", 
-                       "北", "南", "东", "西", "上", "下", "左", "右"]:
-            direction_map = {
-                "n": "north", "s": "south", "e": "east", "w": "west",
-                "北": "north", "南": "south", "东": "east", "西": "west",
-                "上": "north", "下": "south", "左": "west", "右": "east"
-            }
-            direction = direction_map.get(action, action)
-            self.move_player(direction)
-            
-        # 对话命令 (中英文)
-        elif action in ["talk", "说", "聊", "对话", "交谈"]:
-            if len(args) >= 1:
-                char_id = args[0]
-                message = " ".join(args[1:]) if len(args) > 1 else "你好"
-                await self.talk_to_character(char_id, message)
-            else:
-                print("和谁说话？使用: talk <角色ID> <消息>")
-                print("或者: 说 <角色ID> <消息>")
-                print()
-                
-        # 简单说话命令 (中英文)
-        elif action in ["say", "讲"]:
-            # 尝试在消息中找到角色名
-            characters = self.character_manager.get_characters_in_location(self.world.current_location)
-            if characters:
-                # 如果有多个角色，使用第一个
-                char_id = list(characters.keys())[0]
-                message = " ".join(args)
-                await self.talk_to_character(char_id, message)
+        found, candidates = self.commands.resolve(action)
+        if found is None:
+            if candidates:
+                self.output(f"'{action}' 可以是: {', '.join(candidates)}")
             else:
-                print("这里没有人可以交谈。")
-                print()
-                
+                self.output(f"未知命令: {action}")
+                self.output("输入 'help' 或 '帮助' 查看可用命令。")
+            self.output()
+        elif found.prompt and not args:
+            self.output(found.prompt)
+            self.output()
         else:
-            print(f"未知命令: {action}")
-            print("输入 'help' 或 '帮助' 查看可用命令。")
-            print()
+            await self.commands.dispatch(found, self, args)
+    
+    async def close(self):
+        """Stop background work and save; closes the AI service only if this game owns it"""
+        self.cancel_prefetches()
+        self.stop_world()
+        self.compactor.cancel()
+        if self.journal is not None:
+            self.journal.close()
+        if self._owns_ai_service:
+            await self.ai_service.close()
     
-    async def game_loop(self):
-        """Main game loop"""
+    def interrupt(self):
+        """Ctrl+C: stop the command in progress (e.g. a reply), or leave the game when idle"""
+        if self._command_task is not None and not self._command_task.done():
+            self._command_task.cancel()
+        else:
+            self.running = False
+            if self._read_task is not None:
+                self._read_task.cancel()
+    
+    async def run_command(self, command: str):
+        """Run one command as its own task so that only it is cancelled by Ctrl+C"""
+        task = self._command_task = asyncio.ensure_future(self.handle_command(command))
+        try:
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            task.cancel()  # the game loop itself is being cancelled
+            raise
+        finally:
+            self._command_task = None
+        if task.cancelled():
+            self.output()
+            self.output("⏹ 已打断。")
+            self.output()
+            return
+        task.result()
+    
+    async def game_loop(self, reader: Optional[Any] = None, catch_interrupts: bool = True):
+        """
+        Main game loop
+        
+        Input is read on the event loop, so timers, prefetches and summaries keep
+        running while the player types, and lines typed during a reply are queued.
+        
+        Args:
+            reader: Line source with start()/pending/readline()/close() (stdin if None)
+            catch_interrupts: Handle SIGINT with interrupt() while the loop runs
+        """
         self.display_welcome()
         self.look_around()
+        self.start_world()
         
-        while self.running:
+        reader = reader if reader is not None else InputReader()
+        reader.start()
+        loop = asyncio.get_running_loop()
+        watching_interrupts = False
+        if catch_interrupts:
             try:
-                command = input("🎮 > ").strip()
-                
-                if command:
-                    await self.handle_command(command)
+                loop.add_signal_handler(signal.SIGINT, self.interrupt)
+                watching_interrupts = True
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Windows, or not the main thread: Ctrl+C raises KeyboardInterrupt as before
+                pass
+        
+        try:
+            while self.running:
+                try:
+                    if not reader.pending:
+                        # Commands typed ahead run without a prompt in between
+                        self.output("🎮 > ", end="", flush=True)
+                    self._read_task = asyncio.ensure_future(reader.readline())
+                    try:
+                        command = (await self._read_task).strip()
+                    except asyncio.CancelledError:
+                        if self.running:
+                            raise
+                        self.output("\n\n👋 Thanks for playing! Goodbye!")
+                        break
+                    finally:
+                        self._read_task = None
                     
-            except KeyboardInterrupt:
-                print("\n\n👋 Thanks for playing! Goodbye!")
-                break
-            except EOFError:
-                print("\n\n👋 Thanks for playing! Goodbye!")
-                break
-            except Exception as e:
-                if config.DEBUG_MODE:
-                    print(f"Error: {e}")
-                    import traceback
-                    traceback.print_exc()
-                else:
-                    print("Something went wrong. Please try again.")
-                print()
+                    if command:
+                        await self.run_command(command)
+                        
+                except KeyboardInterrupt:
+                    self.output("\n\n👋 Thanks for playing! Goodbye!")
+                    break
+                except EOFError:
+                    self.output("\n\n👋 Thanks for playing! Goodbye!")
+                    break
+                except Exception as e:
+                    if config.DEBUG_MODE:
+                        self.output(f"Error: {e}")
+                        import traceback
+                        traceback.print_exc()
+                    else:
+                        self.output("Something went wrong. Please try again.")
+                    self.output()
+        finally:
+            reader.close()
+            if watching_interrupts:
+                loop.remove_signal_handler(signal.SIGINT)
+
+
+def build_commands() -> CommandRegistry:
+    """The built-in commands (English and Chinese aliases); handlers get (game, args)"""
+    commands = CommandRegistry()
+    commands.register(
+        "look", lambda game, args: game.look_around(), ["l", "看", "查看", "观察"],
+        "look / 看", "查看当前位置"
+    )
+    commands.register(
+        "go", lambda game, args: game.move_player(DIRECTION_ALIASES.get(args[0], args[0])),
+        ["move", "走", "去", "移动"], "go <方向> / 走 <方向>",
+        "移动 (north/south/east/west 或 北/南/东/西)", "去哪里？(north/south/east/west 或 北/南/东/西)"
+    )
+    for direction in DIRECTION_NAMES:
+        aliases = [alias for alias, target in DIRECTION_ALIASES.items() if target == direction]
+        # Single letters are aliases already; prefixes of directions would clash with other verbs
+        commands.register(
+            direction, lambda game, args, direction=direction: game.move_player(direction),
+            aliases, abbreviate=False
+        )
+    commands.register(
+        "talk", lambda game, args: game.talk_to_character(args[0], " ".join(args[1:]) or "你好"),
+        ["说", "聊", "对话", "交谈"], "talk <角色> / 说 <角色>", "与AI角色聊天",
+        "和谁说话？使用: talk <角色ID> <消息>\n或者: 说 <角色ID> <消息>"
+    )
+    commands.register(
+        "say", lambda game, args: game.say_to_everyone(" ".join(args) or "你好"), ["讲"],
+        "say <消息> / 讲 <消息>", "对在场的所有角色说话"
+    )
+    commands.register(
+        "characters", lambda game, args: game.list_characters(), ["chars", "角色", "人物", "npc"],
+        "characters / 角色", "列出当前位置的角色"
+    )
+    commands.register(
+        "where", lambda game, args: game.show_where(), ["位置", "我在哪"],
+        "where / 位置", "显示当前位置"
+    )
+    commands.register(
+        "take", lambda game, args: game.take_item(" ".join(args)), ["get", "pick", "拿", "捡", "拿起"],
+        "take <物品> / 拿 <物品>", "拿起这里的物品", "拿什么？使用: take <物品>"
+    )
+    commands.register(
+        "drop", lambda game, args: game.drop_item(" ".join(args)), ["放", "放下", "丢"],
+        "drop <物品> / 放 <物品>", "放下携带的物品", "放下什么？使用: drop <物品>"
+    )
+    commands.register(
+        "use", lambda game, args: game.use_item(" ".join(args)), ["用", "使用"],
+        "use <物品> / 用 <物品>", "使用物品", "用什么？使用: use <物品>"
+    )
+    commands.register(
+        "search", lambda game, args: game.search(" ".join(args)), ["搜索", "找"],
+        "search [词] / 搜索 [词]", "搜索这里（可按名称或标签查找物品）"
+    )
+    commands.register(
+        "inventory", lambda game, args: game.show_inventory(), ["inv", "i", "背包", "物品"],
+        "inventory / 背包", "查看携带的物品"
+    )
+    commands.register(
+        "travel", lambda game, args: game.travel_to(" ".join(args)), ["goto", "前往", "旅行"],
+        "travel <地点> / 前往 <地点>", "沿最短路线走到某个地点", "去哪里？使用: travel <地点>"
+    )
+    commands.register(
+        "distance", lambda game, args: game.show_distance(" ".join(args)), ["far", "多远", "距离"],
+        "distance <地点> / 多远 <地点>", "查询到某个地点的步数", "查询哪里？使用: distance <地点>"
+    )
+    commands.register(
+        "help", lambda game, args: game.display_help(), ["h", "帮助", "命令"],
+        "help / 帮助", "显示此帮助信息"
+    )
+    commands.register(
+        "quit", lambda game, args: game.quit_game(), ["q", "退出", "再见"],
+        "quit / 退出", "退出游戏"
+    )
+    return commands
+
+
+@lru_cache(maxsize=1)
+def default_commands() -> CommandRegistry:
+    """Built-in commands plus COMMAND_PLUGINS, built once and shared by every game"""
+    commands = build_commands()
+    load_plugins(commands, getattr(config, "COMMAND_PLUGINS", []))
+    return commands
 
 
 async def main():
     """Main function"""
+    game = None
     try:
         game = Game()
         await game.game_loop()
@@ -288,6 +860,9 @@ async def main():
             import traceback
             traceback.print_exc()
         sys.exit(1)
+    finally:
+        if game is not None:
+            await game.close()
 
 
 if __name__ == "__main__":
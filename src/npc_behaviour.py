@@ -0,0 +1,114 @@
+"""
+Autonomous NPC Behaviour
+
+Patrols, daily schedules (such as shop hours) and ambient messages, all run as
+timers on the world scheduler so idle NPCs cost nothing between events.
+"""
+import random
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from character import Character, CharacterManager
+from scheduler import WorldScheduler
+from world import World
+
+
+class WorldClock:
+    """Time of day in the game, with one game day lasting `day_length` real seconds"""
+
+    def __init__(self, day_length: float, start_hour: float, started_at: float):
+        self.seconds_per_hour = day_length / 24
+        self.start_hour = start_hour
+        self.started_at = started_at
+
+    def hour(self, now: float) -> float:
+        """Current game hour (0 <= hour < 24)"""
+        return (self.start_hour + (now - self.started_at) / self.seconds_per_hour) % 24
+
+    def seconds_until(self, hour: float, now: float) -> float:
+        """Real seconds until the clock next reaches `hour`"""
+        hours = (hour - self.hour(now)) % 24
+        return (hours or 24) * self.seconds_per_hour
+
+
+class NPCBehaviour:
+    """Moves characters along patrols and schedules, and shows ambient lines"""
+
+    def __init__(self, scheduler: WorldScheduler, world: World, characters: CharacterManager,
+                 clock: WorldClock, ambient_interval: float = 60.0,
+                 on_move: Optional[Callable[[str, Character, str, str], None]] = None,
+                 on_ambient: Optional[Callable[[str], None]] = None):
+        self.scheduler = scheduler
+        self.world = world
+        self.characters = characters
+        self.clock = clock
+        self.ambient_interval = ambient_interval
+        # Called with (char_id, character, previous, destination) after a character moves
+        self.on_move = on_move
+        # Called with an ambient line for the player's location
+        self.on_ambient = on_ambient
+        self._periodic: List[Any] = []
+        self._schedules: Dict[str, Any] = {}
+        self._patrol_stops: Dict[str, int] = {}  # char_id -> index of the stop being walked to
+        self._random = random.Random()
+
+    def start(self, records: Mapping[str, Dict[str, Any]]):
+        """Start the behaviours described by the content pack's character records"""
+        for char_id, record in records.items():
+            patrol = record.get("patrol")
+            if patrol is not None:
+                interval = patrol["interval"]
+                # Spread the first step so patrols with the same interval do not move in lockstep
+                self._periodic.append(self.scheduler.call_every(
+                    interval, self._patrol_step, char_id, patrol["route"],
+                    first_delay=self._random.uniform(0, interval)
+                ))
+            if record.get("schedule"):
+                self._follow_schedule(char_id, record["schedule"])
+        if self.ambient_interval > 0:
+            self._periodic.append(self.scheduler.call_every(self.ambient_interval, self._ambient))
+
+    def stop(self):
+        """Cancel all behaviour timers"""
+        for handle in self._periodic + list(self._schedules.values()):
+            handle.cancel()
+        self._periodic.clear()
+        self._schedules.clear()
+
+    def _move(self, char_id: str, destination: str):
+        character = self.characters.get_character(char_id)
+        if character is None or character.location == destination:
+            return
+        previous = character.location
+        # The location setter keeps the manager's location index current
+        character.location = destination
+        if self.on_move is not None:
+            self.on_move(char_id, character, previous, destination)
+
+    def _patrol_step(self, char_id: str, route: List[str]):
+        """Walk one exit towards the next stop on the route"""
+        character = self.characters.get_character(char_id)
+        if character is None:
+            return
+        stop = self._patrol_stops.get(char_id, 0)
+        if character.location == route[stop]:
+            stop = self._patrol_stops[char_id] = (stop + 1) % len(route)
+        # Stops need not be adjacent; an unreachable stop is jumped to directly
+        step = self.world.routes.next_location(character.location, route[stop])
+        self._move(char_id, step or route[stop])
+
+    def _follow_schedule(self, char_id: str, schedule: Mapping[int, str]):
+        """Go where the schedule says for this hour, then wait for the next change"""
+        now = self.scheduler.time()
+        hour = self.clock.hour(now)
+        hours = sorted(schedule)
+        current = max((entry for entry in hours if entry <= hour), default=hours[-1])
+        upcoming = min((entry for entry in hours if entry > hour), default=hours[0])
+        self._move(char_id, schedule[current])
+        self._schedules[char_id] = self.scheduler.call_later(
+            self.clock.seconds_until(upcoming, now), self._follow_schedule, char_id, schedule
+        )
+
+    def _ambient(self):
+        location = self.world.get_current_location()
+        if location.ambient and self.on_ambient is not None:
+            self.on_ambient(self._random.choice(location.ambient))
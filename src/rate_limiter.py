@@ -0,0 +1,192 @@
+"""
+Provider-aware rate limiting
+按提供商和模型限制每分钟请求数、token数和并发数，等待的请求按优先级排队
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+# 优先级：数值越小越先放行
+PRIORITY_INTERACTIVE = 0  # 玩家正在等待的回复
+PRIORITY_BACKGROUND = 10  # 预取、摘要等后台任务
+
+
+class TokenBucket:
+    """令牌桶：以固定速率补充，最多积累 capacity 个令牌"""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """还需要等待多少秒才能取出 amount 个令牌"""
+        self._refill(now)
+        # 超过桶容量的请求等桶满即可放行，否则永远无法通过
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        """取出令牌（允许透支，透支部分由之后的补充偿还）"""
+        self.tokens -= amount
+
+
+class PrioritySemaphore:
+    """
+    按优先级分配名额的信号量
+
+    与 asyncio.Semaphore 相同，但空出的名额先交给优先级高的等待者，
+    后台任务占满并发时玩家的请求不必排在它们后面。
+    """
+
+    def __init__(self, value: int):
+        self._value = max(1, value)
+        self._waiters: List[Tuple[int, int, "asyncio.Future[None]"]] = []
+        self._counter = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        """正在等待名额的请求数"""
+        return sum(1 for waiter in self._waiters if not waiter[2].done())
+
+    def _has_waiters(self) -> bool:
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        return bool(self._waiters)
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        """等待一个名额"""
+        if self._value > 0 and not self._has_waiters():
+            self._value -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名额已经分给了这个等待者，交给下一个
+                self.release()
+            raise
+
+    def release(self):
+        """归还名额，优先交给优先级最高的等待者"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[None]:
+        """async with semaphore.slot(priority): ..."""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class RateLimiter:
+    """单个提供商/模型的请求数和token数限流器"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        self._request_bucket = (
+            TokenBucket(requests_per_minute / 60.0, requests_per_minute)
+            if requests_per_minute else None
+        )
+        self._token_bucket = (
+            TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+            if tokens_per_minute else None
+        )
+        self._waiters: List[Tuple[int, int, "asyncio.Future[None]", int]] = []
+        self._counter = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def queued(self) -> int:
+        """正在排队的请求数"""
+        return sum(1 for waiter in self._waiters if not waiter[2].done())
+
+    def _time_until(self, tokens: int) -> float:
+        now = time.monotonic()
+        wait = 0.0
+        if self._request_bucket is not None:
+            wait = max(wait, self._request_bucket.time_until(1, now))
+        if self._token_bucket is not None and tokens:
+            wait = max(wait, self._token_bucket.time_until(tokens, now))
+        return wait
+
+    def _consume(self, tokens: int):
+        if self._request_bucket is not None:
+            self._request_bucket.consume(1)
+        if self._token_bucket is not None and tokens:
+            self._token_bucket.consume(tokens)
+
+    async def acquire(self, tokens: int = 0, priority: int = PRIORITY_INTERACTIVE):
+        """
+        等待直到可以发送一个预计消耗 tokens 个token的请求
+
+        超出限额时排队等待而不是失败；优先级高的请求先放行。
+        """
+        if not self._waiters and self._time_until(tokens) == 0:
+            self._consume(tokens)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future, tokens))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 已取消的等待者会在 _dispatch 中被跳过
+            self._dispatch()
+            raise
+
+    def _dispatch(self):
+        """按优先级放行排在前面的请求，必要时设定下一次检查的时间"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._waiters:
+            _, _, future, tokens = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            wait = self._time_until(tokens)
+            if wait > 0:
+                loop = asyncio.get_running_loop()
+                self._timer = loop.call_later(wait, self._dispatch)
+                return
+
+            heapq.heappop(self._waiters)
+            self._consume(tokens)
+            future.set_result(None)
+
+
+def create_rate_limiter(limits: Dict[str, Dict[str, Any]], provider: str,
+                        model: str) -> Optional[RateLimiter]:
+    """
+    根据配置为提供商/模型创建限流器
+
+    先查找 "provider:model"，再查找 "provider"；都没有配置时不限流。
+    """
+    settings = limits.get(f"{provider}:{model}") or limits.get(provider)
+    if not settings:
+        return None
+    return RateLimiter(settings.get("rpm"), settings.get("tpm"))
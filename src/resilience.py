@@ -0,0 +1,101 @@
+"""
+Resilience helpers for AI requests
+重试退避、熔断器和瞬时错误判断
+"""
+import asyncio
+import random
+import time
+from typing import Optional
+
+
+class CircuitOpenError(Exception):
+    """所有可用提供商的熔断器都处于打开状态"""
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """判断错误是否值得重试（超时、连接错误、429、5xx）"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+
+    # openai.APITimeoutError / APIConnectionError 等不带状态码
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+class RetryPolicy:
+    """带完全抖动（full jitter）的指数退避"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def get_delay(self, attempt: int) -> float:
+        """第 attempt 次失败（从0开始）后应等待的秒数"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    单个提供商的熔断器
+
+    连续失败达到阈值后打开，在 reset_timeout 内直接拒绝请求；
+    之后进入半开状态，只放行一个试探请求，成功则恢复，失败则重新打开。
+    试探请求被取消时应调用 release()；即使没有调用，试探超过 reset_timeout
+    仍无结果也会放行新的试探。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._trial_started_at = 0.0
+
+    def allow_request(self) -> bool:
+        """当前是否可以向该提供商发送请求"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+        # 半开状态：只放行一个试探请求
+        now = time.monotonic()
+        if self._trial_in_flight and now - self._trial_started_at < self.reset_timeout:
+            return False
+        self._trial_in_flight = True
+        self._trial_started_at = now
+        return True
+
+    def release(self):
+        """试探请求没有结果（例如被取消），允许下一个请求重新试探"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        """请求成功，关闭熔断器"""
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        """请求失败，必要时打开熔断器"""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._trial_in_flight = False
@@ -0,0 +1,254 @@
+"""
+Response Cache
+角色回复的两级缓存：内存LRU + SQLite持久化存储
+"""
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def make_cache_key(provider: str, model: str, system_prompt: str, user_message: str) -> str:
+    """根据提供商、模型、系统提示词哈希和玩家消息生成缓存键"""
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    raw = "\x1f".join((provider, model, prompt_hash, user_message))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    带TTL的内存LRU缓存，可选SQLite作为持久化的第二层
+
+    在事件循环中使用时，磁盘读写都在单独的线程里进行：写入先进入缓冲区，
+    每隔 flush_interval 秒或攒够 batch_size 条后在一个事务中批量提交。
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0,
+                 db_path: Optional[str] = None, max_disk_entries: int = 10000,
+                 flush_interval: float = 1.0, batch_size: int = 32):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key -> (过期时间, 回复)
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, Tuple[str, float, float]] = {}  # key -> (回复, 过期时间, 写入时间)
+        self._flush_task: Optional[asyncio.Task] = None
+        self._disk_writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str):
+        """打开（必要时创建）持久化存储"""
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 已足够安全，且不必每次提交都 fsync
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_created ON responses (created_at)"
+        )
+        self._db.commit()
+        # 单个工作线程，磁盘操作按提交顺序执行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        """查找内存层和尚未写入磁盘的缓冲区"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+            del self._memory[key]
+
+        pending = self._pending.get(key)
+        if pending is not None and pending[1] > now:
+            self._remember(key, pending[0], pending[1])
+            self.memory_hits += 1
+            return pending[0]
+        return None
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is not None and row[1] > now:
+            return row
+        return None
+
+    def _promote(self, key: str, row: Tuple[str, float]) -> str:
+        """磁盘命中提升到内存层"""
+        self._remember(key, row[0], row[1])
+        self.disk_hits += 1
+        return row[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """查找缓存的回复，先查内存再查磁盘（同步读取磁盘）"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is not None:
+            return value
+
+        if self._db is not None:
+            row = self._read_disk(key, now)
+            if row is not None:
+                return self._promote(key, row)
+
+        self.misses += 1
+        return None
+
+    async def get_any(self, keys: Sequence[str]) -> Optional[str]:
+        """
+        按顺序查找多个键，返回第一个命中的回复
+
+        磁盘查询在工作线程中进行，不阻塞事件循环。
+        """
+        now = time.time()
+        for key in keys:
+            value = self._get_memory(key, now)
+            if value is not None:
+                return value
+
+        if self._db is not None:
+            loop = asyncio.get_running_loop()
+            for key in keys:
+                row = await loop.run_in_executor(self._executor, self._read_disk, key, now)
+                if row is not None:
+                    return self._promote(key, row)
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str):
+        """
+        写入两级缓存
+
+        内存层立即生效；磁盘写入进入缓冲区，在事件循环中由后台批量提交，
+        没有运行中的事件循环时直接提交。
+        """
+        now = time.time()
+        expires_at = now + self.ttl
+        self._remember(key, value, expires_at)
+
+        if self._db is None:
+            return
+        self._pending[key] = (value, expires_at, now)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush_later())
+        elif len(self._pending) >= self.batch_size:
+            # 缓冲区已满，不必等到定时提交
+            self._flush_task.cancel()
+            self._flush_task = loop.create_task(self._flush_later(0))
+
+    async def _flush_later(self, delay: Optional[float] = None):
+        """等待片刻后在工作线程中提交缓冲区"""
+        await asyncio.sleep(self.flush_interval if delay is None else delay)
+        self._flush_task = None
+        batch = self._take_pending()
+        if batch:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._write_batch, batch
+            )
+
+    def _take_pending(self) -> List[Tuple[str, str, float, float]]:
+        batch = [(key, value, expires_at, created_at)
+                 for key, (value, expires_at, created_at) in self._pending.items()]
+        self._pending.clear()
+        return batch
+
+    def _write_batch(self, batch: List[Tuple[str, str, float, float]]):
+        """在一个事务中写入一批回复"""
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.executemany(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                batch
+            )
+            previous = self._disk_writes
+            self._disk_writes += len(batch)
+            # 定期清理过期和超出容量的条目，避免每次写入都扫描
+            if self._disk_writes // 100 != previous // 100:
+                self._prune_disk(time.time())
+            self._db.commit()
+
+    def flush(self):
+        """立即把缓冲区写入磁盘（同步）"""
+        if self._db is not None and self._pending:
+            self._write_batch(self._take_pending())
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        """写入内存层并按LRU淘汰"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune_disk(self, now: float):
+        """删除磁盘层中过期或最旧的条目"""
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+    def clear(self):
+        """清空所有缓存"""
+        self._memory.clear()
+        self._pending.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中统计"""
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self):
+        """写入缓冲区中剩余的回复并关闭持久化存储"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._executor is not None:
+            # 等待正在进行的批量写入完成
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
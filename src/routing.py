@@ -0,0 +1,133 @@
+"""
+Route Planning
+
+Shortest routes over the location exit graph. Routes to a destination are
+computed once with a BFS over the reversed graph, which gives the distance and
+next step from every location at the same time, and kept in a bounded table.
+When an exit changes the cached tables are repaired or dropped individually
+rather than rebuilt wholesale.
+"""
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from world import World
+
+# location_id -> (moves to the destination, direction of the first move)
+RouteRow = Dict[str, Tuple[int, str]]
+
+
+class RouteTable:
+    """Distances and next steps towards recently used destinations"""
+
+    def __init__(self, world: "World", max_rows: int = 256):
+        self.world = world
+        self.max_rows = max(1, max_rows)
+        self._rows: "OrderedDict[str, RouteRow]" = OrderedDict()
+        # target -> {(source, direction): None}, built on first use; dicts keep
+        # the order stable so equally short routes are always chosen the same way
+        self._incoming: Optional[Dict[str, Dict[Tuple[str, str], None]]] = None
+
+    def _reverse_graph(self) -> Dict[str, Dict[Tuple[str, str], None]]:
+        if self._incoming is None:
+            incoming: Dict[str, Dict[Tuple[str, str], None]] = {}
+            for location_id in self.world.locations:
+                for direction, target in self.world.get_exits(location_id).items():
+                    incoming.setdefault(target, {})[(location_id, direction)] = None
+            self._incoming = incoming
+        return self._incoming
+
+    def _row(self, destination: str) -> RouteRow:
+        row = self._rows.get(destination)
+        if row is not None:
+            self._rows.move_to_end(destination)
+            return row
+
+        incoming = self._reverse_graph()
+        row = {destination: (0, "")}
+        queue = deque([destination])
+        while queue:
+            location_id = queue.popleft()
+            distance = row[location_id][0] + 1
+            for source, direction in incoming.get(location_id, ()):
+                if source not in row:
+                    row[source] = (distance, direction)
+                    queue.append(source)
+
+        self._rows[destination] = row
+        if len(self._rows) > self.max_rows:
+            self._rows.popitem(last=False)
+        return row
+
+    def distance(self, source: str, destination: str) -> Optional[int]:
+        """Number of moves from source to destination, None if unreachable"""
+        entry = self._row(destination).get(source)
+        return entry[0] if entry is not None else None
+
+    def next_step(self, source: str, destination: str) -> Optional[str]:
+        """Direction of the first move towards destination ("" when already there)"""
+        entry = self._row(destination).get(source)
+        return entry[1] if entry is not None else None
+
+    def next_location(self, source: str, destination: str) -> Optional[str]:
+        """Location reached by the first move towards destination"""
+        direction = self.next_step(source, destination)
+        if not direction:
+            return None
+        return self.world.get_exits(source).get(direction)
+
+    def route(self, source: str, destination: str) -> Optional[List[Tuple[str, str]]]:
+        """Shortest route as (direction, location_id) moves, None if unreachable"""
+        row = self._row(destination)
+        if source not in row:
+            return None
+        moves = []
+        location_id = source
+        while location_id != destination:
+            direction = row[location_id][1]
+            location_id = self.world.get_exits(location_id)[direction]
+            moves.append((direction, location_id))
+        return moves
+
+    def exit_changed(self, location_id: str, direction: str,
+                     old_target: Optional[str], new_target: Optional[str]):
+        """
+        Update the cached tables after an exit was added, removed or redirected
+
+        A removed exit only matters to tables whose route from `location_id` used
+        it; those are dropped and rebuilt on next use. An added exit can only make
+        routes shorter, so each table is repaired by relaxing outwards from
+        `location_id`.
+        """
+        if self._incoming is None:
+            return
+        if old_target is not None:
+            self._incoming.get(old_target, {}).pop((location_id, direction), None)
+            for destination in [destination for destination, row in self._rows.items()
+                                if row.get(location_id, (0, ""))[1] == direction]:
+                del self._rows[destination]
+        if new_target is not None:
+            self._incoming.setdefault(new_target, {})[(location_id, direction)] = None
+            for row in self._rows.values():
+                self._relax(row, location_id, direction, new_target)
+
+    def _relax(self, row: RouteRow, source: str, direction: str, target: str):
+        if target not in row:
+            return
+        distance = row[target][0] + 1
+        if source in row and row[source][0] <= distance:
+            return
+        row[source] = (distance, direction)
+        queue = deque([source])
+        while queue:
+            location_id = queue.popleft()
+            distance = row[location_id][0] + 1
+            for previous, step in self._incoming.get(location_id, ()):
+                if previous not in row or row[previous][0] > distance:
+                    row[previous] = (distance, step)
+                    queue.append(previous)
+
+    def invalidate(self):
+        """Forget everything (e.g. after whole locations were replaced)"""
+        self._rows.clear()
+        self._incoming = None
@@ -0,0 +1,254 @@
+"""
+World scheduler
+分层时间轮：大量定时器的添加和取消都是O(1)，空闲时不轮询
+"""
+import asyncio
+import math
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Timer:
+    """时间轮中的一个定时器，可以随时取消"""
+
+    __slots__ = ("expires", "callback", "args", "_slot", "_level", "_wheel")
+
+    def __init__(self, wheel: "TimingWheel", expires: int, callback: Callable[..., Any], args: tuple):
+        self.expires = expires  # 到期的刻度
+        self.callback = callback
+        self.args = args
+        self._wheel = wheel
+        self._slot: Optional[Dict["Timer", None]] = None
+        self._level = 0
+
+    @property
+    def active(self) -> bool:
+        return self._slot is not None
+
+    def cancel(self):
+        """取消定时器（已到期或已取消时什么也不做）"""
+        if self._slot is not None:
+            del self._slot[self]
+            self._wheel._counts[self._level] -= 1
+            self._slot = None
+
+
+class TimingWheel:
+    """
+    分层时间轮
+
+    第 L 层的每个槽覆盖 slots**L 个刻度。定时器按剩余时间放入对应的层，
+    低一层转完一圈时把高一层当前槽里的定时器重新分配到低层。每个槽是以定时器为键
+    的 dict，添加和取消都是常数时间。
+    """
+
+    def __init__(self, tick: float = 0.1, slot_bits: int = 6, levels: int = 4, now: float = 0.0):
+        self.tick = tick
+        self._bits = slot_bits
+        self._mask = (1 << slot_bits) - 1
+        self._levels = levels
+        self._wheels: List[List[Dict[Timer, None]]] = [
+            [{} for _ in range(1 << slot_bits)] for _ in range(levels)
+        ]
+        self._counts = [0] * levels
+        self._current = math.floor(now / tick)
+
+    def __len__(self) -> int:
+        return sum(self._counts)
+
+    def add(self, when: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        """在时间 when（与 now 同一时钟）之后调用 callback(*args)"""
+        expires = max(self._current + 1, math.ceil(when / self.tick))
+        timer = Timer(self, expires, callback, args)
+        self._place(timer)
+        return timer
+
+    def _place(self, timer: Timer):
+        delta = timer.expires - self._current
+        expires = timer.expires
+        for level in range(self._levels):
+            if delta < 1 << (self._bits * (level + 1)):
+                break
+        else:
+            # 超出最高层的范围：先放在最远的槽，转到时再重新分配
+            expires = self._current + (1 << (self._bits * self._levels)) - 1
+        slot = self._wheels[level][(expires >> (self._bits * level)) & self._mask]
+        slot[timer] = None
+        timer._slot = slot
+        timer._level = level
+        self._counts[level] += 1
+
+    def _cascade(self, tick: int):
+        """tick 跨过低层的一圈时，把高层对应槽中的定时器重新分配"""
+        for level in range(1, self._levels):
+            index = (tick >> (self._bits * level)) & self._mask
+            slot = self._wheels[level][index]
+            if slot:
+                timers = list(slot)
+                slot.clear()
+                self._counts[level] -= len(timers)
+                for timer in timers:
+                    self._place(timer)
+            if index:
+                break
+
+    def advance(self, now: float) -> List[Timer]:
+        """
+        走到时间 now，返回到期的定时器（按到期顺序）
+
+        第0层为空时直接跳到下一次需要重新分配的刻度，长时间空闲后追赶也很快。
+        """
+        # 容忍浮点误差和事件循环提前一点点唤醒
+        target = math.floor(now / self.tick + 1e-6)
+        due: List[Timer] = []
+        while self._current < target:
+            if not self._counts[0]:
+                boundary = (self._current | self._mask) + 1
+                if boundary > target:
+                    self._current = target
+                    break
+                self._current = boundary
+            else:
+                self._current += 1
+            if not self._current & self._mask:
+                self._cascade(self._current)
+            slot = self._wheels[0][self._current & self._mask]
+            if slot:
+                timers = list(slot)
+                slot.clear()
+                self._counts[0] -= len(timers)
+                for timer in timers:
+                    timer._slot = None
+                due.extend(timers)
+        return due
+
+    def next_expiry(self) -> Optional[float]:
+        """
+        下一次需要调用 advance 的时间（有定时器到期或需要重新分配），没有定时器时为 None
+
+        只检查每层的槽，开销与定时器数量无关。
+        """
+        if not any(self._counts):
+            return None
+        best: Optional[int] = None
+        for level in range(self._levels):
+            if not self._counts[level]:
+                continue
+            shift = self._bits * level
+            base = self._current >> shift
+            for offset in range(1, self._mask + 2):
+                if self._wheels[level][(base + offset) & self._mask]:
+                    tick = (base + offset) << shift
+                    if best is None or tick < best:
+                        best = tick
+                    break
+        return best * self.tick if best is not None else None
+
+
+class Periodic:
+    """重复执行的定时任务"""
+
+    __slots__ = ("_scheduler", "interval", "callback", "args", "_timer")
+
+    def __init__(self, scheduler: "WorldScheduler", interval: float,
+                 callback: Callable[..., Any], args: tuple):
+        self._scheduler = scheduler
+        self.interval = interval
+        self.callback = callback
+        self.args = args
+        self._timer: Optional[Timer] = None
+
+    @property
+    def active(self) -> bool:
+        return self._timer is not None
+
+    def _run(self):
+        # 先排下一次，回调中可以调用 cancel() 停止
+        self._timer = self._scheduler.call_later(self.interval, self._run)
+        self.callback(*self.args)
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+class WorldScheduler:
+    """
+    在事件循环上驱动时间轮
+
+    只挂一个 loop.call_at 到下一次需要处理的时间；没有定时器时什么也不做。
+    回调是普通函数，在事件循环中执行。
+    """
+
+    def __init__(self, tick: float = 0.1):
+        self.tick = tick
+        self._wheel: Optional[TimingWheel] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._armed_at: Optional[float] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __len__(self) -> int:
+        return len(self._wheel) if self._wheel is not None else 0
+
+    def _ensure_wheel(self) -> TimingWheel:
+        if self._wheel is None:
+            self._loop = asyncio.get_running_loop()
+            self._wheel = TimingWheel(self.tick, now=self._loop.time())
+        return self._wheel
+
+    def time(self) -> float:
+        """调度器使用的时钟（事件循环时间）"""
+        return asyncio.get_running_loop().time()
+
+    def call_at(self, when: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        """在循环时间 when 调用 callback(*args)"""
+        wheel = self._ensure_wheel()
+        timer = wheel.add(when, callback, *args)
+        deadline = timer.expires * self.tick
+        if self._armed_at is None or deadline < self._armed_at:
+            self._arm(deadline)
+        return timer
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        """delay 秒后调用 callback(*args)"""
+        return self.call_at(self.time() + delay, callback, *args)
+
+    def call_every(self, interval: float, callback: Callable[..., Any], *args: Any,
+                   first_delay: Optional[float] = None) -> Periodic:
+        """每隔 interval 秒调用一次 callback(*args)，直到取消"""
+        periodic = Periodic(self, interval, callback, args)
+        periodic._timer = self.call_later(
+            interval if first_delay is None else first_delay, periodic._run
+        )
+        return periodic
+
+    def _arm(self, deadline: float):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._armed_at = deadline
+        self._handle = self._loop.call_at(deadline, self._on_timer)
+
+    def _on_timer(self):
+        self._handle = None
+        self._armed_at = None
+        for timer in self._wheel.advance(self._loop.time()):
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                self._loop.call_exception_handler({
+                    "message": "scheduled callback failed",
+                    "exception": e,
+                })
+        if self._wheel is None:
+            return  # 回调中关闭了调度器
+        deadline = self._wheel.next_expiry()
+        if deadline is not None and (self._armed_at is None or deadline < self._armed_at):
+            self._arm(deadline)
+
+    def close(self):
+        """停止调度（已添加的定时器不再执行）"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._armed_at = None
+        self._wheel = None
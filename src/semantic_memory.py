@@ -0,0 +1,133 @@
+"""
+Long-term semantic memory
+角色的长期记忆：离线哈希嵌入 + 基于NumPy的top-k相似度检索
+"""
+import re
+import zlib
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np  # 可选：安装后使用矩阵运算检索，数千条记忆也在亚毫秒级
+except ImportError:
+    np = None
+
+
+# 中日韩字符逐字切分，其他文字按单词切分
+_TOKEN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]|[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """
+    不需要模型和网络的文本嵌入
+
+    把单字/单词和相邻二元组哈希到固定维度的向量（带符号，减少冲突的影响），
+    再做L2归一化，内积即余弦相似度。
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        return tokens + [a + b for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, text: str):
+        """返回归一化的向量（有NumPy时为 float32 数组，否则为列表）"""
+        vector = [0.0] * self.dim
+        for feature in self.features(text):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            vector[digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+
+        norm = sum(value * value for value in vector) ** 0.5
+        if norm:
+            vector = [value / norm for value in vector]
+        if np is not None:
+            return np.asarray(vector, dtype=np.float32)
+        return vector
+
+
+class SemanticMemory:
+    """
+    单个角色的长期记忆
+
+    最多保存 capacity 条，满了之后覆盖最旧的一条。向量存放在预分配并按需
+    加倍的矩阵中，检索是一次矩阵-向量乘法加 argpartition。
+    """
+
+    def __init__(self, embedder: Optional[HashingEmbedder] = None, capacity: int = 5000):
+        self.embedder = embedder or HashingEmbedder()
+        self.capacity = max(1, capacity)
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def remember(self, text: str):
+        """记住一段文本（例如移出对话窗口的一轮对话）"""
+        vector = self.embedder.embed(text)
+
+        if len(self.texts) < self.capacity:
+            slot = len(self.texts)
+            self.texts.append(text)
+        else:
+            slot = self._next
+            self.texts[slot] = text
+            self._next = (slot + 1) % self.capacity
+
+        if np is None:
+            if slot == len(self._vectors):
+                self._vectors.append(vector)
+            else:
+                self._vectors[slot] = vector
+            return
+
+        if slot >= len(self._vectors):
+            rows = min(self.capacity, max(64, len(self._vectors) * 2))
+            grown = np.zeros((rows, self.embedder.dim), dtype=np.float32)
+            grown[:len(self._vectors)] = self._vectors
+            self._vectors = grown
+        self._vectors[slot] = vector
+
+    def export(self) -> List[str]:
+        """按写入顺序（从旧到新）返回所有记忆文本，用于存档"""
+        return self.texts[self._next:] + self.texts[:self._next]
+
+    def clear(self):
+        """清空所有记忆"""
+        self.texts: List[str] = []
+        self._next = 0  # 满了之后下一条要覆盖的位置
+        # 第一条记忆写入时才分配，没有说过话的角色不占用向量空间
+        self._vectors = np.zeros((0, self.embedder.dim), dtype=np.float32) if np is not None else []
+
+    def recall(self, query: str, k: int = 3, min_score: float = 0.1) -> List[Tuple[str, float]]:
+        """
+        查找与 query 最相关的 k 条记忆
+
+        Returns:
+            (文本, 相似度) 列表，按相似度从高到低
+        """
+        count = len(self.texts)
+        if not count or k <= 0:
+            return []
+        query_vector = self.embedder.embed(query)
+
+        if np is None:
+            scored = sorted(
+                ((sum(a * b for a, b in zip(vector, query_vector)), index)
+                 for index, vector in enumerate(self._vectors)),
+                reverse=True
+            )[:k]
+            return [(self.texts[index], score) for score, index in scored if score >= min_score]
+
+        scores = self._vectors[:count] @ query_vector
+        if count > k:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(count)
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(self.texts[index], float(scores[index])) for index in top
+                if scores[index] >= min_score]
+
+    def recall_texts(self, query: str, k: int = 3, min_score: float = 0.1) -> Sequence[str]:
+        """只返回相关记忆的文本"""
+        return [text for text, _ in self.recall(query, k, min_score)]
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Multi-player Game Server
+
+Hosts many player sessions in one process over plain TCP (any telnet client
+works). Each connection gets its own Game - world state, characters, items
+and journal - while the AI service with its connection pool, rate limits and
+response cache, and the loaded world content are shared by all of them.
+
+    python src/server.py            # then: telnet 127.0.0.1 4000
+"""
+import asyncio
+import os
+import re
+from typing import Any, Dict, Optional, Set, Tuple
+
+from ai_service import AIService
+from content_pack import ContentPack
+from input_reader import InputReader
+from main import Game, config, load_game_content
+
+# Telnet protocol bytes (RFC 854)
+IAC, SB, SE, IP = 255, 250, 240, 244
+WILL, WONT, DO, DONT = 251, 252, 253, 254
+CTRL_C = 3
+
+
+def strip_telnet(data: bytes) -> Tuple[bytes, bytes, bool]:
+    """
+    Remove telnet negotiation from received bytes
+
+    Returns the text, an unfinished IAC sequence to put in front of the next
+    read, and whether Ctrl+C or "interrupt process" was among the bytes.
+    """
+    text = bytearray()
+    interrupted = False
+    index = 0
+    while index < len(data):
+        byte = data[index]
+        if byte == CTRL_C:
+            interrupted = True
+            index += 1
+        elif byte == 0:
+            index += 1  # "\r\0" is a bare carriage return
+        elif byte != IAC:
+            text.append(byte)
+            index += 1
+        elif index + 1 >= len(data):
+            return bytes(text), data[index:], interrupted
+        else:
+            command = data[index + 1]
+            if command == IAC:
+                text.append(IAC)
+                index += 2
+            elif command in (WILL, WONT, DO, DONT):
+                if index + 2 >= len(data):
+                    return bytes(text), data[index:], interrupted
+                index += 3
+            elif command == SB:
+                end = data.find(bytes([IAC, SE]), index + 2)
+                if end < 0:
+                    return bytes(text), data[index:], interrupted
+                index = end + 2
+            else:
+                interrupted = interrupted or command == IP
+                index += 2
+    return bytes(text), b"", interrupted
+
+
+def clean_name(text: str) -> str:
+    """A typed player name made safe to use as a save directory"""
+    return re.sub(r"[^\w-]", "_", text.strip())[:32]
+
+
+class TelnetInputReader(InputReader):
+    """
+    Lines from a connection, with telnet negotiation stripped
+
+    Ctrl+C (or telnet's "interrupt process") calls `on_interrupt` instead of
+    ending up in the line, so it cancels the command in progress like on the console.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, on_interrupt=None):
+        super().__init__(stream=reader)
+        self.writer = writer
+        self.on_interrupt = on_interrupt
+        self._pending_bytes = b""  # an IAC sequence split across reads
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.ensure_future(self._pump())
+
+    async def _pump(self):
+        try:
+            while True:
+                data = await self.stream.read(4096)
+                if not data:
+                    break
+                text, self._pending_bytes, interrupted = strip_telnet(self._pending_bytes + data)
+                if interrupted and self.on_interrupt is not None:
+                    self.on_interrupt()
+                self._feed(text)
+        except (ConnectionError, OSError):
+            pass
+        self._finish()
+
+    async def readline(self) -> str:
+        # Let a slow client's output drain before waiting for its next command
+        try:
+            await self.writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        return await super().readline()
+
+    def close(self):
+        # _finish() calls this from the pump itself, which then just returns
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+
+class ConnectionOutput:
+    """print()-like output to a connection (telnet wants CRLF line ends)"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    def __call__(self, *values: Any, sep: str = " ", end: str = "\n", flush: bool = False):
+        if self.writer.is_closing():
+            return
+        text = sep.join(str(value) for value in values) + end
+        self.writer.write(text.replace("\r\n", "\n").replace("\n", "\r\n").encode("utf-8"))
+
+
+class GameServer:
+    """Accepts connections and runs one isolated Game per player"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 4000, max_sessions: int = 500,
+                 ai_service: Optional[AIService] = None, content: Optional[ContentPack] = None,
+                 save_dir: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.ai_service = ai_service if ai_service is not None else AIService()
+        self.content = content if content is not None else load_game_content()
+        # Each player's journal goes in its own directory under here; None disables saving
+        self.save_dir = save_dir
+        self.sessions: Dict[str, Game] = {}  # player name -> game
+        self._tasks: Set[asyncio.Task] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """Start listening; returns once the socket is bound"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # Port 0 picks a free port; report the real one
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await self.run_session(reader, writer)
+
+    async def run_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                          name: Optional[str] = None):
+        """Play one connection until the player leaves, asking for their name unless given"""
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        output = ConnectionOutput(writer)
+        game: Optional[Game] = None
+        try:
+            if len(self.sessions) >= self.max_sessions:
+                output("😔 服务器已满，请稍后再来。")
+                return
+            lines = TelnetInputReader(reader, writer)
+            lines.start()
+            if name is None:
+                name = await self._ask_name(lines, output)
+                if name is None:
+                    return
+
+            save_dir = os.path.join(self.save_dir, "players", name) if self.save_dir else ""
+            game = Game(self.ai_service, self.content, output, save_dir)
+            game.player_name = name
+            self.sessions[name] = game
+            lines.on_interrupt = game.interrupt
+            await game.game_loop(lines, catch_interrupts=False)
+        except (ConnectionError, EOFError):
+            pass
+        finally:
+            if game is not None:
+                if self.sessions.get(game.player_name) is game:
+                    del self.sessions[game.player_name]
+                await game.close()
+            self._tasks.discard(task)
+            writer.close()
+
+    async def _ask_name(self, lines: TelnetInputReader, output: ConnectionOutput) -> Optional[str]:
+        """The player's name, also used as their save slot; None if they left"""
+        for _ in range(3):
+            output("请输入您的名字: ", end="")
+            name = clean_name(await lines.readline())
+            if not name:
+                continue
+            if name in self.sessions:
+                output(f"'{name}' 已经在游戏中了，请换一个名字。")
+                continue
+            return name
+        return None
+
+    async def close(self):
+        """Stop accepting players, end every session and close the shared AI service"""
+        if self._server is not None:
+            self._server.close()
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+        await self.ai_service.close()
+
+
+async def main():
+    """Run the server until interrupted"""
+    server = GameServer(
+        getattr(config, "SERVER_HOST", "127.0.0.1"),
+        getattr(config, "SERVER_PORT", 4000),
+        getattr(config, "SERVER_MAX_SESSIONS", 500),
+        save_dir=getattr(config, "SAVE_DIR", None)
+    )
+    await server.start()
+    print(f"🌐 {config.GAME_TITLE} 服务器已启动: telnet {server.host} {server.port}")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n👋 服务器已关闭。")
@@ -0,0 +1,95 @@
+"""
+Single-flight request coalescing
+相同键的并发请求只发送一次，所有调用者共享同一个结果
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    """一个进行中的请求及其等待者数量"""
+
+    __slots__ = ("future", "waiters", "owned")
+
+    def __init__(self, future: "asyncio.Future[Any]", owned: bool):
+        self.future = future
+        self.waiters = 0
+        # owned: 由 SingleFlight 创建的任务，最后一个等待者离开时可以取消
+        self.owned = owned
+
+
+class SingleFlight:
+    """合并相同键的并发请求"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._active(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def _active(self, key: Hashable) -> Optional[_Call]:
+        """返回仍在进行中的请求（完成回调尚未执行的也视为已结束）"""
+        call = self._calls.get(key)
+        if call is None or call.future.done():
+            return None
+        return call
+
+    def _track(self, key: Hashable, future: "asyncio.Future[Any]", owned: bool) -> _Call:
+        """登记进行中的请求，完成后自动移除"""
+        call = _Call(future, owned)
+        self._calls[key] = call
+
+        def _done(done_future: "asyncio.Future[Any]"):
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            # 没有等待者时也取出异常，避免 "exception was never retrieved" 警告
+            if not done_future.cancelled():
+                done_future.exception()
+
+        future.add_done_callback(_done)
+        return call
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行 factory() 或加入已有的相同请求
+
+        某个调用者被取消不会影响其他调用者；只有最后一个等待者离开时才取消底层请求。
+        """
+        call = self._active(key)
+        if call is None:
+            call = self._track(key, asyncio.ensure_future(factory()), owned=True)
+        return await self._wait(call)
+
+    async def wait(self, key: Hashable) -> Any:
+        """等待已有的进行中请求；键不存在时抛出 KeyError"""
+        call = self._active(key)
+        if call is None:
+            raise KeyError(key)
+        return await self._wait(call)
+
+    def begin(self, key: Hashable) -> Optional["asyncio.Future[Any]"]:
+        """
+        由调用者自行完成的请求（例如流式请求）登记为进行中
+
+        Returns:
+            需要调用者设置结果的 Future；已有相同请求在进行时返回 None
+        """
+        if self._active(key) is not None:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self._track(key, future, owned=False)
+        return future
+
+    async def _wait(self, call: _Call) -> Any:
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.future)
+        except asyncio.CancelledError:
+            if call.owned and call.waiters == 1 and not call.future.done():
+                call.future.cancel()
+            raise
+        finally:
+            call.waiters -= 1
@@ -0,0 +1,187 @@
+"""
+Token counting and context budgeting
+按模型族估算token数，并在请求预算内裁剪提示词各部分
+"""
+import math
+import re
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    import tiktoken  # 可选：安装后对OpenAI模型使用精确计数
+except ImportError:
+    tiktoken = None
+
+
+# 模型族 -> (每个中日韩字符的token数, 每个token对应的其他字符数)
+# 国产模型的分词器对中文更友好，单个汉字通常不到一个token
+MODEL_FAMILY_RATIOS: Dict[str, Tuple[float, float]] = {
+    "gpt-4o": (0.8, 4.0),
+    "gpt": (1.2, 4.0),
+    "moonshot": (0.6, 4.0),
+    "deepseek": (0.6, 3.5),
+    "glm": (0.6, 4.0),
+    "qwen": (0.6, 4.0),
+}
+DEFAULT_RATIO = (1.0, 4.0)
+
+# 每条消息的格式开销（角色标记、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 用来测量分词器对中文回复的token密度的样本（与游戏回复的风格接近）
+_SAMPLE_REPLY = (
+    "你好，旅行者！欢迎来到我们的村庄。我在这里住了很多年，"
+    "见过许多冒险者来来去去。如果你想去森林，记得带上火把，小心夜里的狼。"
+)
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_SENTENCE_PATTERN = re.compile(r"(?<=[。！？.!?])\s*")
+
+
+class TokenCounter:
+    """某个模型族的token计数器"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.cjk_ratio, self.chars_per_token = self._family_ratio(model)
+        self._encoding = self._load_encoding(model)
+        # 每个回复字符的token数；有精确分词器时用它测量，与 count() 保持一致
+        if self._encoding is not None:
+            self.reply_ratio = len(self._encoding.encode(_SAMPLE_REPLY)) / len(_SAMPLE_REPLY)
+        else:
+            self.reply_ratio = max(self.cjk_ratio, 1 / self.chars_per_token)
+
+    @staticmethod
+    def _family_ratio(model: str) -> Tuple[float, float]:
+        name = model.lower()
+        # 先匹配更具体的前缀（例如 gpt-4o 优先于 gpt）
+        for prefix in sorted(MODEL_FAMILY_RATIOS, key=len, reverse=True):
+            if name.startswith(prefix):
+                return MODEL_FAMILY_RATIOS[prefix]
+        return DEFAULT_RATIO
+
+    @staticmethod
+    def _load_encoding(model: str):
+        if tiktoken is None or not model.lower().startswith("gpt"):
+            return None
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return None
+
+    def count(self, text: str) -> int:
+        """估算文本的token数"""
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+
+        cjk = len(_CJK_PATTERN.findall(text))
+        other = len(text) - cjk
+        return math.ceil(cjk * self.cjk_ratio + other / self.chars_per_token)
+
+    def tokens_for_chars(self, max_chars: int) -> int:
+        """中文回复中 max_chars 个字符大约需要的token数"""
+        return math.ceil(max_chars * self.reply_ratio)
+
+
+@lru_cache(maxsize=32)
+def get_token_counter(model: str) -> TokenCounter:
+    """获取（并缓存）模型对应的计数器"""
+    return TokenCounter(model)
+
+
+def split_sentences(text: str) -> List[str]:
+    """按句子切分文本，用于按句裁剪描述"""
+    return [sentence for sentence in _SENTENCE_PATTERN.split(text) if sentence]
+
+
+class PromptSection:
+    """
+    提示词中可裁剪的一部分
+
+    units 是裁剪的最小单位（一轮对话、一句描述等）。priority 越小越先被裁剪；
+    drop_oldest 为 True 时从开头丢弃（适合对话历史），否则从末尾丢弃。
+    """
+
+    __slots__ = ("name", "units", "priority", "header", "separator", "drop_oldest",
+                 "min_units", "_text", "_unit_count")
+
+    def __init__(self, name: str, units: Sequence[str], priority: int, header: str = "",
+                 separator: str = "\n", drop_oldest: bool = False, min_units: int = 0):
+        self.name = name
+        self.units = list(units)
+        self.priority = priority
+        self.header = header
+        self.separator = separator
+        self.drop_oldest = drop_oldest
+        self.min_units = min_units
+        self._text = None
+        self._unit_count = len(self.units)
+
+    @classmethod
+    def from_text(cls, name: str, text: str, priority: int, min_units: int = 1,
+                  header: str = "") -> "PromptSection":
+        """按句子切分的文本部分，从末尾的句子开始裁剪；未裁剪时保持原文"""
+        section = cls(name, split_sentences(text), priority, header=header, separator=" ",
+                      min_units=min_units)
+        section._text = text
+        return section
+
+    def render(self) -> str:
+        if not self.units:
+            return ""
+        if self._text is not None and len(self.units) == self._unit_count:
+            return self.header + self._text
+        return self.header + self.separator.join(self.units)
+
+
+class ContextBudgeter:
+    """在每次请求的token预算内分配提示词和回复长度"""
+
+    def __init__(self, counter: TokenCounter, budget: int, min_output_tokens: int = 32):
+        self.counter = counter
+        self.budget = budget
+        self.min_output_tokens = min_output_tokens
+
+    def fit(self, fixed_text: str, sections: List[PromptSection],
+            desired_output_tokens: int) -> Tuple[Dict[str, str], int]:
+        """
+        裁剪各部分使 提示词 + 回复 不超过预算
+
+        Args:
+            fixed_text: 不可裁剪的部分（角色设定、模板、玩家消息）
+            sections: 可裁剪的部分
+            desired_output_tokens: 期望的回复token上限
+
+        Returns:
+            (各部分裁剪后的文本, 本次请求的 max_tokens)
+        """
+        output_tokens = max(self.min_output_tokens, desired_output_tokens)
+        fixed_tokens = self.counter.count(fixed_text) + 2 * MESSAGE_OVERHEAD_TOKENS
+        prompt_limit = self.budget - output_tokens
+
+        unit_tokens = {
+            id(section): [self.counter.count(unit) for unit in section.units]
+            for section in sections
+        }
+        total = fixed_tokens + sum(
+            self.counter.count(section.header) + sum(unit_tokens[id(section)])
+            for section in sections if section.units
+        )
+
+        # 从优先级最低的部分开始裁剪
+        for section in sorted(sections, key=lambda s: s.priority):
+            tokens = unit_tokens[id(section)]
+            while total > prompt_limit and len(section.units) > section.min_units:
+                index = 0 if section.drop_oldest else -1
+                section.units.pop(index)
+                total -= tokens.pop(index)
+                if not section.units:
+                    total -= self.counter.count(section.header)
+            if total <= prompt_limit:
+                break
+
+        # 仍然超出时缩短回复，但不低于最小值
+        max_tokens = max(self.min_output_tokens, min(output_tokens, self.budget - total))
+        return {section.name: section.render() for section in sections}, max_tokens
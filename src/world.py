@@ -1,7 +1,25 @@
 """
 World and Location Management
 """
-from typing import Dict, List, Optional
+from collections.abc import Mapping, MutableMapping
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from content_pack import ContentPack, default_content
+from routing import RouteTable
+from world_graph import CompactGraph
+
+# Chinese names for the compass directions (other directions are shown as written)
+DIRECTION_NAMES = {
+    "north": "北方", "south": "南方",
+    "east": "东方", "west": "西方"
+}
+# What players may type for a direction -> direction
+DIRECTION_ALIASES = {
+    "n": "north", "s": "south", "e": "east", "w": "west",
+    "北": "north", "南": "south", "东": "east", "西": "west",
+    "上": "north", "下": "south", "左": "west", "右": "east"
+}
 
 
 class Location:
@@ -12,10 +30,56 @@ class Location:
         self.description = description
         self.exits: Dict[str, str] = {}  # direction -> location_id
         self.items: List[str] = []  # Simple items that can be found here
+        self.ambient: List[str] = []  # Atmosphere lines shown now and then while the player is here
+        # Called with (direction, old_target, new_target) when an exit changes, so routes stay current
+        self._on_exit_change: Optional[Callable[[str, Optional[str], Optional[str]], None]] = None
+        # Bumped whenever something `look` shows changes; cached text is dropped with it
+        self.version = 0
+        self._rendered: Dict[bool, str] = {}
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "Location":
+        """Build a location from a content pack record"""
+        location = cls(record["name"], record["description"])
+        location.exits.update(record.get("exits", {}))
+        location.items.extend(record.get("items", []))
+        location.ambient.extend(record.get("ambient", []))
+        return location
     
     def add_exit(self, direction: str, location_id: str):
         """Add an exit to another location"""
+        previous = self.exits.get(direction)
         self.exits[direction] = location_id
+        self.changed()
+        if self._on_exit_change is not None and previous != location_id:
+            self._on_exit_change(direction, previous, location_id)
+    
+    def remove_exit(self, direction: str) -> Optional[str]:
+        """Remove an exit, returning the location ID it led to"""
+        previous = self.exits.pop(direction, None)
+        if previous is not None:
+            self.changed()
+        if self._on_exit_change is not None and previous is not None:
+            self._on_exit_change(direction, previous, None)
+        return previous
+    
+    def add_item(self, item: str):
+        """Put an item here"""
+        self.items.append(item)
+        self.changed()
+    
+    def remove_item(self, item: str) -> bool:
+        """Take an item away, returning whether it was here"""
+        if item not in self.items:
+            return False
+        self.items.remove(item)
+        self.changed()
+        return True
+    
+    def changed(self):
+        """Drop cached text after the name, description, exits or items were changed"""
+        self.version += 1
+        self._rendered.clear()
     
     def get_exit(self, direction: str) -> Optional[str]:
         """Get the location ID for a direction"""
@@ -26,13 +90,7 @@ class Location:
         if not self.exits:
             return "没有明显的出口。"
         
-        # 转换方向为中文
-        direction_names = {
-            "north": "北方", "south": "南方", 
-            "east": "东方", "west": "西方"
-        }
-        
-        exits = [direction_names.get(direction, direction) for direction in self.exits.keys()]
+        exits = [DIRECTION_NAMES.get(direction, direction) for direction in self.exits.keys()]
         
         if len(exits) == 1:
             return f"有一个出口通向{exits[0]}。"
@@ -40,117 +98,142 @@ class Location:
             return f"有出口通向{exits[0]}和{exits[1]}。"
         else:
             return f"有出口通向{', '.join(exits[:-1])}和{exits[-1]}。"
+    
+    def render(self, include_exits: bool = True) -> str:
+        """Name, description and (optionally) exits, built once per change"""
+        text = self._rendered.get(include_exits)
+        if text is None:
+            text = f"{self.name}\n\n{self.description}"
+            if include_exits:
+                text += f"\n\n{self.get_exits_description()}"
+            self._rendered[include_exits] = text
+        return text
+
+
+class LocationTable(MutableMapping):
+    """
+    location_id -> Location, built from content records on first access
+    
+    Only the locations the game actually visits are turned into objects, so
+    large packs cost little until they are explored. Exit changes on built
+    locations are reported to `on_exit_change(location_id, direction, old, new)`,
+    and adding or removing a whole location to `on_replace()`.
+    """
+    
+    def __init__(self, records: Mapping[str, Dict[str, Any]],
+                 on_exit_change: Optional[Callable[[str, str, Optional[str], Optional[str]], None]] = None,
+                 on_replace: Optional[Callable[[], None]] = None):
+        self._records = records
+        self._built: Dict[str, Location] = {}
+        self._removed: Set[str] = set()
+        self._on_exit_change = on_exit_change
+        self._on_replace = on_replace
+    
+    def _adopt(self, location_id: str, location: Location):
+        if self._on_exit_change is not None:
+            location._on_exit_change = partial(self._on_exit_change, location_id)
+        self._built[location_id] = location
+    
+    def __getitem__(self, location_id: str) -> Location:
+        location = self._built.get(location_id)
+        if location is None:
+            if location_id in self._removed:
+                raise KeyError(location_id)
+            location = Location.from_record(self._records[location_id])
+            self._adopt(location_id, location)
+        return location
+    
+    def __setitem__(self, location_id: str, location: Location):
+        previous = self._built.get(location_id)
+        if previous is not None:
+            previous._on_exit_change = None
+        self._adopt(location_id, location)
+        self._removed.discard(location_id)
+        if self._on_replace is not None:
+            self._on_replace()
+    
+    def __delitem__(self, location_id: str):
+        if location_id not in self:
+            raise KeyError(location_id)
+        location = self._built.pop(location_id, None)
+        if location is not None:
+            location._on_exit_change = None
+        self._removed.add(location_id)
+        if self._on_replace is not None:
+            self._on_replace()
+    
+    def exits_of(self, location_id: str) -> Mapping[str, str]:
+        """Exits of a location without building it ({} for unknown locations)"""
+        location = self._built.get(location_id)
+        if location is not None:
+            return location.exits
+        if location_id in self._removed or location_id not in self._records:
+            return {}
+        if isinstance(self._records, CompactGraph):
+            return self._records.exits_of(location_id)  # skips decoding the text
+        return self._records[location_id].get("exits", {})
+    
+    def name_of(self, location_id: str) -> Optional[str]:
+        """Display name of a location without building it"""
+        location = self._built.get(location_id)
+        if location is not None:
+            return location.name
+        if location_id in self._removed or location_id not in self._records:
+            return None
+        if isinstance(self._records, CompactGraph):
+            return self._records.name_of(location_id)
+        return self._records[location_id]["name"]
+    
+    def __contains__(self, location_id: object) -> bool:
+        if location_id in self._built:
+            return True
+        return location_id in self._records and location_id not in self._removed
+    
+    def __iter__(self) -> Iterator[str]:
+        for location_id in self._records:
+            if location_id not in self._removed:
+                yield location_id
+        for location_id in self._built:
+            if location_id not in self._records:
+                yield location_id
+    
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
 
 
 class World:
     """Manages the game world and locations"""
     
-    def __init__(self):
-        self.locations: Dict[str, Location] = {}
-        self.current_location = "village_center"
-        self._create_world()
-    
-    def _create_world(self):
-        """Create the game world with locations and connections"""
-        
-        # Village Center - Starting location
-        village_center = Location(
-            "Village Center",
-            "You are in the heart of a peaceful village. A stone fountain sits in the center, "
-            "surrounded by cobblestone paths. Cozy houses with thatched roofs line the square, "
-            "and you can hear the gentle chatter of villagers going about their daily lives."
-        )
-        village_center.add_exit("north", "ancient_library")
-        village_center.add_exit("east", "market_square")
-        village_center.add_exit("south", "enchanted_forest")
-        village_center.add_exit("west", "crystal_cave")
-        self.locations["village_center"] = village_center
-        
-        # Ancient Library - Place of knowledge
-        library = Location(
-            "Ancient Library",
-            "You stand in a grand library with towering shelves that reach up to vaulted ceilings. "
-            "Thousands of books, scrolls, and manuscripts are carefully organized here. "
-            "Dust motes dance in shafts of sunlight streaming through tall windows. "
-            "The air smells of old parchment and leather bindings."
-        )
-        library.add_exit("south", "village_center")
-        library.add_exit("east", "wizard_tower")
-        self.locations["ancient_library"] = library
-        
-        # Market Square - Place of commerce
-        market = Location(
-            "Market Square",
-            "A bustling marketplace filled with colorful stalls and the sounds of commerce. "
-            "Merchants display their wares on wooden tables covered with bright cloth. "
-            "The aroma of fresh bread, exotic spices, and roasted nuts fills the air. "
-            "People from near and far come here to trade and socialize."
+    def __init__(self, content: Optional[ContentPack] = None):
+        self.content = content if content is not None else default_content()
+        self.routes = RouteTable(self)
+        self.locations = LocationTable(
+            self.content.locations, self.routes.exit_changed, self.routes.invalidate
         )
-        market.add_exit("west", "village_center")
-        market.add_exit("north", "wizard_tower")
-        market.add_exit("south", "riverside_dock")
-        self.locations["market_square"] = market
-        
-        # Enchanted Forest - Mystical nature area
-        forest = Location(
-            "Enchanted Forest",
-            "You enter a magical forest where ancient trees tower overhead, their branches "
-            "intertwining to form a natural cathedral. Soft, ethereal light filters through "
-            "the canopy, and you can hear the gentle whisper of leaves and distant bird songs. "
-            "There's a sense of old magic in the air here."
-        )
-        forest.add_exit("north", "village_center")
-        forest.add_exit("east", "riverside_dock")
-        forest.add_exit("west", "moonlit_grove")
-        self.locations["enchanted_forest"] = forest
-        
-        # Crystal Cave - Mysterious underground
-        cave = Location(
-            "Crystal Cave",
-            "You are inside a stunning crystal cave where the walls sparkle with embedded gems. "
-            "Soft, multicolored light emanates from the crystals, creating a dreamlike atmosphere. "
-            "The cave is surprisingly warm, and there's a gentle humming sound that seems to "
-            "come from the crystals themselves."
-        )
-        cave.add_exit("east", "village_center")
-        cave.add_exit("south", "moonlit_grove")
-        self.locations["crystal_cave"] = cave
-        
-        # Wizard Tower - Place of arcane study
-        tower = Location(
-            "Wizard Tower",
-            "You stand at the base of a tall, spiraling tower made of dark stone. "
-            "Strange symbols are carved into the walls, and an aura of magic surrounds the place. "
-            "Through windows high above, you can see the flicker of candlelight and "
-            "occasionally, colorful magical sparks."
-        )
-        tower.add_exit("west", "ancient_library")
-        tower.add_exit("south", "market_square")
-        self.locations["wizard_tower"] = tower
-        
-        # Riverside Dock - Peaceful water area
-        dock = Location(
-            "Riverside Dock",
-            "A peaceful wooden dock extends into a clear, flowing river. "
-            "Small boats are moored here, gently bobbing in the current. "
-            "You can hear the soothing sound of water lapping against the dock, "
-            "and fish occasionally jump, creating ripples in the water."
-        )
-        dock.add_exit("north", "market_square")
-        dock.add_exit("west", "enchanted_forest")
-        self.locations["riverside_dock"] = dock
+        self.current_location = self.content.start
+    
+    def get_exits(self, location_id: str) -> Mapping[str, str]:
+        """Exits of any location (direction -> location_id) without loading the whole location"""
+        return self.locations.exits_of(location_id)
+    
+    def find_location(self, query: str) -> Optional[str]:
+        """
+        Resolve what the player typed to a location ID
         
-        # Moonlit Grove - Mystical clearing
-        grove = Location(
-            "Moonlit Grove",
-            "A circular clearing in the forest where moonlight seems to shine even during the day. "
-            "Ancient standing stones are arranged in a circle, covered with glowing runes. "
-            "The grass here is unusually soft and green, and there's a sense of timeless peace. "
-            "This feels like a place where magic and nature are one."
-        )
-        grove.add_exit("north", "crystal_cave")
-        grove.add_exit("east", "enchanted_forest")
-        self.locations["moonlit_grove"] = grove
+        Accepts an ID or a name in any case, with spaces or underscores; an
+        unambiguous prefix also matches.
+        """
+        key = query.strip().lower().replace(" ", "_")
+        if key in self.locations:
+            return key
+        matches = []
+        for location_id in self.locations:
+            name = (self.locations.name_of(location_id) or "").lower().replace(" ", "_")
+            if key in (location_id, name):
+                return location_id
+            if location_id.startswith(key) or name.startswith(key):
+                matches.append(location_id)
+        return matches[0] if len(matches) == 1 else None
     
     def get_location(self, location_id: str) -> Optional[Location]:
         """Get a location by ID"""
@@ -175,19 +258,9 @@ class World:
             else:
                 return False, "那条路似乎被堵住了。"
         else:
-            direction_names = {
-                "north": "北方", "south": "南方", 
-                "east": "东方", "west": "西方"
-            }
-            dir_name = direction_names.get(direction, direction)
+            dir_name = DIRECTION_NAMES.get(direction, direction)
             return False, f"您无法从这里向{dir_name}走。"
     
     def get_location_description(self, include_exits: bool = True) -> str:
         """Get the full description of the current location"""
-        location = self.get_current_location()
-        description = f"{location.name}\n\n{location.description}"
-        
-        if include_exits:
-            description += f"\n\n{location.get_exits_description()}"
-        
-        return description
+        return self.get_current_location().render(include_exits)
@@ -0,0 +1,185 @@
+"""
+Compact World Graph
+
+An array-backed store of location records for very large or generated worlds.
+Location IDs are interned to integers, exits are kept in CSR form (one offsets
+array plus flat target/direction arrays) and names and descriptions live in a
+single UTF-8 blob that is only decoded when a location is actually read.
+
+A CompactGraph is a read-only mapping of location_id -> record, so it can be
+used anywhere content records are (World builds Location objects from it only
+for the locations that are visited).
+"""
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+class CompactGraphBuilder:
+    """Collects locations and exits, then packs them into a CompactGraph"""
+
+    def __init__(self):
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        # interned index -> order of definition (text is stored in that order), -1 until defined
+        self._order = array("i")
+        self._text = bytearray()
+        self._text_offsets = array("Q", [0])  # name end, description end, name end, ...
+        self._edge_sources = array("I")
+        self._edge_targets = array("I")
+        self._edge_directions = array("B")
+        self._direction_names: List[str] = []
+        self._direction_index: Dict[str, int] = {}
+        self._items: Dict[int, Tuple[str, ...]] = {}
+        self._ambient: Dict[int, Tuple[str, ...]] = {}
+
+    def _intern(self, location_id: str) -> int:
+        index = self._index.get(location_id)
+        if index is None:
+            index = self._index[location_id] = len(self._ids)
+            self._ids.append(location_id)
+            self._order.append(-1)
+        return index
+
+    def add_location(self, location_id: str, name: str, description: str,
+                     items: Sequence[str] = (), ambient: Sequence[str] = ()):
+        """Add a location (exits to it may already have been added)"""
+        index = self._intern(location_id)
+        if self._order[index] >= 0:
+            raise ValueError(f"duplicate location: {location_id}")
+        order = self._order[index] = len(self._text_offsets) // 2
+        self._text += name.encode("utf-8")
+        self._text_offsets.append(len(self._text))
+        self._text += description.encode("utf-8")
+        self._text_offsets.append(len(self._text))
+        if items:
+            self._items[order] = tuple(items)
+        if ambient:
+            self._ambient[order] = tuple(ambient)
+
+    def add_exit(self, location_id: str, direction: str, target_id: str):
+        """Add an exit; the target may be defined later"""
+        direction_index = self._direction_index.get(direction)
+        if direction_index is None:
+            if len(self._direction_names) >= 256:
+                raise ValueError("at most 256 distinct exit directions are supported")
+            direction_index = self._direction_index[direction] = len(self._direction_names)
+            self._direction_names.append(direction)
+        self._edge_sources.append(self._intern(location_id))
+        self._edge_targets.append(self._intern(target_id))
+        self._edge_directions.append(direction_index)
+
+    def build(self) -> "CompactGraph":
+        """Pack everything added so far (every exit target must be defined)"""
+        missing = [location_id for location_id, order in zip(self._ids, self._order) if order < 0]
+        if missing:
+            raise ValueError(f"exits lead to undefined locations: {', '.join(missing[:5])}")
+
+        # Renumber locations in definition order so index i owns text slot i
+        order = self._order
+        count = len(self._ids)
+        ids = [""] * count
+        for index, location_id in enumerate(self._ids):
+            ids[order[index]] = location_id
+        index = {location_id: position for position, location_id in enumerate(ids)}
+
+        # Counting sort of the edges by source keeps each location's exit order
+        offsets = array("I", [0]) * (count + 1)
+        for source in self._edge_sources:
+            offsets[order[source] + 1] += 1
+        for position in range(count):
+            offsets[position + 1] += offsets[position]
+        cursor = array("I", offsets[:-1])
+        targets = array("I", [0]) * len(self._edge_targets)
+        directions = array("B", [0]) * len(self._edge_directions)
+        for source, target, direction in zip(self._edge_sources, self._edge_targets,
+                                             self._edge_directions):
+            source = order[source]
+            slot = cursor[source]
+            targets[slot] = order[target]
+            directions[slot] = direction
+            cursor[source] = slot + 1
+
+        return CompactGraph(
+            ids, index, offsets, targets, directions, list(self._direction_names),
+            bytes(self._text), array("Q", self._text_offsets), dict(self._items), dict(self._ambient)
+        )
+
+
+class CompactGraph(Mapping):
+    """Read-only location records stored in flat arrays"""
+
+    def __init__(self, ids: List[str], index: Dict[str, int], offsets: array, targets: array,
+                 directions: array, direction_names: List[str], text: bytes, text_offsets: array,
+                 items: Dict[int, Tuple[str, ...]], ambient: Dict[int, Tuple[str, ...]]):
+        self._ids = ids
+        self._index = index
+        self._offsets = offsets
+        self._targets = targets
+        self._directions = directions
+        self._direction_names = direction_names
+        self._text = text
+        self._text_offsets = text_offsets
+        self._items = items
+        self._ambient = ambient
+
+    @classmethod
+    def from_records(cls, records: Mapping) -> "CompactGraph":
+        """Pack ordinary content records (e.g. ContentPack.locations)"""
+        builder = CompactGraphBuilder()
+        for location_id in records:
+            record = records[location_id]
+            builder.add_location(location_id, record["name"], record["description"],
+                                 record.get("items", ()), record.get("ambient", ()))
+        for location_id in records:
+            for direction, target in records[location_id].get("exits", {}).items():
+                builder.add_exit(location_id, direction, target)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids)
+
+    def __contains__(self, location_id: object) -> bool:
+        return location_id in self._index
+
+    def __getitem__(self, location_id: str) -> Dict[str, Any]:
+        index = self._index[location_id]
+        record = {
+            "name": self._decode(2 * index),
+            "description": self._decode(2 * index + 1),
+            "exits": self.exits_of(location_id),
+            "items": list(self._items.get(index, ())),
+        }
+        if index in self._ambient:
+            record["ambient"] = list(self._ambient[index])
+        return record
+
+    def _decode(self, slot: int) -> str:
+        return self._text[self._text_offsets[slot]:self._text_offsets[slot + 1]].decode("utf-8")
+
+    def index_of(self, location_id: str) -> Optional[int]:
+        """Integer ID of a location"""
+        return self._index.get(location_id)
+
+    def id_of(self, index: int) -> str:
+        return self._ids[index]
+
+    def neighbours(self, index: int) -> Iterable[Tuple[int, int]]:
+        """(direction index, target index) pairs for a location, in exit order"""
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return zip(self._directions[start:end], self._targets[start:end])
+
+    def exits_of(self, location_id: str) -> Dict[str, str]:
+        """direction -> location_id, without decoding any text"""
+        index = self._index.get(location_id)
+        if index is None:
+            return {}
+        names, ids = self._direction_names, self._ids
+        return {names[direction]: ids[target] for direction, target in self.neighbours(index)}
+
+    def name_of(self, location_id: str) -> Optional[str]:
+        index = self._index.get(location_id)
+        return self._decode(2 * index) if index is not None else None
@@ -0,0 +1,64 @@
+"""
+pytest 配置：让测试可以像游戏一样直接导入 src 下的模块
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+sys.path.insert(0, SRC_DIR)
+
+_example_config = None
+
+
+@pytest.fixture
+def game_config(monkeypatch):
+    """
+    测试用的游戏配置
+
+    有 config.py 时使用它，否则加载 config.example.py；关闭缓存、调试输出和退避等待，
+    测试结束后恢复原值。
+    """
+    global _example_config
+    added = False
+    try:
+        import config
+    except ImportError:
+        if _example_config is None:
+            spec = importlib.util.spec_from_file_location(
+                "config", os.path.join(SRC_DIR, "config.example.py")
+            )
+            _example_config = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(_example_config)
+        # 已导入的 ai_service 等模块持有同一个配置对象
+        config = sys.modules["config"] = _example_config
+        added = True
+
+    for name, value in {
+        "AI_PROVIDER": "openai",
+        "API_KEY": "test-key",
+        "MODEL": "gpt-3.5-turbo",
+        "MAX_RESPONSE_LENGTH": 200,
+        "DEBUG_MODE": False,
+        "STREAM_RESPONSES": True,
+        "PREFETCH_OPENERS": False,
+        "RESPONSE_CACHE_ENABLED": False,
+        "RESPONSE_CACHE_PATH": None,
+        "RETRY_MAX_ATTEMPTS": 3,
+        "RETRY_BASE_DELAY": 0.0,
+        "FALLBACK_PROVIDERS": [],
+        "RATE_LIMITS": {},
+        "CONTENT_PACKS": [],
+        "CONTENT_CACHE_DIR": None,
+        "SAVE_DIR": None,
+        "NPC_BEHAVIOUR": False,
+    }.items():
+        monkeypatch.setattr(config, name, value, raising=False)
+
+    yield config
+
+    if added:
+        # 不让示例配置泄漏给其他需要真实 config.py 的测试
+        sys.modules.pop("config", None)
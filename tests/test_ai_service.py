@@ -0,0 +1,448 @@
+"""
+AIService 测试：用假客户端代替真实的API（不需要网络和API密钥）
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+
+class StubAPIError(Exception):
+    """带状态码的API错误，与 openai.APIStatusError 一样提供 status_code"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+
+
+class StubStream:
+    """模拟 openai 的流式响应；items 中的异常会在读到该位置时抛出"""
+
+    def __init__(self, items, delay: float = 0.0):
+        self.items = list(items)
+        self.delay = delay
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.sent >= len(self.items):
+            raise StopAsyncIteration
+        item = self.items[self.sent]
+        self.sent += 1
+        if isinstance(item, BaseException):
+            raise item
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=item))])
+
+    async def close(self):
+        self.closed = True
+
+
+class StubClient:
+    """
+    按脚本依次返回结果的假客户端
+
+    脚本中的每一项：异常（直接抛出）、字符串（非流式回复）或片段列表（流式回复）。
+    脚本用完后重复最后一项。
+    """
+
+    def __init__(self, *script, delay: float = 0.0):
+        self.script = list(script)
+        self.delay = delay
+        self.calls = []
+        self.streams = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        action = self.script[min(len(self.calls), len(self.script)) - 1]
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if isinstance(action, BaseException):
+            raise action
+        if kwargs.get("stream"):
+            stream = StubStream([action] if isinstance(action, str) else action)
+            self.streams.append(stream)
+            return stream
+        text = action if isinstance(action, str) else "".join(action)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+    async def close(self):
+        pass
+
+
+def make_service(*clients):
+    """创建 AIService，并把各提供商的客户端换成假客户端"""
+    from ai_service import AIService
+
+    service = AIService(provider="openai", api_key="test-key", model="gpt-3.5-turbo")
+    for endpoint, client in zip(service.endpoints, clients):
+        endpoint.client = client
+    return service
+
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+def stream(service, message="你好"):
+    return service.stream_character_response("Village Elder", "友善的长老", message)
+
+
+def test_stream_truncates_and_closes_upstream(game_config):
+    """超过 MAX_RESPONSE_LENGTH 时截断，并关闭上游流"""
+    game_config.MAX_RESPONSE_LENGTH = 5
+    client = StubClient(["一二三", "四五六", "七八九"])
+    service = make_service(client)
+
+    chunks = asyncio.run(collect(stream(service)))
+
+    assert "".join(chunks) == "一二三四五..."
+    assert client.streams[0].closed
+    assert client.streams[0].sent == 2
+
+
+def test_stream_closes_upstream_when_caller_stops(game_config):
+    """调用者提前停止读取时关闭上游流"""
+    client = StubClient(["一", "二", "三"])
+    service = make_service(client)
+
+    async def run():
+        chunks = stream(service)
+        first = await chunks.__anext__()
+        await chunks.aclose()
+        return first
+
+    assert asyncio.run(run()) == "一"
+    assert client.streams[0].closed
+
+
+def test_stream_error_after_first_chunk_is_marked(game_config):
+    """输出中途出错时追加中断标记，而不是静默结束"""
+    from ai_service import STREAM_INTERRUPTED
+
+    client = StubClient(["你好，", StubAPIError(500)])
+    service = make_service(client)
+
+    chunks = asyncio.run(collect(stream(service)))
+
+    assert chunks == ["你好，", STREAM_INTERRUPTED]
+    assert len(client.calls) == 1
+
+
+def talk(game, message="你好"):
+    asyncio.run(game.talk_to_character("elder", message))
+
+
+@pytest.fixture
+def game(game_config):
+    from main import Game
+
+    game = Game()
+    game.world.current_location = game.character_manager.get_character("elder").location
+    return game
+
+
+def test_talk_streams_and_records_reply(game, capsys):
+    """流式对话逐段显示并记录完整回复"""
+    game.ai_service.endpoints[0].client = StubClient(["欢迎，", "旅行者！"])
+
+    talk(game)
+
+    assert "欢迎，旅行者！" in capsys.readouterr().out
+    history = game.character_manager.get_character("elder").conversation_history
+    assert history == [{"player": "你好", "character": "欢迎，旅行者！"}]
+
+
+def test_talk_does_not_record_interrupted_reply(game, capsys):
+    """中途中断的回复不写入对话历史"""
+    from ai_service import STREAM_INTERRUPTED
+
+    game.ai_service.endpoints[0].client = StubClient(["欢迎，", StubAPIError(502)])
+
+    talk(game)
+
+    assert STREAM_INTERRUPTED in capsys.readouterr().out
+    assert game.character_manager.get_character("elder").conversation_history == []
+
+
+def test_failover_reply_cached_under_answering_provider(game_config):
+    """备用提供商的回复缓存在它自己的键下，之后的相同请求直接命中"""
+    game_config.RESPONSE_CACHE_ENABLED = True
+    game_config.FALLBACK_PROVIDERS = [{"provider": "kimi", "api_key": "k", "model": "moonshot-v1-8k"}]
+    primary = StubClient(StubAPIError(503))
+    fallback = StubClient("备用回复")
+    service = make_service(primary, fallback)
+
+    async def run():
+        first = await service.get_character_response("Village Elder", "友善的长老", "你好")
+        second = await service.get_character_response("Village Elder", "友善的长老", "你好")
+        return first, second
+
+    assert asyncio.run(run()) == ("备用回复", "备用回复")
+    assert len(fallback.calls) == 1
+    primary_endpoint, fallback_endpoint = service.endpoints
+    system_prompt = fallback.calls[0]["messages"][0]["content"]
+    assert list(service.cache._memory) == [
+        service._cache_key(fallback_endpoint, system_prompt, "你好")
+    ]
+    assert service._cache_key(primary_endpoint, system_prompt, "你好") not in service.cache._memory
+
+
+def ask(service, message="你好"):
+    return asyncio.run(service.get_character_response("Village Elder", "友善的长老", message))
+
+
+def with_fallback(game_config):
+    game_config.FALLBACK_PROVIDERS = [{"provider": "kimi", "api_key": "k", "model": "moonshot-v1-8k"}]
+
+
+def test_transient_errors_are_retried(game_config):
+    """瞬时错误在同一提供商上重试，直到成功"""
+    client = StubClient(StubAPIError(503), StubAPIError(429), "你好，旅行者")
+    service = make_service(client)
+
+    assert ask(service) == "你好，旅行者"
+    assert len(client.calls) == 3
+    assert service.endpoints[0].breaker.failures == 0
+
+
+def test_failover_after_retries_exhausted(game_config):
+    """主提供商重试用完后按顺序转移到备用提供商"""
+    with_fallback(game_config)
+    primary = StubClient(StubAPIError(500))
+    fallback = StubClient("备用回复")
+    service = make_service(primary, fallback)
+
+    assert ask(service) == "备用回复"
+    assert len(primary.calls) == game_config.RETRY_MAX_ATTEMPTS
+    assert len(fallback.calls) == 1
+    assert service.endpoints[0].breaker.failures == game_config.RETRY_MAX_ATTEMPTS
+
+
+def test_non_transient_error_fails_over_without_tripping_breaker(game_config):
+    """401 之类的错误不重试、不计入熔断器，直接转移"""
+    with_fallback(game_config)
+    primary = StubClient(StubAPIError(401))
+    fallback = StubClient("备用回复")
+    service = make_service(primary, fallback)
+
+    assert ask(service) == "备用回复"
+    assert len(primary.calls) == 1
+    assert service.endpoints[0].breaker.failures == 0
+
+
+def test_all_breakers_open(game_config):
+    """所有熔断器都打开时不发送请求"""
+    with_fallback(game_config)
+    primary, fallback = StubClient("主回复"), StubClient("备用回复")
+    service = make_service(primary, fallback)
+    for endpoint in service.endpoints:
+        for _ in range(endpoint.breaker.failure_threshold):
+            endpoint.breaker.record_failure()
+
+    assert ask(service) == "AI服务暂时不可用，请稍后再试。"
+    assert primary.calls == [] and fallback.calls == []
+
+
+def test_stream_retries_only_before_first_chunk(game_config):
+    """流式请求在第一个片段之前可以重试，之后出错不再重试"""
+    client = StubClient(StubAPIError(503), ["你", "好"])
+    service = make_service(client)
+    assert "".join(asyncio.run(collect(stream(service)))) == "你好"
+    assert len(client.calls) == 2
+
+    client = StubClient(["你", StubAPIError(503)], ["不应重发"])
+    service = make_service(client)
+    chunks = asyncio.run(collect(stream(service)))
+    assert chunks[0] == "你" and "不应重发" not in "".join(chunks)
+    assert len(client.calls) == 1
+
+
+def test_cancelled_half_open_trial_is_released(game_config):
+    """半开状态下被取消的试探请求不会让提供商永远不可用"""
+    client = StubClient("你好", delay=10)
+    service = make_service(client)
+    breaker = service.endpoints[0].breaker
+    breaker.reset_timeout = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    async def run():
+        task = asyncio.ensure_future(service._request_completion("system", "你好"))
+        await asyncio.sleep(0.01)
+        assert breaker.state == breaker.HALF_OPEN
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    breaker.reset_timeout = 30
+    assert breaker.allow_request()
+
+
+def test_closed_half_open_stream_is_released(game_config):
+    """半开状态下开始输出前被关闭的流式试探同样交还名额"""
+    client = StubClient(["你好"], delay=10)
+    service = make_service(client)
+    breaker = service.endpoints[0].breaker
+    breaker.reset_timeout = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    async def run():
+        task = asyncio.ensure_future(collect(service._request_stream("system", "你好")))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    breaker.reset_timeout = 30
+    assert breaker.allow_request()
+
+
+def test_concurrent_streams_share_one_request(game_config):
+    """相同的并发流式请求只发送一次"""
+    client = StubClient(["你", "好"], delay=0.05)
+    service = make_service(client)
+
+    async def run():
+        return await asyncio.gather(collect(stream(service)), collect(stream(service)))
+
+    first, second = asyncio.run(run())
+    assert "".join(first) == "".join(second) == "你好"
+    assert len(client.calls) == 1
+
+
+def test_non_stream_joins_in_flight_stream(game_config):
+    """非流式请求加入相同的进行中流式请求"""
+    client = StubClient(["你", "好"], delay=0.05)
+    service = make_service(client)
+
+    async def run():
+        streamed = asyncio.ensure_future(collect(stream(service)))
+        await asyncio.sleep(0)
+        reply = await service.get_character_response("Village Elder", "友善的长老", "你好")
+        return "".join(await streamed), reply
+
+    assert asyncio.run(run()) == ("你好", "你好")
+    assert len(client.calls) == 1
+
+
+def test_joiner_reissues_when_stream_owner_quits(game_config):
+    """发起流式请求的调用者提前退出时，等待者自己重新请求而不是报错"""
+    client = StubClient(["你", "好"], delay=0.05)
+    service = make_service(client)
+
+    async def run():
+        owner = stream(service)
+        owner_first = asyncio.ensure_future(owner.__anext__())
+        await asyncio.sleep(0)
+        streamed = asyncio.ensure_future(collect(stream(service)))
+        plain = asyncio.ensure_future(
+            service.get_character_response("Village Elder", "友善的长老", "你好")
+        )
+        await asyncio.sleep(0)
+        first = await owner_first
+        await owner.aclose()
+        return first, "".join(await streamed), await plain
+
+    assert asyncio.run(run()) == ("你", "你好", "你好")
+    # 发起者的请求 + 等待者重新发起的一个请求
+    assert len(client.calls) == 2
+
+
+def test_cancelled_caller_does_not_cancel_shared_request(game_config):
+    """一个等待者被取消不影响其他等待者，底层请求只发送一次"""
+    client = StubClient("你好", delay=0.05)
+    service = make_service(client)
+
+    async def run():
+        first = asyncio.ensure_future(
+            service.get_character_response("Village Elder", "友善的长老", "你好"))
+        second = asyncio.ensure_future(
+            service.get_character_response("Village Elder", "友善的长老", "你好"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "你好"
+    assert len(client.calls) == 1
+
+
+def test_prefetched_opener_answers_talk_instantly(game, game_config, capsys):
+    """进入地点时预取的开场回复直接用于对应的对话"""
+    game_config.PREFETCH_OPENERS = True
+    client = StubClient("欢迎来到市场！")
+    game.ai_service.endpoints[0].client = client
+    game.world.current_location = "village_center"
+
+    async def run():
+        game.move_player("east")
+        assert set(game._prefetches) == {"merchant"}
+        await asyncio.gather(*(task for _, _, task in game._prefetches.values()))
+        await game.talk_to_character("merchant", "你好")
+
+    asyncio.run(run())
+    assert "欢迎来到市场！" in capsys.readouterr().out
+    assert len(client.calls) == 1
+    assert client.calls[0].get("stream") is None
+    merchant = game.character_manager.get_character("merchant")
+    assert merchant.conversation_history == [{"player": "你好", "character": "欢迎来到市场！"}]
+
+
+def test_unused_prefetches_are_cancelled_on_leave(game, game_config):
+    """离开地点时取消还没用上的预取"""
+    game_config.PREFETCH_OPENERS = True
+    game.ai_service.endpoints[0].client = StubClient("欢迎来到市场！", delay=10)
+    game.world.current_location = "village_center"
+
+    async def run():
+        game.move_player("east")
+        tasks = [task for _, _, task in game._prefetches.values()]
+        await asyncio.sleep(0)
+        game.move_player("west")
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return tasks
+
+    tasks = asyncio.run(run())
+    assert tasks and all(task.cancelled() for task in tasks)
+    assert "merchant" not in game._prefetches
+
+
+def test_memory_summary_is_included_in_prompt(game_config):
+    """角色的记忆摘要作为单独一节进入系统提示词"""
+    client = StubClient("你好，小明！")
+    service = make_service(client)
+
+    asyncio.run(service.get_character_response(
+        "Village Elder", "友善的长老", "你好", memory="玩家叫小明。"
+    ))
+
+    system_prompt = client.calls[0]["messages"][0]["content"]
+    assert "Memory of earlier conversations:\n玩家叫小明。" in system_prompt
+
+
+def test_say_reaches_everyone_in_arrival_order(game, capsys):
+    """say 同时询问在场的所有角色，回复按到达顺序显示"""
+    delays = {"Village Elder": 0.05, "Curious Scholar": 0.0}
+    started = []
+
+    async def reply(name, personality, message, context="", history=None, **kwargs):
+        started.append(name)
+        await asyncio.sleep(delays[name])
+        return f"{name}听到了：{message}"
+
+    game.character_manager.get_character("scholar").location = "village_center"
+    game.ai_service.get_character_response = reply
+
+    asyncio.run(game.handle_command("say 大家好"))
+    out = capsys.readouterr().out
+    assert set(started) == {"Village Elder", "Curious Scholar"}
+    assert out.index("Curious Scholar听到了") < out.index("Village Elder听到了")
+    for char_id in ("elder", "scholar"):
+        history = game.character_manager.get_character(char_id).conversation_history
+        assert [turn["player"] for turn in history] == ["大家好"]
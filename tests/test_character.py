@@ -0,0 +1,82 @@
+"""
+角色对话历史测试
+"""
+from character import Character, CharacterManager
+
+
+def test_history_is_bounded_by_window():
+    """超过窗口的旧对话被丢弃"""
+    character = Character("Village Elder", "友善", "village_center", history_window=3)
+    for index in range(5):
+        character.add_conversation(f"问题{index}", f"回答{index}")
+
+    assert [turn["player"] for turn in character.conversation_history] == ["问题2", "问题3", "问题4"]
+
+
+def test_context_turns_are_rendered_and_cached():
+    """最近几轮对话只渲染一次，新对话加入后更新"""
+    character = Character("Village Elder", "友善", "village_center")
+    assert character.get_context_turns() == ()
+
+    character.add_conversation("你好", "欢迎")
+    character.add_conversation("再见", "保重")
+    turns = character.get_context_turns(limit=1)
+    assert turns == ("Player: 再见\nVillage Elder: 保重",)
+    assert character.get_context_turns(limit=1) is turns
+
+    character.add_conversation("谢谢", "不客气")
+    assert character.get_context_turns(limit=2) == (
+        "Player: 再见\nVillage Elder: 保重",
+        "Player: 谢谢\nVillage Elder: 不客气",
+    )
+
+
+def test_manager_applies_history_window():
+    """CharacterManager 创建的角色使用配置的窗口大小"""
+    manager = CharacterManager(history_window=2)
+    assert manager.get_character("elder").turns.maxlen == 2
+
+
+def test_location_index_follows_moves():
+    """角色移动后位置索引随之更新"""
+    manager = CharacterManager()
+    elder = manager.get_character("elder")
+    assert list(manager.get_characters_in_location("village_center")) == ["elder"]
+
+    elder.location = "market_square"
+    assert manager.get_characters_in_location("village_center") == {}
+    assert set(manager.get_characters_in_location("market_square")) == {"merchant", "elder"}
+    assert manager.count_in_location("market_square") == 2
+    assert "village_center" not in manager.occupied_locations()
+
+    manager.remove_character("elder")
+    assert manager.count_in_location("market_square") == 1
+    elder.location = "village_center"
+    assert manager.count_in_location("village_center") == 0
+
+
+def test_characters_within_exits():
+    """按出口距离查找附近的角色，近的在前"""
+    from world import World
+
+    manager = CharacterManager()
+    nearby = manager.get_characters_within(World(), "village_center", 1)
+    distances = {char_id: distance for char_id, _, distance in nearby}
+    assert distances["elder"] == 0
+    assert distances["merchant"] == 1 and distances["scholar"] == 1
+    assert [distance for _, _, distance in nearby] == sorted(distances.values())
+    assert [char_id for char_id, _, _ in manager.get_characters_within(World(), "village_center", 0)] == ["elder"]
+
+
+def test_evicted_turns_go_to_long_term_memory():
+    """移出窗口的对话进入长期记忆并可按相关度检索"""
+    from semantic_memory import SemanticMemory
+
+    manager = CharacterManager(history_window=1, memory_factory=SemanticMemory)
+    elder = manager.get_character("elder")
+    elder.add_conversation("我叫小明", "你好，小明")
+    elder.add_conversation("天气怎么样", "晴朗")
+
+    assert len(elder.long_term_memory) == 1
+    assert elder.recall("你记得我叫什么吗") == ["Player: 我叫小明\nVillage Elder: 你好，小明"]
+    assert Character("A", "", "x").recall("anything") == []
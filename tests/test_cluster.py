@@ -0,0 +1,92 @@
+"""
+多进程服务器测试：玩家按名字分到不同的工作进程，世界内容通过编译缓存共享
+"""
+import asyncio
+import os
+
+from cluster import shard_for
+
+
+class PidAIService:
+    """在回复里带上进程号的假 AI 服务（工作进程用 ai_factory 创建它）"""
+
+    async def stream_character_response(self, name, personality, message, context="", history=None,
+                                        **kwargs):
+        yield f"{name}@{os.getpid()}：{message}"
+
+    async def close(self):
+        pass
+
+
+async def read_until(reader, marker):
+    data = await asyncio.wait_for(reader.readuntil(marker.encode("utf-8")), 30)
+    return data.decode("utf-8")
+
+
+def test_shard_for_is_stable_and_spreads_players():
+    """同一个名字总是分到同一个工作进程，不同名字分散到各个进程"""
+    names = [f"player{number}" for number in range(100)]
+    assert [shard_for(name, 4) for name in names] == [shard_for(name, 4) for name in names]
+    assert set(shard_for(name, 4) for name in names) == {0, 1, 2, 3}
+    assert shard_for("alice", 1) == 0
+
+
+def test_sessions_run_in_worker_processes(game_config, tmp_path, monkeypatch):
+    """两个玩家在不同的工作进程里游戏，共用同一个编译后的内容包"""
+    from cluster import Supervisor
+
+    cache_dir = tmp_path / "content"
+    monkeypatch.setattr(game_config, "CONTENT_CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(game_config, "RATE_LIMITS", {"openai": {"rpm": 60}})
+    names = ["alice"]
+    names.append(next(
+        name for name in (f"bob{number}" for number in range(100))
+        if shard_for(name, 2) != shard_for("alice", 2)
+    ))
+
+    async def connect(supervisor, name, then=b""):
+        reader, writer = await asyncio.open_connection("127.0.0.1", supervisor.port)
+        await read_until(reader, "名字: ")
+        # 名字后面紧跟着的命令留给工作进程读取
+        writer.write(f"{name}\r\n".encode("utf-8") + then)
+        await read_until(reader, "🎮 > ")
+        return reader, writer
+
+    async def run():
+        supervisor = Supervisor(port=0, workers=2, ai_factory=PidAIService)
+        assert supervisor.settings["RATE_LIMITS"] == {"openai": {"rpm": 30}}
+        await supervisor.start()
+        try:
+            alice = await connect(supervisor, names[0], then=b"where\r\n")
+            bob = await connect(supervisor, names[1])
+            assert supervisor.sessions == {name: shard_for(name, 2) for name in names}
+            assert "Village Center" in await read_until(alice[0], "🎮 > ")
+
+            pids = set()
+            for reader, writer in (alice, bob):
+                writer.write("talk elder 你好\r\n".encode("utf-8"))
+                reply = await read_until(reader, "🎮 > ")
+                pids.add(int(reply.split("Village Elder@")[1].split("：")[0]))
+            assert len(pids) == 2 and os.getpid() not in pids
+
+            # 名字在整个服务器内唯一
+            reader, writer = await asyncio.open_connection("127.0.0.1", supervisor.port)
+            await read_until(reader, "名字: ")
+            writer.write(f"{names[1]}\r\n".encode("utf-8"))
+            assert "已经在游戏中" in await read_until(reader, "名字: ")
+            writer.close()
+
+            alice[1].write(b"quit\r\n")
+            assert "再见" in await read_until(alice[0], "\n")
+            for _ in range(100):
+                if names[0] not in supervisor.sessions:
+                    break
+                await asyncio.sleep(0.05)
+            assert set(supervisor.sessions) == {names[1]}
+        finally:
+            await supervisor.close()
+        assert not any(worker.process.is_alive() for worker in supervisor.workers)
+        # 内容包只编译一次，所有工作进程映射同一个文件
+        assert len(os.listdir(cache_dir)) == 1
+
+    asyncio.run(run())
@@ -0,0 +1,78 @@
+"""
+命令注册表与分发测试
+"""
+import asyncio
+
+from commands import CommandRegistry
+
+
+def test_aliases_and_prefixes():
+    """别名精确匹配优先，无歧义的前缀也能识别"""
+    registry = CommandRegistry()
+    registry.register("inventory", print, ["inv", "背包"])
+    registry.register("look", print, ["l", "看", "查看"])
+    registry.register("locate", print)
+
+    assert registry.resolve("背包")[0].name == "inventory"
+    assert registry.resolve("INVE")[0].name == "inventory"
+    assert registry.resolve("l")[0].name == "look"
+    assert registry.resolve("loc")[0].name == "locate"
+    assert registry.resolve("lo") == (None, ["look", "locate"])
+    assert registry.resolve("查")[0].name == "look"
+    assert registry.resolve("xyz") == (None, [])
+
+
+def test_replacing_and_removing_commands():
+    """覆盖命令或抢走别名后，前缀树中不留旧条目"""
+    registry = CommandRegistry()
+    registry.register("take", print, ["get"])
+    registry.register("talk", print)
+    assert registry.resolve("ta") == (None, ["take", "talk"])
+
+    registry.register("grab", print, ["get", "take"])
+    assert registry.resolve("get")[0].name == "grab"
+    assert registry.resolve("tak")[0].name == "grab"
+    assert registry.resolve("ta") == (None, ["talk", "grab"])
+    registry.unregister("grab")
+    assert registry.resolve("ta")[0].name == "talk"
+    assert registry.resolve("g") == (None, [])
+
+    registry.register("north", print, ["n"], abbreviate=False)
+    assert registry.resolve("n")[0].name == "north"
+    assert registry.resolve("nor") == (None, [])
+
+
+def test_game_dispatch_and_plugins(game_config, monkeypatch, tmp_path, capsys):
+    """游戏命令经注册表分发，插件可以添加新命令"""
+    from commands import load_plugins
+    from main import Game, build_commands, default_commands
+
+    (tmp_path / "dance_plugin.py").write_text(
+        "def register_commands(registry):\n"
+        "    registry.register('dance', lambda game, args: game.output('💃', *args), ['跳舞'],\n"
+        "                      'dance / 跳舞', '跳一支舞')\n",
+        encoding="utf-8"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    game = Game()
+    assert game.commands is default_commands() is Game().commands
+    # 默认注册表是共享的，这里用单独的一份加载插件
+    game.commands = build_commands()
+    load_plugins(game.commands, ["dance_plugin"])
+
+    asyncio.run(game.handle_command("东"))
+    assert game.world.current_location == "market_square"
+    asyncio.run(game.handle_command("go w"))
+    assert game.world.current_location == "village_center"
+    capsys.readouterr()
+
+    asyncio.run(game.handle_command("t"))
+    assert "'t' 可以是: talk, take, travel" in capsys.readouterr().out
+    asyncio.run(game.handle_command("tak"))
+    assert "拿什么？使用: take <物品>" in capsys.readouterr().out
+    asyncio.run(game.handle_command("跳舞 慢慢地"))
+    assert "💃 慢慢地" in capsys.readouterr().out
+    asyncio.run(game.handle_command("help"))
+    assert "跳一支舞" in capsys.readouterr().out
+    asyncio.run(game.handle_command("退出"))
+    assert not game.running
@@ -0,0 +1,170 @@
+"""
+内容包加载、校验与编译缓存测试
+"""
+import json
+import os
+
+import pytest
+
+from character import CharacterManager
+from content_pack import DEFAULT_PACK, ContentPackError, LazyRecords, load_content
+from world import World
+
+EXTRA_PACK = {
+    "locations": {
+        "lighthouse": {
+            "name": "Lighthouse",
+            "description": "A white tower on the cliffs.",
+            "exits": {"west": "riverside_dock"},
+            "items": ["lantern"],
+        },
+        "riverside_dock": {
+            "name": "Riverside Dock",
+            "description": "A quiet dock.",
+            "exits": {"north": "market_square", "east": "lighthouse"},
+        },
+    },
+    "characters": {
+        "keeper": {
+            "name": "Lighthouse Keeper",
+            "location": "lighthouse",
+            "personality": "Gruff but kind.",
+        }
+    },
+}
+
+# 不依赖内置内容包的完整内容包
+STANDALONE_PACK = {
+    "start": "lighthouse",
+    "locations": {
+        **EXTRA_PACK["locations"],
+        "market_square": {"name": "Market", "description": "Busy."},
+    },
+    "characters": EXTRA_PACK["characters"],
+}
+
+
+def write_pack(directory, name, data):
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    return path
+
+
+def test_default_pack_builds_world_and_characters():
+    """内置内容包提供原来的地点、出口和角色"""
+    world = World()
+    assert world.current_location == "village_center"
+    assert world.get_current_location().exits == {
+        "north": "ancient_library", "east": "market_square",
+        "south": "enchanted_forest", "west": "crystal_cave",
+    }
+    assert len(world.locations) == 8
+    assert world.move_to("north") == (True, "您向north方向走去。")
+
+    manager = CharacterManager()
+    assert set(manager.list_all_characters()) == {"elder", "merchant", "guardian", "scholar"}
+    assert manager.get_character("scholar").location == "ancient_library"
+
+
+def test_later_packs_extend_and_override(tmp_path):
+    """后加载的内容包新增条目，并覆盖同名条目"""
+    extra = write_pack(tmp_path, "extra.json", EXTRA_PACK)
+    content = load_content([DEFAULT_PACK, extra])
+
+    world = World(content)
+    assert world.get_location("riverside_dock").description == "A quiet dock."
+    assert world.get_location("lighthouse").items == ["lantern"]
+    assert world.get_location("village_center") is not None
+    manager = CharacterManager(content=content)
+    assert manager.get_character("keeper").description == ""
+
+
+def test_compiled_cache_is_lazy_and_keyed_by_content(tmp_path):
+    """编译缓存按需读取地点，内容变化后重新编译"""
+    pack = write_pack(tmp_path, "pack.json", STANDALONE_PACK)
+    cache_dir = str(tmp_path / "cache")
+    first = load_content([pack], cache_dir)
+    assert isinstance(first.locations, LazyRecords)
+    assert isinstance(first.characters, LazyRecords) and isinstance(first.items, LazyRecords)
+    [cache_file] = os.listdir(cache_dir)
+
+    second = load_content([pack], cache_dir)
+    assert second.digest == first.digest
+    assert second.locations["lighthouse"]["items"] == ["lantern"]
+    assert World(second).get_current_location().name == "Lighthouse"
+    assert os.listdir(cache_dir) == [cache_file]
+
+    with open(pack, "a", encoding="utf-8") as f:
+        f.write("\n")
+    third = load_content([pack], cache_dir)
+    assert third.digest != first.digest
+    assert os.listdir(cache_dir) != [cache_file]
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_damaged_cache_is_rebuilt(tmp_path):
+    """损坏的缓存文件被当作未命中"""
+    pack = write_pack(tmp_path, "pack.json", STANDALONE_PACK)
+    cache_dir = str(tmp_path / "cache")
+    load_content([pack], cache_dir)
+    [cache_file] = os.listdir(cache_dir)
+    with open(os.path.join(cache_dir, cache_file), "r+b") as f:
+        f.truncate(10)
+
+    content = load_content([pack], cache_dir)
+    assert content.locations["lighthouse"]["name"] == "Lighthouse"
+
+
+def test_toml_pack(tmp_path):
+    """TOML内容包与JSON使用相同的结构"""
+    pytest.importorskip("tomllib")
+    path = tmp_path / "pack.toml"
+    path.write_text(
+        'start = "hut"\n'
+        '[locations.hut]\nname = "Hut"\ndescription = "Small."\nexits = { east = "yard" }\n'
+        '[locations.yard]\nname = "Yard"\ndescription = "Muddy."\n'
+        '[characters.hen]\nname = "Hen"\nlocation = "yard"\npersonality = "Clucks."\n',
+        encoding="utf-8"
+    )
+    content = load_content([str(path)])
+    assert World(content).move_to("east") == (True, "您向east方向走去。")
+    assert CharacterManager(content=content).count_in_location("yard") == 1
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"locations": {"a": {"name": "A"}}}, "缺少字段 'description'"),
+    ({"locations": {"a": {"name": "A", "description": 1}}}, "a.description: 类型应为 str"),
+    ({"locations": {"a": {"name": "A", "description": "x", "colour": "red"}}}, "未知字段 colour"),
+    ({"locations": {"a": {"name": "A", "description": "x", "exits": {"up": "b"}}}},
+     "地点 'b' 不存在"),
+    ({"start": "b", "locations": {"a": {"name": "A", "description": "x"}}}, "起始地点 'b' 不存在"),
+    ({"locations": {"a": {"name": "A", "description": "x"}},
+      "characters": {"c": {"name": "C", "location": "z", "personality": "p"}}}, "地点 'z' 不存在"),
+    ({"characters": {}}, "没有任何地点"),
+    ({"locations": {"a": {"name": "A", "description": "x"}},
+      "characters": {"c": {"name": "C", "location": "a", "personality": "p",
+                           "patrol": {"route": ["a", "z"], "interval": 5}}}}, "patrol.route: 地点 'z'"),
+    ({"locations": {"a": {"name": "A", "description": "x"}},
+      "characters": {"c": {"name": "C", "location": "a", "personality": "p",
+                           "schedule": {"25": "a"}}}}, "schedule.25"),
+    ({"locations": {"a": {"name": "A", "description": "x"}},
+      "items": {"rope": {"name": "Rope", "tags": [1]}}}, "items.rope.tags"),
+    ({"locations": {"a": {"name": "A", "description": "x", "items": ["rope"]},
+                    "b": {"name": "B", "description": "y", "items": ["rope"]}}}, "物品 'rope' 已放在 a"),
+])
+def test_schema_errors(tmp_path, data, message):
+    """不符合结构的内容包给出指明位置的错误"""
+    pack = write_pack(tmp_path, "bad.json", data)
+    with pytest.raises(ContentPackError, match=message):
+        load_content([pack])
+
+
+def test_unreadable_pack(tmp_path):
+    """文件不存在或不是合法JSON时报错"""
+    with pytest.raises(ContentPackError):
+        load_content([str(tmp_path / "missing.json")])
+    broken = tmp_path / "broken.json"
+    broken.write_text("{", encoding="utf-8")
+    with pytest.raises(ContentPackError, match="broken.json"):
+        load_content([str(broken)])
@@ -0,0 +1,81 @@
+"""
+对话记忆整理测试
+"""
+import asyncio
+
+from character import Character
+from conversation_memory import ConversationCompactor
+
+
+class FakeSummarizer:
+    """记录请求并返回固定摘要的假 AIService"""
+
+    def __init__(self, summary="玩家叫小明，答应帮忙找回丢失的书。", delay=0.0):
+        self.summary = summary
+        self.delay = delay
+        self.requests = []
+
+    async def summarize_conversation(self, name, previous_summary, turns, max_length):
+        self.requests.append((name, previous_summary, list(turns), max_length))
+        await asyncio.sleep(self.delay)
+        return self.summary
+
+
+def make_character(window=2):
+    return Character("Village Elder", "友善", "village_center", history_window=window)
+
+
+def test_evicted_turns_are_summarized_in_background():
+    """移出窗口的对话被整理进记忆，窗口内的对话保持不变"""
+    summarizer = FakeSummarizer()
+    compactor = ConversationCompactor(summarizer, batch_turns=2)
+    character = make_character()
+
+    async def run():
+        for index in range(4):
+            character.add_conversation(f"问题{index}", f"回答{index}")
+            compactor.schedule(character)
+        await compactor.drain()
+
+    asyncio.run(run())
+    assert character.memory_summary == "玩家叫小明，答应帮忙找回丢失的书。"
+    assert character.unsummarized_turns == []
+    assert len(character.turns) == 2
+    name, previous, turns, _ = summarizer.requests[0]
+    assert name == "Village Elder" and previous == ""
+    assert turns == ["Player: 问题0\nVillage Elder: 回答0", "Player: 问题1\nVillage Elder: 回答1"]
+
+
+def test_turns_evicted_during_summary_are_kept():
+    """整理进行中移出窗口的对话留到下一次"""
+    summarizer = FakeSummarizer(delay=0.01)
+    compactor = ConversationCompactor(summarizer, batch_turns=1)
+    character = make_character(window=1)
+
+    async def run():
+        character.add_conversation("a", "1")
+        character.add_conversation("b", "2")
+        task = compactor.schedule(character)
+        character.add_conversation("c", "3")
+        assert compactor.schedule(character) is task
+        await task
+
+    asyncio.run(run())
+    assert [turn.player for turn in character.unsummarized_turns] == ["b"]
+    assert len(summarizer.requests) == 1
+
+
+def test_failed_summary_keeps_pending_turns():
+    """整理失败时保留待整理的对话"""
+    summarizer = FakeSummarizer(summary=None)
+    compactor = ConversationCompactor(summarizer, batch_turns=1)
+    character = make_character(window=1)
+
+    async def run():
+        character.add_conversation("a", "1")
+        character.add_conversation("b", "2")
+        await compactor.schedule(character)
+
+    asyncio.run(run())
+    assert character.memory_summary == ""
+    assert len(character.unsummarized_turns) == 1
@@ -0,0 +1,105 @@
+"""
+本地假LLM服务测试（不需要网络和API密钥）
+"""
+import asyncio
+import json
+
+from fake_llm_server import FakeLLMServer, LatencyModel
+
+
+async def post_chat(port: int, payload: dict):
+    """发送一个聊天补全请求，返回 (状态码, 响应体)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        b"POST /v1/chat/completions HTTP/1.1\r\nHost: localhost\r\n"
+        b"Content-Type: application/json\r\n"
+        + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    data = await reader.read()
+    writer.close()
+    return int(status_line.split()[1]), data
+
+
+def request(server: FakeLLMServer, payload: dict):
+    async def run():
+        await server.start("127.0.0.1", 0)
+        try:
+            return await post_chat(server.port, payload)
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+def test_latency_model_specs():
+    """延迟分布按规格采样"""
+    assert LatencyModel("fixed:0.2").sample() == 0.2
+    assert 0.1 <= LatencyModel("uniform:0.1,0.3").sample() <= 0.3
+    assert LatencyModel("normal:0.5,0.1").sample() >= 0
+
+
+def test_templated_completion():
+    """非流式请求返回填充后的模板"""
+    server = FakeLLMServer(replies=["{character}: 收到「{user_message}」"])
+    status, body = request(server, {
+        "model": "fake-model",
+        "messages": [{"role": "system", "content": "你是 Village Elder，一个角色。"},
+                     {"role": "user", "content": "你好"}]
+    })
+    assert status == 200
+    reply = json.loads(body)["choices"][0]["message"]["content"]
+    assert reply == "Village Elder: 收到「你好」"
+
+
+def test_streaming_completion():
+    """流式请求以SSE分块返回，并以 [DONE] 结束"""
+    server = FakeLLMServer(replies=["一二三四五六七八九十"], seed=1)
+    status, body = request(server, {
+        "model": "fake-model", "stream": True, "max_tokens": 5,
+        "messages": [{"role": "user", "content": "hi"}]
+    })
+    assert status == 200
+    text = body.decode("utf-8")
+    assert "data: [DONE]" in text
+    content = "".join(
+        json.loads(line[6:])["choices"][0]["delta"].get("content", "")
+        for line in text.splitlines()
+        if line.startswith("data: {")
+    )
+    assert content == "一二三四五"
+
+
+def test_error_injection():
+    """按概率注入429"""
+    server = FakeLLMServer(error_429=1.0)
+    status, _ = request(server, {"model": "fake-model", "messages": []})
+    assert status == 429
+    assert server.stats["errors_429"] == 1
+
+
+def test_close_interrupts_hanging_request():
+    """模拟超时的请求不会让 close() 卡住，客户端看到连接被关闭"""
+    server = FakeLLMServer(timeout_rate=1.0)
+
+    async def run():
+        await server.start("127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        body = b'{"model": "fake-model", "messages": []}'
+        writer.write(
+            b"POST /v1/chat/completions HTTP/1.1\r\nHost: localhost\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        while server.stats["timeouts"] == 0:
+            await asyncio.sleep(0.01)
+        await asyncio.wait_for(server.close(), timeout=2)
+        data = await asyncio.wait_for(reader.read(), timeout=2)
+        writer.close()
+        return data
+
+    assert asyncio.run(run()) == b""
+    assert server.stats["timeouts"] == 1
@@ -0,0 +1,94 @@
+"""
+异步输入读取与游戏循环测试
+"""
+import asyncio
+import os
+
+import pytest
+
+from input_reader import InputReader
+
+
+def test_lines_are_queued_and_decoded():
+    """提前输入的行按顺序排队，被拆开的多字节字符能正确解码"""
+    read_fd, write_fd = os.pipe()
+
+    async def run():
+        with os.fdopen(read_fd, "rb", buffering=0) as stream:
+            reader = InputReader(stream)
+            reader.start()
+            data = "look\n向东走\nquit".encode("utf-8")
+            os.write(write_fd, data[:8])
+            await asyncio.sleep(0.01)
+            os.write(write_fd, data[8:])
+            os.close(write_fd)
+            lines = [await reader.readline(), await reader.readline(), await reader.readline()]
+            with pytest.raises(EOFError):
+                await reader.readline()
+            reader.close()
+            return lines
+
+    assert asyncio.run(run()) == ["look", "向东走", "quit"]
+
+
+def test_game_loop_keeps_running_background_work(game_config, monkeypatch, capsys):
+    """等待输入时定时任务照常执行；Ctrl+C 只打断正在进行的回复"""
+    from main import Game
+
+    monkeypatch.setattr(game_config, "SCHEDULER_TICK", 0.01, raising=False)
+    game = Game()
+    started = asyncio.Event()
+
+    async def slow_reply(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(10)
+        yield "太慢了"
+
+    game.ai_service.stream_character_response = slow_reply
+    read_fd, write_fd = os.pipe()
+
+    async def run():
+        fired = []
+        with os.fdopen(read_fd, "rb", buffering=0) as stream:
+            loop_task = asyncio.ensure_future(game.game_loop(InputReader(stream)))
+            game.scheduler.call_later(0.02, fired.append, "tick")
+            await asyncio.sleep(0.05)
+            assert fired == ["tick"]
+
+            # 回复进行中输入的下一条命令会排队
+            os.write(write_fd, "talk elder 你好\nwhere\n".encode("utf-8"))
+            await asyncio.wait_for(started.wait(), 1)
+            game.interrupt()
+            await asyncio.sleep(0.05)
+            assert game.running
+            os.close(write_fd)
+            await asyncio.wait_for(loop_task, 1)
+
+    asyncio.run(run())
+    game.stop_world()
+    out = capsys.readouterr().out
+    assert "⏹ 已打断。" in out
+    assert out.index("⏹ 已打断。") < out.index("📍 您当前在: Village Center")
+    assert "Goodbye" in out
+    assert game.character_manager.get_character("elder").conversation_history == []
+
+
+def test_interrupt_when_idle_leaves_the_game(game_config, capsys):
+    """没有命令在执行时 Ctrl+C 退出游戏"""
+    from main import Game
+
+    game = Game()
+    read_fd, write_fd = os.pipe()
+
+    async def run():
+        with os.fdopen(read_fd, "rb", buffering=0) as stream:
+            loop_task = asyncio.ensure_future(game.game_loop(InputReader(stream)))
+            await asyncio.sleep(0.02)
+            game.interrupt()
+            await asyncio.wait_for(loop_task, 1)
+        os.close(write_fd)
+
+    asyncio.run(run())
+    game.stop_world()
+    assert not game.running
+    assert "Goodbye" in capsys.readouterr().out
@@ -0,0 +1,85 @@
+"""
+物品与背包测试
+"""
+import asyncio
+
+from content_pack import default_content
+from items import INVENTORY, ItemManager
+from world import World
+
+
+def test_indexes_follow_moves():
+    """按持有者、名称和标签的索引随物品移动保持一致"""
+    world = World()
+    items = ItemManager(world, default_content().items)
+    assert [item.item_id for item in items.items_at("market_square")] == ["brass_lantern", "red_apple"]
+    assert {item.item_id for item in items.with_tag("light")} == {"brass_lantern", "glowing_crystal"}
+    assert [item.item_id for item in items.find("Brass Lantern", ["market_square"])] == ["brass_lantern"]
+    assert items.find("lantern", ["village_center"]) == []
+
+    market = world.get_location("market_square")
+    version = market.version
+    items.move("brass_lantern", INVENTORY)
+    assert market.items == ["red_apple"]
+    assert market.version > version
+    assert [item.item_id for item in items.items_at(INVENTORY)] == ["brass_lantern"]
+    items.move("brass_lantern", "village_center")
+    assert world.get_location("village_center").items == ["brass_lantern"]
+    assert items.to_state() == {"holders": {"brass_lantern": "village_center"}, "revealed": []}
+
+
+def test_hidden_items_are_found_by_search():
+    """隐藏的物品只有搜索后才能看到和拿到"""
+    items = ItemManager(World(), default_content().items)
+    assert items.items_at("crystal_cave") == []
+    assert items.find("crystal", ["crystal_cave"]) == []
+    assert [item.item_id for item in items.search("crystal_cave")] == ["glowing_crystal"]
+    assert [item.item_id for item in items.find("crystal", ["crystal_cave"])] == ["glowing_crystal"]
+    assert items.search("crystal_cave") == []
+
+
+def test_item_commands_and_npc_context(game_config, capsys):
+    """take/drop/use/search/inventory 命令，以及对话上下文中的物品"""
+    from main import Game
+
+    game = Game()
+    game.move_player("east")
+    assert "✨ 这里有: Brass Lantern, Red Apple" in capsys.readouterr().out
+    assert "这里有: Brass Lantern, Red Apple。" in game.get_location_context()
+
+    asyncio.run(game.handle_command("take apple"))
+    asyncio.run(game.handle_command("拿 brass lantern"))
+    asyncio.run(game.handle_command("inventory"))
+    out = capsys.readouterr().out
+    assert "您拿起了 Red Apple" in out and "Brass Lantern - A sturdy lantern" in out
+    assert "✨" not in game.render_look()
+    assert game.get_location_context().endswith("玩家携带: Red Apple, Brass Lantern。")
+
+    asyncio.run(game.handle_command("use food"))
+    assert "Red Apple 用完了" in capsys.readouterr().out
+    assert game.items.get_item("red_apple").holder is None
+
+    asyncio.run(game.handle_command("search light"))
+    assert "Brass Lantern（已携带）" in capsys.readouterr().out
+    asyncio.run(game.handle_command("drop lantern"))
+    assert "✨ 这里有: Brass Lantern" in game.render_look()
+
+
+def test_items_are_saved(game_config, monkeypatch, tmp_path):
+    """物品的位置和搜索结果随存档恢复"""
+    from main import Game
+
+    monkeypatch.setattr(game_config, "SAVE_DIR", str(tmp_path / "saves"))
+    monkeypatch.setattr(game_config, "SAVE_SNAPSHOT_EVERY", 2)
+
+    game = Game()
+    game.move_player("west")
+    game.search()
+    game.take_item("crystal")
+    game.take_item("nothing")
+    game.journal.flush()
+
+    resumed = Game()
+    assert [item.item_id for item in resumed.items.items_at(INVENTORY)] == ["glowing_crystal"]
+    assert not resumed.items.get_item("glowing_crystal").hidden
+    assert resumed.world.get_location("crystal_cave").items == []
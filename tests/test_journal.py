@@ -0,0 +1,108 @@
+"""
+存档日志测试
+"""
+import asyncio
+import os
+
+from journal import GameJournal
+
+
+def make_journal(tmp_path, **kwargs):
+    journal = GameJournal(str(tmp_path / "saves"), **kwargs)
+    journal.snapshot_source = lambda: {"count": journal.recorded}
+    journal.recorded = 0
+    return journal
+
+
+def record(journal, count):
+    for _ in range(count):
+        journal.recorded += 1
+        journal.record({"type": "tick", "n": journal.recorded})
+
+
+def test_events_are_replayed_after_latest_snapshot(tmp_path):
+    """恢复时读取最新快照，只重放它之后的事件"""
+    journal = make_journal(tmp_path, snapshot_every=3)
+    record(journal, 7)
+
+    files = sorted(os.listdir(journal.directory))
+    assert files == ["journal-00000002.jsonl", "snapshot-00000002.json"]
+
+    snapshot, events = GameJournal(journal.directory).load()
+    assert snapshot == {"count": 6}
+    assert [event["n"] for event in events] == [7]
+
+
+def test_close_writes_final_snapshot(tmp_path):
+    """退出时写入快照，下次启动不需要重放"""
+    journal = make_journal(tmp_path, snapshot_every=100)
+    record(journal, 2)
+    journal.close()
+
+    reopened = GameJournal(journal.directory)
+    assert reopened.load() == ({"count": 2}, [])
+    reopened.record({"type": "tick", "n": 3})
+    assert reopened.load() == ({"count": 2}, [{"type": "tick", "n": 3}])
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    """写到一半的最后一行被忽略"""
+    journal = make_journal(tmp_path)
+    record(journal, 2)
+    with open(os.path.join(journal.directory, "journal-00000000.jsonl"), "a") as f:
+        f.write('{"type": "ti')
+
+    reopened = GameJournal(journal.directory)
+    _, events = reopened.load()
+    assert [event["n"] for event in events] == [1, 2]
+    reopened.record({"type": "tick", "n": 3})
+    _, events = GameJournal(journal.directory).load()
+    assert [event["n"] for event in events] == [1, 2, 3]
+
+
+def test_writes_are_batched_off_the_event_loop(tmp_path):
+    """事件循环中记录只进入缓冲区，之后一次写入"""
+    journal = make_journal(tmp_path, flush_interval=0.01)
+    segment = os.path.join(journal.directory, "journal-00000000.jsonl")
+
+    async def run():
+        record(journal, 3)
+        assert not os.path.exists(segment)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    with open(segment) as f:
+        assert len(f.readlines()) == 3
+
+
+def test_game_resumes_location_and_conversations(game_config, monkeypatch, tmp_path):
+    """重新启动后恢复位置、对话历史和长期记忆"""
+    from main import Game
+
+    monkeypatch.setattr(game_config, "SAVE_DIR", str(tmp_path / "saves"))
+    monkeypatch.setattr(game_config, "SAVE_SNAPSHOT_EVERY", 3)
+    monkeypatch.setattr(game_config, "CONVERSATION_WINDOW", 2)
+
+    game = Game()
+    assert not game.resumed
+    game.move_player("east")
+    elder = game.character_manager.get_character("elder")
+    for index in range(4):
+        elder.add_conversation(f"问题{index}", f"回答{index}")
+        game.record({"type": "turn", "char": "elder", "player": f"问题{index}",
+                     "reply": f"回答{index}"})
+    elder.update_memory("玩家问过两个问题。", 1)
+    game._record_memory("elder", "玩家问过两个问题。", 1)
+    game.journal.flush()
+
+    resumed = Game()
+    assert resumed.resumed
+    assert resumed.world.current_location == "market_square"
+    restored = resumed.character_manager.get_character("elder")
+    assert restored.conversation_history == elder.conversation_history
+    assert restored.memory_summary == "玩家问过两个问题。"
+    assert [turn.rendered for turn in restored.unsummarized_turns] == [
+        "Player: 问题1\nVillage Elder: 回答1"
+    ]
+    assert restored.long_term_memory.export() == elder.long_term_memory.export()
+    assert resumed.character_manager.count_in_location("village_center") == 1
@@ -0,0 +1,117 @@
+"""
+限流器测试
+"""
+import asyncio
+import time
+
+from rate_limiter import (
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PrioritySemaphore, RateLimiter, TokenBucket,
+    create_rate_limiter
+)
+
+
+async def drain(limiter: RateLimiter, requests: int):
+    """用掉桶里已有的请求名额"""
+    for _ in range(requests):
+        await limiter.acquire()
+
+
+def test_token_bucket_refills_over_time():
+    """令牌按速率补充"""
+    bucket = TokenBucket(rate_per_second=10, capacity=2)
+    now = time.monotonic()
+    assert bucket.time_until(2, now) == 0
+    bucket.consume(2)
+    assert bucket.time_until(1, now) > 0
+    assert bucket.time_until(1, now + 0.2) == 0
+
+
+def test_requests_queue_instead_of_failing():
+    """超出每分钟请求数时排队等待"""
+    async def run():
+        limiter = RateLimiter(requests_per_minute=600)  # 每0.1秒补充一个
+        await drain(limiter, 600)
+        start = time.monotonic()
+        await limiter.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.05
+
+
+def test_interactive_requests_jump_the_queue():
+    """玩家请求先于排在前面的后台请求放行"""
+    order = []
+
+    async def request(limiter, name, priority):
+        await limiter.acquire(priority=priority)
+        order.append(name)
+
+    async def run():
+        limiter = RateLimiter(requests_per_minute=1200)
+        await drain(limiter, 1200)
+        tasks = [asyncio.create_task(request(limiter, f"bg{i}", PRIORITY_BACKGROUND))
+                 for i in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request(limiter, "player", PRIORITY_INTERACTIVE)))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order[0] == "player"
+    assert order[1:] == ["bg0", "bg1", "bg2"]
+
+
+def test_token_limit_is_enforced():
+    """每分钟token数不足时等待"""
+    async def run():
+        limiter = RateLimiter(tokens_per_minute=6000)  # 每秒100个
+        await limiter.acquire(tokens=6000)
+        start = time.monotonic()
+        await limiter.acquire(tokens=10)
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.05
+
+
+def test_create_rate_limiter_lookup():
+    """先匹配 provider:model，再匹配 provider"""
+    limits = {"kimi": {"rpm": 3}, "openai:gpt-4": {"tpm": 1000}}
+    assert create_rate_limiter(limits, "kimi", "moonshot-v1-8k") is not None
+    assert create_rate_limiter(limits, "openai", "gpt-4") is not None
+    assert create_rate_limiter(limits, "openai", "gpt-3.5-turbo") is None
+
+
+def test_priority_semaphore_prefers_interactive():
+    """并发名额空出时先给玩家请求，而不是先来的后台请求"""
+    order = []
+
+    async def request(semaphore, name, priority):
+        async with semaphore.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        semaphore = PrioritySemaphore(1)
+        tasks = [asyncio.create_task(request(semaphore, f"bg{i}", PRIORITY_BACKGROUND))
+                 for i in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request(semaphore, "player", PRIORITY_INTERACTIVE)))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["bg0", "player", "bg1", "bg2"]
+
+
+def test_priority_semaphore_cancelled_waiter_frees_slot():
+    """取消的等待者不会占用名额"""
+    async def run():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire()
+        waiter = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        semaphore.release()
+        await asyncio.wait_for(semaphore.acquire(), timeout=1)
+        return semaphore.queued
+
+    assert asyncio.run(run()) == 0
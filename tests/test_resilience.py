@@ -0,0 +1,91 @@
+"""
+重试与熔断测试
+"""
+import asyncio
+import time
+
+from resilience import CircuitBreaker, RetryPolicy, is_transient_error
+
+
+class FakeStatusError(Exception):
+    """模拟带状态码的API错误"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class APITimeoutError(Exception):
+    """与 openai.APITimeoutError 同名的超时错误"""
+
+
+def test_transient_errors():
+    """超时、429 和 5xx 可重试，认证错误不可重试"""
+    assert is_transient_error(FakeStatusError(429))
+    assert is_transient_error(FakeStatusError(503))
+    assert is_transient_error(asyncio.TimeoutError())
+    assert is_transient_error(APITimeoutError())
+    assert not is_transient_error(FakeStatusError(401))
+    assert not is_transient_error(ValueError("bad"))
+
+
+def test_retry_delay_is_bounded():
+    """退避时间带抖动且不超过上限"""
+    policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+    for attempt in range(10):
+        delay = policy.get_delay(attempt)
+        assert 0 <= delay <= min(2.0, 0.5 * 2 ** attempt)
+
+
+def test_circuit_breaker_opens_and_recovers():
+    """连续失败后打开，超时后只放行一个试探请求"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.01)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    time.sleep(0.02)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_half_open_failure_reopens():
+    """半开状态下试探失败会重新打开"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_released_trial_allows_new_trial():
+    """被取消的试探请求交还名额后可以再次试探"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.release()
+    assert breaker.allow_request()
+
+
+def test_stale_trial_expires():
+    """试探请求迟迟没有结果时，超过 reset_timeout 后放行新的试探"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.02)
+    breaker.record_failure()
+    time.sleep(0.03)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    time.sleep(0.03)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
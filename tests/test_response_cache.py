@@ -0,0 +1,111 @@
+"""
+回复缓存测试
+"""
+import asyncio
+import time
+
+from response_cache import ResponseCache, make_cache_key
+
+
+def test_cache_key_depends_on_all_parts():
+    """缓存键应区分提供商、模型、提示词和消息"""
+    base = make_cache_key("kimi", "moonshot-v1-8k", "prompt", "你好")
+    assert base == make_cache_key("kimi", "moonshot-v1-8k", "prompt", "你好")
+    assert base != make_cache_key("openai", "moonshot-v1-8k", "prompt", "你好")
+    assert base != make_cache_key("kimi", "moonshot-v1-32k", "prompt", "你好")
+    assert base != make_cache_key("kimi", "moonshot-v1-8k", "prompt2", "你好")
+    assert base != make_cache_key("kimi", "moonshot-v1-8k", "prompt", "再见")
+
+
+def test_memory_lru_eviction():
+    """超过容量时淘汰最久未使用的条目"""
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_expiry():
+    """过期条目不再命中"""
+    cache = ResponseCache(ttl=0.01)
+    cache.set("a", "1")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_disk_layer_survives_restart(tmp_path):
+    """磁盘层在重新打开后仍可命中"""
+    db_path = str(tmp_path / "cache.db")
+    cache = ResponseCache(db_path=db_path)
+    cache.set("greeting", "你好，旅行者")
+    cache.close()
+
+    reopened = ResponseCache(db_path=db_path)
+    assert reopened.get("greeting") == "你好，旅行者"
+    assert reopened.disk_hits == 1
+    # 第二次读取来自内存层
+    assert reopened.get("greeting") == "你好，旅行者"
+    assert reopened.memory_hits == 1
+    reopened.close()
+
+
+def test_writes_are_batched_inside_event_loop(tmp_path):
+    """事件循环中的写入先进入缓冲区，再由后台批量提交"""
+    db_path = str(tmp_path / "cache.db")
+
+    async def run():
+        cache = ResponseCache(db_path=db_path, flush_interval=0.05)
+        for index in range(5):
+            cache.set(f"k{index}", f"v{index}")
+        on_disk_before = cache._read_disk("k0", time.time())
+        await asyncio.sleep(0.2)
+        on_disk_after = cache._read_disk("k0", time.time())
+        cache.close()
+        return on_disk_before, on_disk_after
+
+    before, after = asyncio.run(run())
+    assert before is None
+    assert after is not None and after[0] == "v0"
+
+
+def test_get_any_reads_disk_off_loop(tmp_path):
+    """get_any 按顺序查找多个键，磁盘命中提升到内存层"""
+    db_path = str(tmp_path / "cache.db")
+    cache = ResponseCache(db_path=db_path)
+    cache.set("fallback", "备用回复")
+    cache.close()
+
+    async def run():
+        reopened = ResponseCache(db_path=db_path)
+        value = await reopened.get_any(["primary", "fallback"])
+        missing = await reopened.get_any(["other"])
+        stats = reopened.stats()
+        reopened.close()
+        return value, missing, stats
+
+    value, missing, stats = asyncio.run(run())
+    assert value == "备用回复"
+    assert missing is None
+    assert stats["disk_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_close_flushes_pending_writes(tmp_path):
+    """关闭时写入缓冲区中剩余的回复"""
+    db_path = str(tmp_path / "cache.db")
+
+    async def run():
+        cache = ResponseCache(db_path=db_path, flush_interval=60)
+        cache.set("greeting", "你好")
+        cache.close()
+
+    asyncio.run(run())
+    reopened = ResponseCache(db_path=db_path)
+    assert reopened.get("greeting") == "你好"
+    reopened.close()
@@ -0,0 +1,92 @@
+"""
+寻路与路线表测试
+"""
+import random
+
+from content_pack import ContentPack
+from routing import RouteTable
+from world import World
+
+
+def random_world(seed, size=60):
+    rng = random.Random(seed)
+    locations = {
+        f"room{index}": {"name": f"Room {index}", "description": "", "exits": {}}
+        for index in range(size)
+    }
+    for index in range(size * 2):
+        source, target = rng.sample(sorted(locations), 2)
+        locations[source]["exits"][f"door{index}"] = target
+    return World(ContentPack("random", "room0", locations, {}))
+
+
+def assert_matches_fresh_table(world, destinations):
+    fresh = RouteTable(world)
+    for destination in destinations:
+        for source in world.locations:
+            assert world.routes.distance(source, destination) == fresh.distance(source, destination)
+            route = world.routes.route(source, destination)
+            if route is not None:
+                # 路线确实沿着出口走到目的地
+                location_id = source
+                for direction, step in route:
+                    location_id = world.get_exits(location_id)[direction]
+                    assert location_id == step
+                assert location_id == destination
+
+
+def test_default_world_routes():
+    """最短路线、距离和下一步"""
+    world = World()
+    routes = world.routes
+    assert routes.route("village_center", "moonlit_grove") == [
+        ("south", "enchanted_forest"), ("west", "moonlit_grove")
+    ]
+    assert routes.distance("riverside_dock", "ancient_library") == 3
+    assert routes.next_step("wizard_tower", "wizard_tower") == ""
+    assert routes.next_location("village_center", "wizard_tower") in {
+        "ancient_library", "market_square"
+    }
+
+
+def test_tables_follow_exit_changes():
+    """增删和改向出口后，缓存的路线与重新计算的一致"""
+    world = random_world(3)
+    rng = random.Random(5)
+    destinations = [f"room{index}" for index in range(0, 60, 7)]
+    assert_matches_fresh_table(world, destinations)
+
+    for step in range(25):
+        location = world.locations[rng.choice(sorted(world.locations))]
+        if location.exits and rng.random() < 0.5:
+            location.remove_exit(rng.choice(sorted(location.exits)))
+        else:
+            direction = rng.choice(sorted(location.exits) + [f"new{step}"])
+            location.add_exit(direction, rng.choice(sorted(world.locations)))
+        assert_matches_fresh_table(world, destinations)
+
+
+def test_find_location():
+    """按ID、名称或唯一前缀查找地点"""
+    world = World()
+    assert world.find_location("Market Square") == "market_square"
+    assert world.find_location("moonlit_grove") == "moonlit_grove"
+    assert world.find_location("wiz") == "wizard_tower"
+    assert world.find_location("m") is None  # 有歧义
+    assert world.find_location("castle") is None
+
+
+def test_travel_and_distance_commands(game_config, capsys):
+    """travel 沿最短路线走到目的地，distance 给出步数"""
+    import asyncio
+
+    from main import Game
+
+    game = Game()
+    asyncio.run(game.handle_command("distance moonlit grove"))
+    assert "2 步" in capsys.readouterr().out
+
+    asyncio.run(game.handle_command("travel moonlit grove"))
+    out = capsys.readouterr().out
+    assert game.world.current_location == "moonlit_grove"
+    assert "Enchanted Forest → Moonlit Grove（2 步）" in out
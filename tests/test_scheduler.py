@@ -0,0 +1,104 @@
+"""
+时间轮调度器与NPC行为测试
+"""
+import asyncio
+import random
+
+from character import CharacterManager
+from npc_behaviour import NPCBehaviour, WorldClock
+from scheduler import TimingWheel, WorldScheduler
+from world import World
+
+
+def test_timers_fire_in_order_across_levels():
+    """跨越多层的定时器按到期时间触发，取消的不会触发"""
+    wheel = TimingWheel(tick=1, slot_bits=2, levels=3)
+    rng = random.Random(7)
+    deadlines = [rng.randint(1, 200) for _ in range(100)]
+    timers = [wheel.add(when, None, when) for when in deadlines]
+    cancelled = set(rng.sample(range(100), 20))
+    for index in cancelled:
+        timers[index].cancel()
+        timers[index].cancel()  # 重复取消无影响
+
+    fired = []
+    now = 0
+    while len(wheel):
+        assert wheel.next_expiry() is not None
+        now += rng.randint(1, 30)
+        for timer in wheel.advance(now):
+            assert now - 30 < timer.args[0] <= now
+            fired.append(timer.args[0])
+
+    assert fired == sorted(fired)
+    assert fired == sorted(when for index, when in enumerate(deadlines) if index not in cancelled)
+    assert wheel.next_expiry() is None
+
+
+def test_far_timers_beyond_top_level():
+    """超出最高层范围的定时器也会在正确的时间触发"""
+    wheel = TimingWheel(tick=1, slot_bits=2, levels=2)
+    timer = wheel.add(100, None)
+    assert wheel.advance(99) == []
+    assert wheel.advance(100) == [timer]
+
+
+def test_scheduler_runs_callbacks_on_the_loop():
+    """调度器在事件循环上按时执行回调，周期任务可以取消"""
+    scheduler = WorldScheduler(tick=0.01)
+    events = []
+
+    async def run():
+        # 以同一时刻为基准，测试机负载高时顺序也不变
+        now = scheduler.time()
+        scheduler.call_at(now + 0.05, events.append, "late")
+        scheduler.call_at(now + 0.02, events.append, "early")
+        cancelled = scheduler.call_at(now + 0.03, events.append, "cancelled")
+        cancelled.cancel()
+        periodic = scheduler.call_every(0.02, events.append, "tick")
+        await asyncio.sleep(0.07)
+        periodic.cancel()
+        await asyncio.sleep(0.05)
+        scheduler.close()
+
+    asyncio.run(run())
+    assert events.index("early") < events.index("late")
+    assert "cancelled" not in events
+    assert 2 <= events.count("tick") <= 4
+
+
+def test_world_clock():
+    """游戏时钟按 day_length 换算"""
+    clock = WorldClock(day_length=24.0, start_hour=8, started_at=100.0)
+    assert clock.hour(102.0) == 10
+    assert clock.seconds_until(20, 102.0) == 10
+    assert clock.seconds_until(10, 102.0) == 24
+
+
+def test_patrols_and_schedules_move_characters():
+    """巡逻和作息通过 location 属性移动角色，位置索引随之更新"""
+    world = World()
+    manager = CharacterManager()
+    scheduler = WorldScheduler(tick=0.01)
+    moves = []
+
+    async def run():
+        behaviour = NPCBehaviour(
+            scheduler, world, manager, WorldClock(0.24, 8, scheduler.time()),
+            ambient_interval=0, on_move=lambda char_id, _, old, new: moves.append((char_id, old, new))
+        )
+        behaviour.start({
+            "guardian": {"patrol": {"route": ["enchanted_forest", "moonlit_grove"], "interval": 0.02}},
+            # 0.01 秒为游戏中的一小时
+            "merchant": {"schedule": {8: "market_square", 10: "riverside_dock"}},
+        })
+        await asyncio.sleep(0.05)
+        behaviour.stop()
+        scheduler.close()
+
+    asyncio.run(run())
+    assert ("guardian", "enchanted_forest", "moonlit_grove") in moves
+    assert ("merchant", "market_square", "riverside_dock") in moves
+    guardian = manager.get_character("guardian")
+    assert guardian.location in manager.occupied_locations()
+    assert manager.get_characters_in_location(guardian.location)["guardian"] is guardian
@@ -0,0 +1,55 @@
+"""
+长期语义记忆测试
+"""
+import time
+
+import semantic_memory
+from semantic_memory import HashingEmbedder, SemanticMemory
+
+
+def test_embedding_is_normalized_and_deterministic():
+    """相同文本得到相同的单位向量"""
+    embedder = HashingEmbedder(dim=64)
+    first = [float(value) for value in embedder.embed("丢失的魔法书")]
+    second = [float(value) for value in embedder.embed("丢失的魔法书")]
+    assert first == second
+    assert abs(sum(value * value for value in first) - 1.0) < 1e-5
+
+
+def test_recall_finds_relevant_memories():
+    """检索返回最相关的记忆，不相关的被过滤"""
+    memory = SemanticMemory()
+    memory.remember("Player: 我的名字叫小明\nVillage Elder: 你好，小明")
+    memory.remember("Player: 森林里有狼吗？\nVillage Elder: 晚上要小心狼群")
+    memory.remember("Player: 图书馆在哪里？\nVillage Elder: 在村子北边")
+
+    results = memory.recall("你还记得我的名字吗", k=1)
+    assert len(results) == 1
+    assert "小明" in results[0][0]
+    assert memory.recall("xyz", k=3) == []
+
+
+def test_capacity_overwrites_oldest():
+    """超过容量时覆盖最旧的记忆"""
+    memory = SemanticMemory(capacity=2)
+    for text in ("第一条 苹果", "第二条 香蕉", "第三条 樱桃"):
+        memory.remember(text)
+    assert len(memory) == 2
+    assert sorted(memory.texts) == ["第三条 樱桃", "第二条 香蕉"]
+    assert "樱桃" in memory.recall_texts("樱桃", k=1)[0]
+
+
+def test_recall_is_fast_with_thousands_of_memories():
+    """数千条记忆的检索保持在毫秒以内（需要 NumPy）"""
+    if semantic_memory.np is None:
+        return
+    memory = SemanticMemory(capacity=5000)
+    for index in range(5000):
+        memory.remember(f"Player: 第{index}个问题 关于 物品{index % 97}\nNPC: 回答{index}")
+
+    memory.recall("物品42在哪里", k=3)
+    start = time.perf_counter()
+    for _ in range(100):
+        memory.recall("物品42在哪里", k=3)
+    # 包含查询文本的嵌入；宽松的上限避免在慢机器上误报
+    assert (time.perf_counter() - start) / 100 < 0.005
@@ -0,0 +1,102 @@
+"""
+多人服务器测试：多个连接各自独立，共享同一个 AIService 和世界内容
+"""
+import asyncio
+
+
+class FakeAIService:
+    """只记录调用的假 AI 服务"""
+
+    def __init__(self):
+        self.calls = []
+        self.closed = False
+
+    async def stream_character_response(self, name, personality, message, context="", history=None,
+                                        **kwargs):
+        self.calls.append((name, message))
+        yield f"{name}收到：{message}"
+
+    async def close(self):
+        self.closed = True
+
+
+async def read_until(reader, marker):
+    data = await asyncio.wait_for(reader.readuntil(marker.encode("utf-8")), 2)
+    return data.decode("utf-8")
+
+
+async def connect(server, name):
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    await read_until(reader, "名字: ")
+    writer.write(f"{name}\r\n".encode("utf-8"))
+    await read_until(reader, "🎮 > ")
+    return reader, writer
+
+
+def test_sessions_are_isolated_and_share_services(game_config):
+    """每个玩家的位置互不影响，对话都经过同一个 AI 服务"""
+    from server import IAC, WILL, GameServer
+
+    ai_service = FakeAIService()
+
+    async def run():
+        server = GameServer(port=0, ai_service=ai_service)
+        await server.start()
+        alice = await connect(server, "alice")
+        bob = await connect(server, "bob")
+        assert set(server.sessions) == {"alice", "bob"}
+        assert server.sessions["alice"].world.content is server.sessions["bob"].world.content
+
+        alice[1].write("东\r\n".encode("utf-8"))
+        assert "Market Square" in await read_until(alice[0], "🎮 > ")
+        # telnet 协商字节被忽略
+        bob[1].write(bytes([IAC, WILL, 31]) + b"where\r\n")
+        assert "Village Center" in await read_until(bob[0], "🎮 > ")
+
+        bob[1].write("talk elder 你好\r\n".encode("utf-8"))
+        assert "Village Elder收到：你好" in await read_until(bob[0], "🎮 > ")
+        assert ai_service.calls == [("Village Elder", "你好")]
+
+        # 名字已被占用
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        await read_until(reader, "名字: ")
+        writer.write(b"alice\r\n")
+        assert "已经在游戏中" in await read_until(reader, "名字: ")
+        writer.close()
+
+        alice[1].write(b"quit\r\n")
+        assert "再见" in await read_until(alice[0], "\n")
+        await asyncio.sleep(0.05)
+        assert set(server.sessions) == {"bob"}
+
+        await server.close()
+        assert ai_service.closed
+        assert server.sessions == {}
+
+    asyncio.run(run())
+
+
+def test_interrupt_from_the_connection(game_config):
+    """telnet 的中断命令只打断这个玩家正在进行的回复"""
+    from server import IAC, IP, GameServer
+
+    started = asyncio.Event()
+
+    class SlowAIService(FakeAIService):
+        async def stream_character_response(self, *args, **kwargs):
+            started.set()
+            await asyncio.sleep(10)
+            yield "太慢了"
+
+    async def run():
+        server = GameServer(port=0, ai_service=SlowAIService())
+        await server.start()
+        reader, writer = await connect(server, "carol")
+        writer.write(b"talk elder hi\r\n")
+        await asyncio.wait_for(started.wait(), 2)
+        writer.write(bytes([IAC, IP]))
+        assert "已打断" in await read_until(reader, "🎮 > ")
+        assert server.sessions["carol"].running
+        await server.close()
+
+    asyncio.run(run())
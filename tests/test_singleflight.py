@@ -0,0 +1,80 @@
+"""
+请求合并测试
+"""
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_request():
+    """相同键的并发调用只执行一次"""
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "你好"
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("elder", fetch) for _ in range(5)])
+        assert len(flight) == 0
+        return results
+
+    assert asyncio.run(run()) == ["你好"] * 5
+    assert len(calls) == 1
+
+
+def test_errors_reach_every_caller():
+    """请求失败时所有等待者都收到异常"""
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        flight = SingleFlight()
+        return await asyncio.gather(*[flight.do("k", fail) for _ in range(3)],
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_last_waiter_cancellation_cancels_request():
+    """只有最后一个等待者离开时才取消底层请求"""
+    finished = []
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+        return "done"
+
+    async def run():
+        flight = SingleFlight()
+        first = asyncio.create_task(flight.do("k", slow))
+        second = asyncio.create_task(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "done"
+
+        lonely = asyncio.create_task(flight.do("other", slow))
+        await asyncio.sleep(0.01)
+        lonely.cancel()
+        await asyncio.sleep(0.06)
+
+    asyncio.run(run())
+    assert finished == [1]
+
+
+def test_begin_registers_caller_owned_request():
+    """begin() 登记的请求由调用者设置结果"""
+    async def run():
+        flight = SingleFlight()
+        future = flight.begin("stream")
+        assert flight.begin("stream") is None
+        waiter = asyncio.create_task(flight.wait("stream"))
+        await asyncio.sleep(0)
+        future.set_result("完整回复")
+        return await waiter
+
+    assert asyncio.run(run()) == "完整回复"
@@ -0,0 +1,65 @@
+"""
+Token计数与上下文预算测试
+"""
+from token_budget import ContextBudgeter, PromptSection, TokenCounter, split_sentences
+
+
+def test_model_families_use_different_ratios():
+    """中文在国产模型上的估算token数更少"""
+    text = "你好，旅行者，欢迎来到村庄。" * 5
+    assert TokenCounter("moonshot-v1-8k").count(text) < TokenCounter("gpt-3.5-turbo").count(text)
+    assert TokenCounter("gpt-3.5-turbo").count("") == 0
+
+
+def test_split_sentences_handles_mixed_punctuation():
+    """中英文句号都能切分"""
+    assert split_sentences("当前在 Village Center。You are here. Look!") == [
+        "当前在 Village Center。", "You are here.", "Look!"
+    ]
+
+
+def test_sections_untouched_within_budget():
+    """预算充足时保持原文不变"""
+    counter = TokenCounter("gpt-3.5-turbo")
+    context = "当前在 Market Square。A bustling marketplace.\nPeople trade here."
+    sections = [PromptSection.from_text("context", context, priority=1)]
+    fitted, max_tokens = ContextBudgeter(counter, 2000).fit("角色设定", sections, 100)
+    assert fitted["context"] == context
+    assert max_tokens == 100
+
+
+def test_lowest_priority_trimmed_first():
+    """先丢弃最旧的对话，再从末尾裁剪描述"""
+    counter = TokenCounter("gpt-3.5-turbo")
+    history = [f"Player: message number {i}\nElder: reply number {i}" for i in range(5)]
+    context = "当前在 Village。" + "The fountain sparkles in the sun. " * 5
+
+    sections = [
+        PromptSection("history", history, priority=0, header="History:\n", drop_oldest=True),
+        PromptSection.from_text("context", context, priority=1),
+    ]
+    budget = counter.count(context) + counter.count(history[-1]) + 60
+    fitted, _ = ContextBudgeter(counter, budget).fit("", sections, 30)
+
+    assert fitted["context"] == context
+    assert "number 4" in fitted["history"]
+    assert "number 0" not in fitted["history"]
+
+
+def test_output_shrinks_when_prompt_cannot_fit():
+    """提示词无法再裁剪时缩短回复，但不低于最小值"""
+    counter = TokenCounter("gpt-3.5-turbo")
+    sections = [PromptSection.from_text("context", "当前在 Village。Some more words here.", 1)]
+    fitted, max_tokens = ContextBudgeter(counter, 100, min_output_tokens=16).fit(
+        "固定的角色设定" * 20, sections, 80
+    )
+    assert fitted["context"] == "当前在 Village。"
+    assert max_tokens == 16
+
+
+def test_reply_sizing_matches_prompt_counting():
+    """max_tokens 的估算与提示词计数使用同一套比例"""
+    for model in ("gpt-3.5-turbo", "moonshot-v1-8k", "unknown-model"):
+        counter = TokenCounter(model)
+        reply = "你好，旅行者！欢迎来到我们的村庄。" * 5
+        assert abs(counter.tokens_for_chars(len(reply)) - counter.count(reply)) <= len(reply) * 0.2
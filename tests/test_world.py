@@ -0,0 +1,42 @@
+"""
+地点与描述缓存测试
+"""
+from world import World
+
+
+def test_location_text_is_cached_until_changed():
+    """描述只生成一次，出口或物品变化后重新生成"""
+    world = World()
+    location = world.get_current_location()
+    first = world.get_location_description()
+    assert world.get_location_description() is first
+    assert first.endswith("有出口通向北方, 东方, 南方和西方。")
+
+    location.remove_exit("west")
+    assert world.get_location_description().endswith("有出口通向北方, 东方和南方。")
+    assert world.get_location_description(include_exits=False) == f"{location.name}\n\n{location.description}"
+
+    version = location.version
+    location.add_item("lantern")
+    assert location.version == version + 1
+    assert location.remove_item("lantern")
+    assert not location.remove_item("lantern")
+    assert location.version == version + 2
+
+
+def test_look_follows_occupants(game_config):
+    """look 的缓存在角色进出时失效"""
+    from main import Game
+
+    game = Game()
+    text = game.render_look()
+    assert "👤 Village Elder" in text
+    assert game.render_look() is text
+
+    game.character_manager.get_character("elder").location = "market_square"
+    text = game.render_look()
+    assert "Village Elder" not in text
+    assert game.render_look() is text
+
+    game.world.move_to("east")
+    assert "Village Elder" in game.render_look()
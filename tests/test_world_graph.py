@@ -0,0 +1,63 @@
+"""
+紧凑世界图测试
+"""
+import pytest
+
+from content_pack import default_content
+from world import World
+from world_graph import CompactGraph, CompactGraphBuilder
+
+
+def test_packed_records_match_content():
+    """压缩后的记录与原内容一致，出口保持顺序"""
+    content = default_content()
+    graph = CompactGraph.from_records(content.locations)
+    assert list(graph) == list(content.locations)
+    for location_id in content.locations:
+        record = content.locations[location_id]
+        packed = graph[location_id]
+        assert packed["name"] == record["name"]
+        assert packed["description"] == record["description"]
+        assert list(packed["exits"].items()) == list(record["exits"].items())
+        assert packed.get("ambient", []) == record.get("ambient", [])
+
+
+def test_builder_accepts_forward_references():
+    """出口可以先于目标地点添加；邻接按出口顺序返回"""
+    builder = CompactGraphBuilder()
+    builder.add_location("hall", "Hall", "A hall.", items=["key"])
+    builder.add_exit("hall", "east", "yard")
+    builder.add_exit("hall", "down", "cellar")
+    builder.add_location("cellar", "Cellar", "Dark.")
+    builder.add_location("yard", "Yard", "Muddy, 泥泞.")
+    builder.add_exit("yard", "west", "hall")
+    graph = builder.build()
+
+    assert graph.exits_of("hall") == {"east": "yard", "down": "cellar"}
+    assert graph["yard"]["description"] == "Muddy, 泥泞."
+    assert graph["hall"]["items"] == ["key"]
+    hall = graph.index_of("hall")
+    assert [graph.id_of(target) for _, target in graph.neighbours(hall)] == ["yard", "cellar"]
+    assert graph.exits_of("cellar") == {}
+
+
+def test_builder_errors():
+    """重复定义和通向未定义地点的出口会报错"""
+    builder = CompactGraphBuilder()
+    builder.add_location("a", "A", "")
+    with pytest.raises(ValueError, match="duplicate"):
+        builder.add_location("a", "A", "")
+    builder.add_exit("a", "north", "nowhere")
+    with pytest.raises(ValueError, match="nowhere"):
+        builder.build()
+
+
+def test_world_on_compact_graph():
+    """世界在紧凑存储上行为不变"""
+    world = World(default_content().compacted())
+    assert world.get_location("market_square").name == "Market Square"
+    assert world.get_location("nowhere") is None
+    assert world.move_to("east") == (True, "您向east方向走去。")
+    assert world.get_current_location().exits["south"] == "riverside_dock"
+    assert world.routes.distance("market_square", "moonlit_grove") == 3
+    assert world.find_location("wizard") == "wizard_tower"